@@ -1,14 +1,21 @@
 from P2000.ServiceType import ServiceType
+from array import array
+from bisect import bisect_left
 from enum import Enum
-from typing import Dict
+from typing import Dict, Iterator
+import sys
 
 class Capcode:
+    # Thousands of capcodes are kept for the lifetime of the process, slots keep them small. The type and city repeat a
+    # lot, so those strings are shared.
+    __slots__ = ('id', 'capcode', 'description', 'type', 'city', 'regionId')
+
     def __init__(self, id: int, capcode: str, description: str, type: str, city: str, regionId: int):
         self.id = id
         self.capcode = capcode
         self.description = description
-        self.type = type
-        self.city = city
+        self.type = sys.intern(type)
+        self.city = sys.intern(city)
         self.regionId = regionId
 
         if capcode in LifelinerCapcodes._value2member_map_:
@@ -23,23 +30,52 @@ class LifelinerCapcodes(Enum):
     LIFELINER3 = '0923993'
 
 class CapcodeCollection(object):
+    QUERY = "SELECT `PK_CAPCODE`, `CAPCODE`, `FK_REGION`, `DESCRIPTION`, `TYPE`, `CITY` FROM D_CAPCODE"
+
     def __init__(self, capcodes: Dict[str,Capcode]):
-        self.__capcodes = capcodes
+        # Capcodes are numbers of 7 digits, so they are looked up in a sorted array of integers with the Capcode objects
+        # at the same index, which takes a fraction of the memory of a string keyed dict. Capcodes which are not a
+        # number can never be received and are left out.
+        numbered = sorted((int(key), capcode) for key, capcode in capcodes.items() if key.isdigit())
+        self.__index = (array('l', [number for number, capcode in numbered]), [capcode for number, capcode in numbered])
 
     def getCapcodeByCapcode(self, capcode: str) -> Capcode:
-        if capcode in self.__capcodes.keys():
-            return self.__capcodes[capcode]
+        if not capcode.isdigit():
+            return None
+
+        number = int(capcode)
+        numbers, capcodes = self.__index
+        position = bisect_left(numbers, number)
+        if position < len(numbers) and numbers[position] == number:
+            return capcodes[position]
 
         return None
 
+    def getAllCapcodes(self) -> Iterator[Capcode]:
+        return iter(self.__index[1])
+
     def add(self, capcode: Capcode):
-        self.__capcodes[capcode.capcode] = capcode
+        # Adding is rare, so the index is copied and swapped as a whole instead of being changed under a reader
+        number = int(capcode.capcode)
+        numbers, capcodes = array('l', self.__index[0]), list(self.__index[1])
+        position = bisect_left(numbers, number)
+        if position < len(numbers) and numbers[position] == number:
+            capcodes[position] = capcode
+        else:
+            numbers.insert(position, number)
+            capcodes.insert(position, capcode)
+
+        self.__index = (numbers, capcodes)
 
     @staticmethod
     def initList(dbCursor):
-        dbCursor.execute("SELECT `PK_CAPCODE`, `CAPCODE`, `FK_REGION`, `DESCRIPTION`, `TYPE`, `CITY` FROM D_CAPCODE")
+        dbCursor.execute(CapcodeCollection.QUERY)
+        return CapcodeCollection.fromRows(dbCursor.fetchall())
+
+    @staticmethod
+    def fromRows(rows):
         capcodes = {}
-        for capcode in dbCursor.fetchall():
+        for capcode in rows:
             capcodes[capcode['CAPCODE']] = Capcode(
                 capcode['PK_CAPCODE'],
                 capcode['CAPCODE'],
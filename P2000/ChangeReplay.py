@@ -0,0 +1,132 @@
+from typing import *
+from P2000.Capcode import CapcodeCollection
+from P2000.City import CityCollection
+from P2000.Message import Message
+from P2000.MessageEnricher import MessageEnricher
+from P2000.Region import RegionCollection
+from P2000.ReplayPool import UPDATE_ENRICHMENT, enrichmentRow
+from P2000.StreetRules import StreetRuleCollection
+
+# FK_CITY of messages which were not matched to a city, 0 is stored when there was no estimate at all
+UNKNOWN_CITY = -1
+PATTERNS_PER_QUERY = 100
+
+class ChangeReplay(object):
+    """
+    Re-enriches only the messages affected by the capcodes, cities and regions which setup.py logged in
+    F_REFERENCE_CHANGE since the last run, so the work scales with the size of the change instead of the archive. The
+    reference data is read from the storage, never from the snapshot, and the changes are only marked as replayed when it
+    did not change in the meantime.
+    """
+
+    def __init__(self, db, storage, chunkSize: int = 5000):
+        self.__db = db
+        self.__dbCursor = db.cursor(dictionary=True)
+        self.__storage = storage
+        self.__enricher = None
+        self.__chunkSize = chunkSize
+
+    def replay(self):
+        # Read before the changes, so a change logged after this point always makes the versions differ below
+        referenceData = self.__storage.fetchReferenceData()
+        self.__enricher = MessageEnricher(
+            CapcodeCollection.fromRows(referenceData['capcodes']),
+            CityCollection.fromRows(referenceData['cities']),
+            RegionCollection.fromRows(referenceData['regions']),
+            StreetRuleCollection.initList()
+        )
+
+        self.__dbCursor.execute('SELECT `PK_REFERENCE_CHANGE`, `TYPE`, `FK_REFERENCE` FROM `F_REFERENCE_CHANGE` WHERE `REPLAYED` = 0')
+        changes = self.__dbCursor.fetchall()
+        if len(changes) == 0:
+            print('No changed reference data to replay')
+            return
+
+        changed = {'capcode': set(), 'city': set(), 'region': set()}
+        for change in changes:
+            changed[change['TYPE']].add(change['FK_REFERENCE'])
+
+        messagePKs = set()
+        if len(changed['capcode']) > 0:
+            messagePKs.update(self.__fetchPKs(
+                'SELECT DISTINCT `FK_MESSAGE` AS `PK_MESSAGE` FROM `X_MESSAGE_CAPCODE` WHERE `FK_CAPCODE` IN (%s)',
+                changed['capcode']
+            ))
+
+        if len(changed['region']) > 0:
+            messagePKs.update(self.__fetchPKs(
+                'SELECT DISTINCT `X`.`FK_MESSAGE` AS `PK_MESSAGE` FROM `X_MESSAGE_CAPCODE` `X` ' +
+                'INNER JOIN `D_CAPCODE` `C` ON `C`.`PK_CAPCODE` = `X`.`FK_CAPCODE` WHERE `C`.`FK_REGION` IN (%s)',
+                changed['region']
+            ))
+
+        if len(changed['city']) > 0:
+            messagePKs.update(self.__fetchCityPKs(changed['city']))
+
+        replayed = 0
+        sortedPKs = sorted(messagePKs)
+        for start in range(0, len(sortedPKs), self.__chunkSize):
+            replayed += self.__replayChunk(sortedPKs[start:start + self.__chunkSize])
+
+        print('Changed capcodes:', len(changed['capcode']), 'cities:', len(changed['city']), 'regions:', len(changed['region']))
+        print('Messages replayed:', replayed)
+
+        if self.__storage.fetchReferenceVersion() != referenceData['version']:
+            print('The reference data changed during the replay, the changes are left to be replayed again')
+            return
+
+        self.__dbCursor.execute(
+            'UPDATE `F_REFERENCE_CHANGE` SET `REPLAYED` = 1 WHERE `PK_REFERENCE_CHANGE` IN (%s)' % ', '.join(['%s'] * len(changes)),
+            [change['PK_REFERENCE_CHANGE'] for change in changes]
+        )
+        self.__db.commit()
+
+    def __fetchPKs(self, query: str, ids: Iterable[int]) -> List[int]:
+        ids = list(ids)
+        self.__dbCursor.execute(query % ', '.join(['%s'] * len(ids)), ids)
+        return [row['PK_MESSAGE'] for row in self.__dbCursor.fetchall()]
+
+    def __fetchCityPKs(self, cityIds: Set[int]) -> List[int]:
+        # Messages which were matched to a changed city, and messages without a city which mention the changed name or
+        # acronym and might be matched to it now. Both are found through the (`FK_CITY`, `DATE`) index, the text is only
+        # searched in the messages without a city instead of the whole table.
+        cityIds = list(cityIds)
+        self.__dbCursor.execute(
+            'SELECT `NAME`, `ACRONYM` FROM `D_CITY` WHERE `PK_CITY` IN (%s)' % ', '.join(['%s'] * len(cityIds)),
+            cityIds
+        )
+        patterns = []
+        for city in self.__dbCursor.fetchall():
+            for value in [city['NAME'], city['ACRONYM']]:
+                if value:
+                    patterns.append('%' + value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+
+        messagePKs = self.__fetchPKs('SELECT `PK_MESSAGE` FROM `F_MESSAGE` WHERE `FK_CITY` IN (%s)', cityIds)
+        # A first run of setup.py changes every city, so the names are searched for a limited number at a time
+        for start in range(0, len(patterns), PATTERNS_PER_QUERY):
+            chunk = patterns[start:start + PATTERNS_PER_QUERY]
+            self.__dbCursor.execute(
+                'SELECT `PK_MESSAGE` FROM `F_MESSAGE` WHERE `FK_CITY` IN (%s, %s) AND (' + ' OR '.join(['`MESSAGE` LIKE %s'] * len(chunk)) + ')',
+                [UNKNOWN_CITY, 0] + chunk
+            )
+            messagePKs += [row['PK_MESSAGE'] for row in self.__dbCursor.fetchall()]
+
+        return messagePKs
+
+    def __replayChunk(self, messagePKs: List[int]) -> int:
+        self.__dbCursor.execute(
+            'SELECT `PK_MESSAGE`, `RAW_MESSAGE` FROM `F_MESSAGE` WHERE `PK_MESSAGE` IN (%s)' % ', '.join(['%s'] * len(messagePKs)),
+            messagePKs
+        )
+
+        results = []
+        for row in self.__dbCursor.fetchall():
+            message = Message(row['RAW_MESSAGE'])
+            if message.isValidMessage():
+                results.append(enrichmentRow(self.__enricher.enrich(message), row['PK_MESSAGE']))
+
+        if len(results) > 0:
+            self.__dbCursor.executemany(UPDATE_ENRICHMENT, results)
+            self.__db.commit()
+
+        return len(results)
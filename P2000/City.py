@@ -1,31 +1,163 @@
-from typing import Dict
+import re
+from typing import Dict, Iterable, Optional, Tuple
 
 class City:
+    __slots__ = ('id', 'acronym', 'name')
+
     def __init__(self, id: int, acronym: str, name: str):
         self.id = id
         self.acronym = acronym
         self.name = name
 
+def _lower(text: str) -> str:
+    # Lower cases the text without changing its length, so positions in the lowered text match the original
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        lowered = ''.join(char.lower() if len(char.lower()) == 1 else char for char in text)
+
+    return lowered
+
+class CityMatcher:
+    # Trailing series of numbers which firefighter and police calls usually end with after the city name
+    __TRAILING_NUMBERS = re.compile(r'(?: [0-9]+)*')
+
+    # Names and acronyms are bucketed on their first characters. That keeps the candidates per position down to a
+    # handful, at a fraction of the memory a trie with a dict per character takes.
+    __PREFIX = 2
+
+    def __init__(self, cities: Iterable[City]):
+        # Each bucket keeps the cities in the order they were given, so the rank of a city is its position in the
+        # (longest name first) sorted collection, just like the order of the alternatives in the old regexes
+        self.__acronyms = {}
+        self.__names = {}
+
+        for rank, city in enumerate(cities):
+            if city.acronym:
+                self.__acronyms.setdefault(city.acronym[:self.__PREFIX], []).append((rank, city.acronym, city))
+            if city.name:
+                lowered = _lower(city.name)
+                self.__names.setdefault(lowered[:self.__PREFIX], []).append((rank, lowered, city))
+
+        # A name shorter than the prefix is added to every longer bucket it is a prefix of. Its own bucket is only
+        # looked up when no bucket for the full prefix exists.
+        self.__shortAcronyms = self.__mergeShortBuckets(self.__acronyms)
+        self.__shortNames = self.__mergeShortBuckets(self.__names)
+
+    @staticmethod
+    def __mergeShortBuckets(buckets: dict) -> Tuple[int, ...]:
+        original = dict(buckets)
+        shortLengths = set()
+        for shortKey, entries in original.items():
+            if len(shortKey) >= CityMatcher.__PREFIX:
+                continue
+
+            shortLengths.add(len(shortKey))
+            for key in original.keys():
+                if len(key) > len(shortKey) and key.startswith(shortKey):
+                    buckets[key] = buckets[key] + entries
+
+        for key in buckets.keys():
+            buckets[key] = tuple(sorted(buckets[key], key=lambda entry: entry[0]))
+
+        return tuple(sorted(shortLengths, reverse=True))
+
+    def __candidates(self, buckets: dict, shortLengths: Tuple[int, ...], text: str, start: int):
+        candidates = buckets.get(text[start:start + self.__PREFIX])
+        if candidates is not None:
+            return candidates
+
+        for length in shortLengths:
+            candidates = buckets.get(text[start:start + length])
+            if candidates is not None:
+                return candidates
+
+        return ()
+
+    def match(self, text: str, matchEnd: bool = False) -> Tuple[Optional[City], Optional[City], Optional[City]]:
+        """
+        Walks the message once and returns the first acronym, the first city name which ends the message (case
+        insensitive, optionally followed by numbers) and the first city name (case sensitive). A found acronym is
+        decisive, so the walk stops as soon as one is found.
+        """
+        lowered = _lower(text)
+        endCity = None
+        nameCity = None
+
+        for start in range(len(text)):
+            # Candidates are sorted on rank, so the first one which matches takes precedence
+            for rank, acronym, city in self.__candidates(self.__acronyms, self.__shortAcronyms, text, start):
+                if text.startswith(acronym, start):
+                    return city, endCity, nameCity
+
+            if nameCity is not None and (endCity is not None or not matchEnd):
+                continue
+
+            for rank, name, city in self.__candidates(self.__names, self.__shortNames, lowered, start):
+                if not lowered.startswith(name, start):
+                    continue
+
+                end = start + len(name)
+                if nameCity is None and text.startswith(city.name, start):
+                    nameCity = city
+                if matchEnd and endCity is None and self.__TRAILING_NUMBERS.fullmatch(text, end) is not None:
+                    endCity = city
+
+        return None, endCity, nameCity
+
 class CityCollection:
+    QUERY = "SELECT `PK_CITY`, `ACRONYM`, `NAME` FROM D_CITY"
+
     def __init__(self, cities: Dict[str, City]):
         self.__cities = cities
+        self.__matcher = CityMatcher(cities.values())
+
+        # Secondary indexes, case folded as matches come back in whatever case the message used. The first city in the
+        # (longest name first) sorted collection wins when names or acronyms collide
+        self.__citiesByName = {}
+        self.__citiesByAcronym = {}
+        for city in cities.values():
+            if city.name:
+                self.__citiesByName.setdefault(city.name.casefold(), city)
+            if city.acronym:
+                self.__citiesByAcronym.setdefault(city.acronym.casefold(), city)
 
     def getAllCities(self):
         return self.__cities.values()
 
     def getCityByAcronym(self, acronym: str):
-        return self.__cities.get(acronym)
+        city = self.__cities.get(acronym)
+        if city is None and acronym:
+            city = self.__citiesByAcronym.get(acronym.casefold())
+
+        return city
 
     def getCityByName(self, name: str):
-        for city in self.__cities.values():
-            if city.name == name:
-                return city
+        if not name:
+            return None
+
+        return self.__citiesByName.get(name.casefold())
+
+    def findCity(self, text: str, matchEnd: bool = False) -> Optional[City]:
+        # The use of the unique acronym for a city is a dead giveaway it's that specific city, so that one goes first
+        # before we do fuzzy matching on the names
+        acronymCity, endCity, nameCity = self.__matcher.match(text, matchEnd)
+        if acronymCity is not None:
+            return acronymCity
+
+        if endCity is not None:
+            return endCity
+
+        return nameCity
 
     @staticmethod
     def initList(dbCursor):
-        dbCursor.execute("SELECT `PK_CITY`, `ACRONYM`, `NAME` FROM D_CITY")
+        dbCursor.execute(CityCollection.QUERY)
+        return CityCollection.fromRows(dbCursor.fetchall())
+
+    @staticmethod
+    def fromRows(rows):
         cities = {}
-        for city in dbCursor.fetchall():
+        for city in rows:
             cities[city['ACRONYM']] = (City(city['PK_CITY'], city['ACRONYM'], city['NAME']))
 
-        return CityCollection(dict(sorted(cities.items(), key=lambda item: len(item[1].name), reverse=True)))
\ No newline at end of file
+        return CityCollection(dict(sorted(cities.items(), key=lambda item: len(item[1].name), reverse=True)))
@@ -0,0 +1,160 @@
+import queue
+import threading
+import time
+from typing import *
+import mysql.connector
+from P2000.MessageSpool import StorageUnavailable
+
+# Client and server error numbers which mean the connection is gone, rather than that the query is wrong: server
+# shutdown (1053), read only during a failover (1290), connection killed (1927), can not connect (2002, 2003), server
+# gone away (2006) and lost connection (2013, 2055)
+CONNECTION_ERRORS = {1053, 1290, 1927, 2002, 2003, 2006, 2013, 2055}
+
+def connect(databaseConf):
+    # Looked up without regard to case, like configparser does. The replay workers get a plain dict of the section,
+    # which has the lowercased option names.
+    databaseConf = {key.lower(): value for key, value in databaseConf.items()}
+    return mysql.connector.connect(
+        host=databaseConf.get('host', 'localhost'),
+        user=databaseConf.get('username', 'P2000'),
+        password=databaseConf.get('password', ''),
+        database=databaseConf.get('database', 'P2000'),
+        connection_timeout=int(databaseConf.get('connecttimeout', 5)),
+    )
+
+def isConnectionError(e: Exception) -> bool:
+    return isinstance(e, mysql.connector.errors.OperationalError) or (
+        isinstance(e, mysql.connector.Error) and e.errno in CONNECTION_ERRORS
+    )
+
+class PooledConnection(object):
+    def __init__(self, connection):
+        self.connection = connection
+        self.lastUsed = time.monotonic()
+        self.__prepared = {}
+
+    def cursor(self, **kwargs):
+        return self.connection.cursor(**kwargs)
+
+    def prepared(self, statement: str):
+        # The server side statement is prepared on the first execute and reused for as long as the connection lives
+        cursor = self.__prepared.get(statement)
+        if cursor is None:
+            cursor = self.__prepared[statement] = self.connection.cursor(prepared=True)
+
+        return cursor
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        try:
+            self.connection.close()
+        except Exception:
+            pass
+
+class ConnectionPool(object):
+    """
+    A handful of connections shared by the listener threads. Work is run with a healthy connection and retried on a new
+    one when the connection turns out to be gone. When the database stays unreachable, StorageUnavailable is raised
+    right away for a growing backoff period, so callers can fall back without waiting on timeouts.
+    """
+
+    def __init__(self, databaseConf, size: int = 4, retries: int = 3, retryDelay: float = 1.0, pingInterval: float = 60.0, maxBackoff: float = 60.0):
+        self.__databaseConf = databaseConf
+        self.__retries = retries
+        self.__retryDelay = retryDelay
+        self.__pingInterval = pingInterval
+        self.__maxBackoff = maxBackoff
+
+        self.__idle = queue.LifoQueue()
+        self.__slots = threading.BoundedSemaphore(size)
+        self.__lock = threading.Lock()
+        self.__backoff = 0.0
+        self.__retryAt = 0.0
+
+    def run(self, work: Callable[[PooledConnection], Any], retries: Optional[int] = None):
+        """
+        Runs work(connection) and returns its result. The work has to commit itself, and is run again from the start on
+        a retry, so it should be safe to repeat.
+        """
+        if retries is None:
+            retries = self.__retries
+
+        with self.__lock:
+            if time.monotonic() < self.__retryAt:
+                raise StorageUnavailable('Database unreachable, retrying in %.0f seconds' % (self.__retryAt - time.monotonic()))
+
+        lastError = None
+        for attempt in range(retries + 1):
+            if attempt > 0:
+                time.sleep(self.__retryDelay * 2 ** (attempt - 1))
+
+            self.__slots.acquire()
+            connection = None
+            try:
+                connection = self.__acquire()
+                result = work(connection)
+            except Exception as e:
+                if connection is not None and not isConnectionError(e):
+                    self.__rollback(connection)
+                    self.__release(connection)
+                    raise
+
+                # The connection is beyond saving, the next attempt gets a new one
+                if connection is not None:
+                    connection.close()
+                self.__slots.release()
+                if not isConnectionError(e):
+                    raise
+
+                lastError = e
+                continue
+
+            self.__release(connection)
+            with self.__lock:
+                self.__backoff = 0.0
+            return result
+
+        with self.__lock:
+            self.__backoff = min(self.__maxBackoff, max(self.__retryDelay, self.__backoff * 2))
+            self.__retryAt = time.monotonic() + self.__backoff
+
+        raise StorageUnavailable(repr(lastError)) from lastError
+
+    def close(self):
+        while True:
+            try:
+                self.__idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def __acquire(self) -> PooledConnection:
+        try:
+            connection = self.__idle.get_nowait()
+        except queue.Empty:
+            return PooledConnection(connect(self.__databaseConf))
+
+        # Connections which were idle for a while may have been closed by the server's wait_timeout
+        if time.monotonic() - connection.lastUsed > self.__pingInterval:
+            try:
+                connection.connection.ping()
+            except Exception:
+                connection.close()
+                return PooledConnection(connect(self.__databaseConf))
+
+        return connection
+
+    def __release(self, connection: PooledConnection):
+        connection.lastUsed = time.monotonic()
+        self.__idle.put(connection)
+        self.__slots.release()
+
+    def __rollback(self, connection: PooledConnection):
+        try:
+            connection.rollback()
+        except Exception:
+            pass
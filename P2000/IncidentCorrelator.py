@@ -0,0 +1,94 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import *
+from P2000.Message import Message
+from P2000.MessageWriter import hashMessage
+
+# Only numbers which are marked as one: the ride number after `Rit` in ambulance calls and the BR..-.. incident numbers
+# of the fire brigade. Bare trailing numbers are stations and vehicles, those are shared by unrelated calls.
+INCIDENT_NUMBER = re.compile(r'\b(?:[Rr][Ii][Tt]:? ?([0-9]{4,})|(BR[0-9A-Z]{2}-[0-9]+))\b')
+
+class IncidentCorrelator(object):
+    """
+    Groups the separate pages of one incident: follow-ups, other capcodes, other services and cancellations. A page joins
+    the incident of an earlier page which shares an incident number, its street in the same city or its postal code, as
+    long as that incident started within the window. A key belongs to the first incident which used it, and pages with
+    different incident numbers are never joined on their street or postal code. Every key points straight at its
+    incident, so a page costs the same no matter how many are in the window.
+    """
+
+    def __init__(self, window: float = 1800.0, capacity: int = 4096):
+        self.__window = window
+        self.__capacity = capacity
+        # Incident id to its first timestamp, incident numbers and keys, oldest first
+        self.__incidents = OrderedDict()
+        self.__keys = {}
+        self.__lock = threading.Lock()
+        self.created = 0
+        self.joined = 0
+
+    @staticmethod
+    def keys(message: Message, cityId: int, street: str, postalCode: str) -> List[tuple]:
+        # Strongest first, a page which matches more than one incident joins the one found first
+        keys = [('number', ride or number) for ride, number in INCIDENT_NUMBER.findall(message.message)]
+        if street and cityId > 0:
+            keys.append(('street', cityId, street.lower()))
+        if postalCode:
+            keys.append(('postalCode', postalCode.upper()))
+
+        return keys
+
+    def correlate(self, message: Message, cityId: int, street: str, postalCode: str) -> str:
+        timestamp = message.date.timestamp()
+        keys = self.keys(message, cityId, street, postalCode)
+        numbers = {key for key in keys if key[0] == 'number'}
+
+        with self.__lock:
+            while len(self.__incidents) > 0:
+                oldestId, (oldestTimestamp, oldestNumbers, oldestKeys) = next(iter(self.__incidents.items()))
+                if timestamp - oldestTimestamp <= self.__window:
+                    break
+                self.__forget(oldestId)
+
+            incidentId = None
+            for key in keys:
+                foundId = self.__keys.get(key)
+                if foundId is None:
+                    continue
+
+                foundTimestamp, foundNumbers, foundKeys = self.__incidents[foundId]
+                if abs(timestamp - foundTimestamp) > self.__window:
+                    continue
+                # Two rides to the same hospital share its street and postal code, not their numbers
+                if key[0] != 'number' and len(numbers) > 0 and len(foundNumbers) > 0 and numbers.isdisjoint(foundNumbers):
+                    continue
+
+                incidentId = foundId
+                break
+
+            if incidentId is None:
+                # Taken from the first page, so a replay gives the incident the same id again
+                incidentId = message.date.strftime('%Y%m%d%H%M%S') + '-' + hashMessage(message.message.strip())[:8]
+                if incidentId not in self.__incidents:
+                    self.__incidents[incidentId] = (timestamp, set(), [])
+                self.created += 1
+            else:
+                self.joined += 1
+
+            # The window stays with the first page, the keys of later pages only widen what the incident matches
+            incidentNumbers, incidentKeys = self.__incidents[incidentId][1:]
+            incidentNumbers.update(numbers)
+            for key in keys:
+                if key not in self.__keys:
+                    self.__keys[key] = incidentId
+                    incidentKeys.append(key)
+
+            while len(self.__incidents) > self.__capacity:
+                self.__forget(next(iter(self.__incidents)))
+
+        return incidentId
+
+    def __forget(self, incidentId: str):
+        for key in self.__incidents.pop(incidentId)[2]:
+            del self.__keys[key]
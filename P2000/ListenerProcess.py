@@ -1,10 +1,37 @@
 from typing import *
+import queue
 import subprocess
+import threading
 from P2000.Message import Message
+from P2000.MessageDeduplicator import MessageDeduplicator
+from P2000.Metrics import Metrics
 
 class ListenerProcess(object):
-    def __init__(self):
+    BACKPRESSURE_BLOCK = 'block'
+    BACKPRESSURE_DROP_OLDEST = 'drop-oldest'
+
+    # Number of bytes read from a capture at once when ingesting
+    INGEST_CHUNK_SIZE = 1 << 20
+
+    def __init__(
+        self,
+        deduplicator: Optional[MessageDeduplicator] = None,
+        queueSize: int = 1000,
+        workers: int = 1,
+        backpressure: str = BACKPRESSURE_BLOCK,
+        metrics: Optional[Metrics] = None
+    ):
+        if backpressure not in [self.BACKPRESSURE_BLOCK, self.BACKPRESSURE_DROP_OLDEST]:
+            raise ValueError('Invalid backpressure behaviour: ' + backpressure)
+
         self.__callbacks = []
+        self.__deduplicator = deduplicator
+        self.__queue = queue.Queue(maxsize=queueSize)
+        self.__workers = workers
+        self.__backpressure = backpressure
+        self.__metrics = Metrics() if metrics is None else metrics
+        self.__metrics.gauge('queue_size', self.__queue.qsize)
+        self.dropped = 0
 
     def subscribe(self, callbackFunction: Callable):
         self.__callbacks.append(callbackFunction)
@@ -23,12 +50,118 @@ class ListenerProcess(object):
             stderr=subprocess.PIPE
         )
 
-        for line in multimon.stdout:
-            lineStr = line.decode('utf-8')
-            message = Message(lineStr)
+        # Reading the pipe only decodes and queues the lines, parsing and enriching happens on the workers. That way a
+        # slow database or regex pass never stalls multimon-ng and rtl_fm, which would drop pages.
+        workers = []
+        for i in range(self.__workers):
+            worker = threading.Thread(target=self.__work, name='ListenerWorker-' + str(i), daemon=True)
+            worker.start()
+            workers.append(worker)
+
+        try:
+            for line in multimon.stdout:
+                self.__enqueue(line.decode('utf-8'))
+        finally:
+            for worker in workers:
+                self.__queue.put(None)
+            for worker in workers:
+                worker.join()
+
+    def ingest(self, stream: TextIO, chunkSize: int = INGEST_CHUNK_SIZE) -> Tuple[int, int]:
+        """
+        Pushes a recorded multimon-ng capture through the callbacks, without rtl_fm and multimon-ng. The capture is read
+        in chunks of whole lines which are parsed as a batch. Returns the number of lines read and messages passed on.
+        """
+        lineCount = 0
+        messageCount = 0
+        while True:
+            lines = stream.readlines(chunkSize)
+            if len(lines) == 0:
+                break
+
+            lineCount += len(lines)
+            messageCount += self.processLines(lines)
+
+        return lineCount, messageCount
+
+    def processLines(self, lines: List[str]) -> int:
+        start = self.__metrics.start()
+        messages = Message.parseLines(lines)
+        self.__metrics.observe('parse_batch', start)
+        self.__metrics.increment('messages_seen', len(lines))
+        self.__metrics.increment('messages_invalid', len(lines) - len(messages))
+
+        messageCount = 0
+        for message in messages:
+            try:
+                if self.__dispatch(message):
+                    messageCount += 1
+            except Exception as e:
+                # A single bad message should not end a backfill of a whole capture
+                self.__metrics.increment('messages_failed')
+                print('Could not process message:', message.rawMessage, repr(e))
+
+        return messageCount
+
+    def processLine(self, line: str):
+        start = self.__metrics.start()
+        message = Message(line)
+        self.__metrics.observe('parse', start)
+        self.__metrics.increment('messages_seen')
+
+        if message.isValidMessage() == False:
+            self.__metrics.increment('messages_invalid')
+            return
+
+        self.__dispatch(message)
+
+    def __dispatch(self, message: Message) -> bool:
+        # The same page is often received multiple times within a few seconds, only the first copy is passed on
+        if self.__deduplicator is not None:
+            if self.__deduplicator.isDuplicate(message):
+                self.__metrics.increment('messages_duplicate')
+                return False
+            self.__metrics.increment('messages_unique')
+
+        for callback in self.__callbacks:
+            callback(message)
+
+        return True
+
+    def __enqueue(self, line: str):
+        # The time a line is queued is kept with it, so the wait for a worker can be told apart from the processing
+        item = (line, self.__metrics.start())
+        if self.__backpressure == self.BACKPRESSURE_BLOCK:
+            self.__queue.put(item)
+            return
+
+        while True:
+            try:
+                self.__queue.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+
+            try:
+                self.__queue.get_nowait()
+                self.dropped += 1
+                self.__metrics.increment('messages_dropped')
+            except queue.Empty:
+                pass
 
-            if message.isValidMessage() == False:
-                continue
+    def __work(self):
+        while True:
+            item = self.__queue.get()
+            if item is None:
+                return
 
-            for callback in self.__callbacks:
-                callback(message)
\ No newline at end of file
+            line, queued = item
+            self.__metrics.observe('queue', queued)
+            start = self.__metrics.start()
+            try:
+                self.processLine(line)
+            except Exception as e:
+                # A worker which dies would stall the queue, so a bad message is reported and skipped
+                self.__metrics.increment('messages_failed')
+                print('Could not process message:', line.strip(), repr(e))
+            self.__metrics.observe('process', start)
@@ -1,41 +1,86 @@
 from datetime import datetime,timezone
+from typing import *
 
 class Message:
+    __slots__ = ('rawMessage', 'message', '__parts', '__isValid', '__date', '__capcodes')
+
     def __init__(self, message):
         self.rawMessage = message.strip()
-        self.__stringParts = message.split('|')
-        self.__isValid = True
+        self.message = ''
+        self.__parts = None
+        self.__isValid = False
+        self.__date = None
+        self.__capcodes = None
 
-        if (self.__stringParts[0] != 'FLEX'):
-            self.__isValid = False
+        # Most lines multimon-ng writes are rejected here, before any capcode or date work is done
+        if not self.rawMessage.startswith('FLEX|'):
             return
 
-        self.date = datetime.now()
-        self.capcodes = []
-        for capcode in self.__stringParts[4].split(' '):
-            capcode = capcode[-7:]
-            # Capcodes larger than 2000000 are usually monitoring groups so they can be ignores
-            if int(capcode) > 2000000:
-                continue
+        parts = self.rawMessage.split('|')
+        if len(parts) < 7:
+            return
 
-            self.capcodes.append(capcode)
+        self.message = parts[6].strip()
+        if self.message == '' or self.message.lower().startswith('test'):
+            return
 
-        self.message = self.__stringParts[6].strip()
+        # Converting to the local timezone is left for when the date is used
+        self.__date = Message.__parseTimestamp(parts[1])
+        if self.__date is None:
+            return
+
+        self.__parts = parts
+        self.__isValid = True
+
+    @staticmethod
+    def __parseTimestamp(text: str) -> Optional[datetime]:
+        # multimon-ng always writes 'YYYY-MM-DD HH:MM:SS', the shape is checked before anything is converted
+        if not (
+            len(text) == 19 and
+            text[4] == '-' and text[7] == '-' and text[10] == ' ' and text[13] == ':' and text[16] == ':' and
+            (text[0:4] + text[5:7] + text[8:10] + text[11:13] + text[14:16] + text[17:19]).isdigit()
+        ):
+            return None
 
+        # A line damaged in reception can still have an impossible date, like the 30th of February
         try:
-            self.date = datetime.strptime(self.__stringParts[1], '%Y-%m-%d %H:%M:%S')
-            self.date = self.date.replace(tzinfo=timezone.utc)
-            self.date = self.date.astimezone()
+            return datetime(
+                int(text[0:4]), int(text[5:7]), int(text[8:10]),
+                int(text[11:13]), int(text[14:16]), int(text[17:19]),
+                tzinfo=timezone.utc
+            )
         except ValueError:
-            self.__isValid = False
-            return
+            return None
 
-        if (
-            self.message.lower().startswith('test') or
-            self.message.strip() == ''
-        ):
-            self.__isValid = False
-            return
+    @property
+    def date(self) -> datetime:
+        if self.__date is None:
+            self.__date = datetime.now().astimezone()
+        elif self.__date.tzinfo is timezone.utc:
+            self.__date = self.__date.astimezone()
+
+        return self.__date
+
+    @property
+    def capcodes(self):
+        if self.__capcodes is None:
+            self.__capcodes = []
+            if self.__parts is not None:
+                for capcode in self.__parts[4].split():
+                    capcode = capcode[-7:]
+                    # Capcodes larger than 2000000 are usually monitoring groups so they can be ignores
+                    if not capcode.isdigit() or int(capcode) > 2000000:
+                        continue
+
+                    self.__capcodes.append(capcode)
+
+        return self.__capcodes
+
+    @staticmethod
+    def parseLines(lines: Iterable[str]) -> List['Message']:
+        # Parses a batch of lines at once, only the valid messages are returned
+        messages = [Message(line) for line in lines]
+        return [message for message in messages if message.isValidMessage()]
 
     def isValidMessage(self):
         return self.__isValid
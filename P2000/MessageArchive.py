@@ -0,0 +1,215 @@
+import fcntl
+import glob
+import gzip
+import json
+import os
+import threading
+from typing import *
+
+class ArchiveLocked(Exception):
+    pass
+
+class MessageArchive(object):
+    """
+    Append-only history of the raw FLEX lines and what was estimated for them, kept apart from the database. Messages are
+    written to an open segment, one JSON object per line. A segment is sealed once it is full or the day of the messages
+    changes: it is compressed, and its time range and capcodes are written to a small index next to it. Readers use the
+    indexes to skip the segments which can not hold what they are looking for.
+
+    Only one writer can open the archive at a time, it holds a lock on the directory. Readers open it with
+    writable=False, they neither lock nor touch the segments.
+    """
+
+    OPEN = '.open'
+    SEALED = '.jsonl.gz'
+    INDEX = '.idx'
+    LOCK = '.lock'
+
+    def __init__(self, directory: str, segmentSize: int = 10000, writable: bool = True):
+        self.__directory = directory
+        self.__segmentSize = segmentSize
+        self.__lock = threading.Lock()
+        self.__segment = None
+        self.__segmentFile = None
+        self.__segmentDay = None
+        self.__segmentCount = 0
+        self.__lockFile = None
+
+        if not writable:
+            return
+
+        os.makedirs(directory, exist_ok=True)
+        self.__lockFile = open(os.path.join(directory, self.LOCK), 'a')
+        try:
+            fcntl.flock(self.__lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self.__lockFile.close()
+            self.__lockFile = None
+            raise ArchiveLocked('The archive in ' + directory + ' is written by another listener')
+
+        # With the lock held, open segments can only have been left by a listener which did not shut down cleanly
+        for path in glob.glob(os.path.join(directory, '*' + self.OPEN)):
+            self.__seal(path[:-len(self.OPEN)])
+
+    def add(self, rawMessage: str, date: str, regionId: int, cityId: int, type: str, capcodes: List[str], street: str = '', postalCode: str = '', incidentId: str = ''):
+        line = json.dumps({
+            'date': date,
+            'raw': rawMessage,
+            'region': regionId,
+            'city': cityId,
+            'type': type,
+            'capcodes': capcodes,
+            'street': street,
+            'postalCode': postalCode,
+            'incident': incidentId,
+        }) + '\n'
+
+        if self.__lockFile is None:
+            raise ArchiveLocked('The archive was opened for reading only')
+
+        full = None
+        with self.__lock:
+            if self.__segment is not None and (self.__segmentCount >= self.__segmentSize or date[:10] != self.__segmentDay):
+                full = self.__closeSegment()
+
+            if self.__segment is None:
+                self.__openSegment(date)
+
+            # Flushed right away, so readers of the open segment see the message too
+            self.__segmentFile.write(line)
+            self.__segmentFile.flush()
+            self.__segmentCount += 1
+
+        # Compressing is done outside the lock, so the other workers can carry on with the new segment
+        if full is not None:
+            self.__seal(full)
+
+    def close(self):
+        with self.__lock:
+            full = self.__closeSegment()
+
+        if full is not None:
+            self.__seal(full)
+
+        if self.__lockFile is not None:
+            self.__lockFile.close()
+            self.__lockFile = None
+
+    def segments(self) -> List[Tuple[str, Optional[dict]]]:
+        """Every segment with its index, in the order they were started. Open segments have no index yet."""
+        segments = {}
+        for path in glob.glob(os.path.join(self.__directory, '*' + self.OPEN)):
+            segments[path[:-len(self.OPEN)]] = None
+
+        for path in glob.glob(os.path.join(self.__directory, '*' + self.INDEX)):
+            with open(path, encoding='utf-8') as indexFile:
+                segments[path[:-len(self.INDEX)]] = json.load(indexFile)
+
+        return sorted(segments.items())
+
+    def read(self, fromDate: Optional[str] = None, toDate: Optional[str] = None, capcode: Optional[str] = None) -> Iterator[dict]:
+        """
+        Streams the archived messages dated between fromDate and toDate (YYYY-MM-DD HH:MM:SS, both inclusive) and sent
+        to capcode, segment by segment. Within a segment they come in the order they were received.
+        """
+        for segment, index in self.segments():
+            if index is not None:
+                if fromDate is not None and index['last'] < fromDate:
+                    continue
+                if toDate is not None and index['first'] > toDate:
+                    continue
+                if capcode is not None and capcode not in index['capcodes']:
+                    continue
+
+            for message in self.__readSegment(segment, index):
+                if fromDate is not None and message['date'] < fromDate:
+                    continue
+                if toDate is not None and message['date'] > toDate:
+                    continue
+                if capcode is not None and capcode not in message['capcodes']:
+                    continue
+
+                yield message
+
+    def __openSegment(self, date: str):
+        name = date.replace('-', '').replace(':', '').replace(' ', '-')
+        sequence = 0
+        while True:
+            segment = os.path.join(self.__directory, '%s-%03d' % (name, sequence))
+            if not os.path.exists(segment + self.OPEN) and not os.path.exists(segment + self.INDEX):
+                break
+            sequence += 1
+
+        self.__segment = segment
+        self.__segmentFile = open(segment + self.OPEN, 'a', encoding='utf-8')
+        self.__segmentDay = date[:10]
+        self.__segmentCount = 0
+
+    def __closeSegment(self) -> Optional[str]:
+        if self.__segment is None:
+            return None
+
+        segment = self.__segment
+        self.__segmentFile.close()
+        self.__segment = None
+        self.__segmentFile = None
+        return segment
+
+    def __seal(self, segment: str):
+        first = None
+        last = None
+        count = 0
+        capcodes = set()
+
+        # Every step replaces a file in one go, a crash in between leaves the open segment to be sealed again
+        try:
+            openFile = open(segment + self.OPEN, encoding='utf-8')
+        except FileNotFoundError:
+            print('Archive segment disappeared before it was sealed:', segment)
+            return
+
+        with openFile, gzip.open(segment + self.SEALED + '.tmp', 'wt', encoding='utf-8') as sealedFile:
+            for line in openFile:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    # The tail of a write cut short by a crash
+                    continue
+
+                sealedFile.write(line)
+                first = message['date'] if first is None else min(first, message['date'])
+                last = message['date'] if last is None else max(last, message['date'])
+                capcodes.update(message['capcodes'])
+                count += 1
+
+        if count == 0:
+            os.remove(segment + self.SEALED + '.tmp')
+            os.remove(segment + self.OPEN)
+            return
+
+        os.replace(segment + self.SEALED + '.tmp', segment + self.SEALED)
+        with open(segment + self.INDEX + '.tmp', 'w', encoding='utf-8') as indexFile:
+            json.dump({'first': first, 'last': last, 'count': count, 'capcodes': sorted(capcodes)}, indexFile)
+        os.replace(segment + self.INDEX + '.tmp', segment + self.INDEX)
+        os.remove(segment + self.OPEN)
+
+    def __readSegment(self, segment: str, index: Optional[dict]) -> Iterator[dict]:
+        try:
+            if index is None:
+                segmentFile = open(segment + self.OPEN, encoding='utf-8')
+            else:
+                segmentFile = gzip.open(segment + self.SEALED, 'rt', encoding='utf-8')
+        except FileNotFoundError:
+            # Sealed while the directory was being listed
+            if index is None and os.path.exists(segment + self.INDEX):
+                with open(segment + self.INDEX, encoding='utf-8') as indexFile:
+                    yield from self.__readSegment(segment, json.load(indexFile))
+            return
+
+        with segmentFile:
+            for line in segmentFile:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A line which is still being written
+                    continue
@@ -0,0 +1,34 @@
+import threading
+from collections import OrderedDict
+from P2000.Message import Message
+
+class MessageDeduplicator(object):
+    def __init__(self, window: float = 10.0, capacity: int = 1024):
+        self.__window = window
+        self.__capacity = capacity
+        self.__seen = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def isDuplicate(self, message: Message) -> bool:
+        # Repeats are matched on their own timestamp instead of fixed buckets, so two copies on either side of a bucket
+        # boundary are still recognised. The window starts at the first copy and is not extended by its repeats.
+        timestamp = message.date.timestamp()
+        key = (' '.join(message.message.split()), frozenset(message.capcodes))
+
+        with self.__lock:
+            while len(self.__seen) > 0:
+                oldestKey, oldestTimestamp = next(iter(self.__seen.items()))
+                if timestamp - oldestTimestamp <= self.__window:
+                    break
+                del self.__seen[oldestKey]
+
+            firstSeen = self.__seen.get(key)
+            if firstSeen is not None and abs(timestamp - firstSeen) <= self.__window:
+                return True
+
+            self.__seen[key] = timestamp
+            self.__seen.move_to_end(key)
+            if len(self.__seen) > self.__capacity:
+                self.__seen.popitem(last=False)
+
+            return False
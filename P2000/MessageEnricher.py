@@ -0,0 +1,137 @@
+import gettext
+import re
+from P2000.Capcode import Capcode, CapcodeCollection
+from P2000.City import City, CityCollection
+from P2000.Message import Message
+from P2000.Region import Region, RegionCollection
+from P2000.ServiceType import ServiceType
+from P2000.StreetRules import StreetRuleCollection, BRIDGE_KEEPER
+
+if '_' not in locals():
+    _ = gettext.gettext
+
+POSTAL_CODE = re.compile(r'([0-9]{4}[A-Z]{2})', re.IGNORECASE)
+
+class EnrichedMessage:
+    def __init__(self, message: Message, type: str, region: Region, city: City, street: str, postalCode: str):
+        self.message = message
+        self.type = type
+        self.region = region
+        self.city = city
+        self.street = street
+        self.postalCode = postalCode
+
+class MessageEnricher:
+    def __init__(self, capcodeCache: CapcodeCollection, cityCache: CityCollection, regionCache: RegionCollection, streetRules: StreetRuleCollection):
+        self.__capcodeCache = capcodeCache
+        self.__cityCache = cityCache
+        self.__regionCache = regionCache
+        self.__streetRules = streetRules
+
+    @property
+    def capcodeCache(self) -> CapcodeCollection:
+        return self.__capcodeCache
+
+    @property
+    def cityCache(self) -> CityCollection:
+        return self.__cityCache
+
+    @property
+    def regionCache(self) -> RegionCollection:
+        return self.__regionCache
+
+    def getCapcode(self, capcode: str) -> Capcode:
+        # The listener stores unknown capcodes before enriching, a replay without a connection of its own uses a
+        # placeholder instead
+        capcodeObj = self.__capcodeCache.getCapcodeByCapcode(capcode)
+        if capcodeObj is None:
+            capcodeObj = Capcode(-1, capcode, _('Unknown'), ServiceType.UNKNOWN.value, '', -1)
+
+        return capcodeObj
+
+    def enrich(self, message: Message) -> EnrichedMessage:
+        type = self.getEstimatedType(message)
+        region = self.getEstimatedRegion(message)
+        city = self.getEstimatedCity(message, region, type)
+
+        return EnrichedMessage(
+            message,
+            type,
+            region,
+            city,
+            self.getEstimatedStreet(message, region, city, type),
+            self.getEstimatedPostalCode(message)
+        )
+
+    def getEstimatedType(self, message: Message) -> str:
+        typeMapping = {}
+        for capcode in message.capcodes:
+            capcode = self.getCapcode(capcode)
+            typeMapping[capcode.type] = typeMapping.get(capcode.type, 0) + 1
+
+        # We should check the Capcodes for their types to be leading
+        if (len(typeMapping) > 0):
+            type = max(typeMapping, key=typeMapping.get)
+            if type != ServiceType.UNKNOWN.value:
+                return type
+
+        # It could be that the Capcodes are not found, in that case we do some guesstimation based on certain keywords
+        # which is not accurate, but hey, it's better than no type flagged
+        if (message.message.startswith(('A', 'B')) or ' MKA' in message.message):
+            return ServiceType.AMBULANCE.value
+        elif (message.message.lower().startswith(('p', 'prio'))):
+            return ServiceType.FIREFIGHTER.value
+        elif any(s in message.message.lower() for s in ['politie', 'icnum']):
+            return ServiceType.POLICE.value
+        elif 'ambu' in message.message.lower():
+            return ServiceType.AMBULANCE.value
+
+        return ServiceType.UNKNOWN.value
+
+    def getEstimatedRegion(self, message: Message) -> Region:
+        capcodeRegionMap = {}
+        for capcode in message.capcodes:
+            capcode = self.getCapcode(capcode)
+            if capcode.regionId not in capcodeRegionMap.keys():
+                capcodeRegionMap[capcode.regionId] = 0
+            capcodeRegionMap[capcode.regionId] += 1
+
+        if len(capcodeRegionMap) > 0:
+            region = self.__regionCache.getRegionById(max(capcodeRegionMap, key=capcodeRegionMap.get))
+            if region is not None:
+                return region
+
+        return Region(-1, _('Unknown region'))
+
+    def getEstimatedCity(self, message: Message, estimatedRegion: Region, type: ServiceType) -> City:
+        # Firefight and police calls usually end with the city name and a series of 6 numbers (potentially multiple)
+        city = self.__cityCache.findCity(message.message, type in [ServiceType.FIREFIGHTER.value, ServiceType.POLICE.value])
+        if city is not None:
+            return city
+
+        return City(-1, _('Unknown city'), _('Unknown city'))
+
+    def getEstimatedStreet(self, message: Message, region: Region, city: City, type: ServiceType) -> str:
+        if type == ServiceType.CITY.value:
+            for capcode in message.capcodes:
+                capcode = self.getCapcode(capcode)
+                match = BRIDGE_KEEPER.search(capcode.description)
+                if match is not None:
+                    return match.group(1)
+
+        text = message.message.strip()
+        for rule in self.__streetRules.getRules(type, region.id):
+            match = rule.search(text, city)
+
+            if match is not None:
+                return match.group(1).strip('- ')
+
+        return ''
+
+    def getEstimatedPostalCode(self, message: Message) -> str:
+        match = POSTAL_CODE.search(message.message.strip())
+
+        if (match is not None):
+            return match.group(1)
+
+        return ''
@@ -0,0 +1,208 @@
+import json
+import os
+import queue
+import socket
+import socketserver
+import stat
+import threading
+from typing import *
+from P2000.Metrics import Metrics
+
+class Subscriber(object):
+    """
+    A connected client with its own filter and queue. Filters are sent as a JSON line, for example
+    {"regions": [16, 25], "types": ["brandweer"], "capcodes": ["0100112"]}. Missing or empty lists match everything.
+    A line like {"query": {"capcode": "0100112", "limit": 10}} asks for the latest stored messages instead, with the
+    filters of MessageQuery.find, and is answered with a {"query": [...]} line.
+    """
+
+    def __init__(self, queueSize: int):
+        self.queue = queue.Queue(queueSize)
+        self.filter = (None, None, None)
+        self.closed = False
+        self.dropped = 0
+
+    def setFilter(self, filters: dict):
+        for key in ['regions', 'types', 'capcodes']:
+            if filters.get(key) is not None and not isinstance(filters[key], list):
+                raise ValueError('Filter ' + key + ' is not a list')
+
+        # Replaced as a whole, so a message never sees half of an old and half of a new filter
+        self.filter = tuple(
+            frozenset(filters[key]) if filters.get(key) else None
+            for key in ['regions', 'types', 'capcodes']
+        )
+
+    def accepts(self, message: dict) -> bool:
+        regions, types, capcodes = self.filter
+        return (regions is None or message['FK_REGION'] in regions) and \
+            (types is None or message['TYPE'] in types) and \
+            (capcodes is None or not capcodes.isdisjoint(message['CAPCODES']))
+
+    def reply(self, data: bytes):
+        # Answers are not dropped like messages, the client waits for them
+        while not self.closed:
+            try:
+                self.queue.put(data, timeout=1.0)
+                return
+            except queue.Full:
+                continue
+
+    def offer(self, data: bytes) -> bool:
+        try:
+            self.queue.put_nowait(data)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+def queryPublisher(filters: dict, host: str = '127.0.0.1', port: int = 9121, socketPath: Optional[str] = None, timeout: float = 10.0) -> List[dict]:
+    """Asks the publisher of a running listener for the latest messages, see Subscriber. Raises OSError when there is none."""
+    if socketPath is not None:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.settimeout(timeout)
+        client.connect(socketPath)
+    else:
+        client = socket.create_connection((host, port), timeout)
+
+    with client, client.makefile('rb') as reader:
+        client.sendall((json.dumps({'query': filters}) + '\n').encode('utf-8'))
+        # Messages published in the meantime come in before the answer
+        for line in reader:
+            answer = json.loads(line)
+            if 'error' in answer:
+                raise ValueError(answer['error'])
+            if 'query' in answer:
+                return answer['query']
+
+    raise ConnectionError('The listener closed the connection before answering')
+
+class MessagePublisher(object):
+    """
+    Pushes the enriched messages to any number of local clients as line-delimited JSON, over TCP or a Unix socket.
+    Publishing never waits on a client: every client is fed from a bounded queue of its own, a client which does not
+    keep up misses messages instead of holding up the listener. A message is serialised once for all clients.
+    """
+
+    def __init__(self, queueSize: int = 256, metrics: Optional[Metrics] = None, query: Optional[Callable[..., List[dict]]] = None):
+        self.__queueSize = queueSize
+        self.__metrics = Metrics() if metrics is None else metrics
+        self.__query = query
+        self.__subscribers = []
+        self.__lock = threading.Lock()
+        self.__server = None
+
+    def start(self, host: str = '127.0.0.1', port: int = 9121, socketPath: Optional[str] = None) -> socketserver.BaseServer:
+        # Bound here, the name mangling of the handler class would not find the private members
+        queueSize = self.__queueSize
+        query = self.__query
+        subscribe = self.__subscribe
+        unsubscribe = self.__unsubscribe
+
+        class SubscriberHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                subscriber = Subscriber(queueSize)
+                subscribe(subscriber)
+                threading.Thread(target=self.__readFilters, args=(subscriber,), name='SubscriberFilters', daemon=True).start()
+
+                try:
+                    while not subscriber.closed:
+                        try:
+                            data = subscriber.queue.get(timeout=1.0)
+                        except queue.Empty:
+                            continue
+
+                        self.wfile.write(data)
+                except OSError:
+                    pass
+                finally:
+                    subscriber.closed = True
+                    unsubscribe(subscriber)
+
+            def __readFilters(self, subscriber: Subscriber):
+                try:
+                    for line in self.rfile:
+                        try:
+                            filters = json.loads(line)
+                            if not isinstance(filters, dict):
+                                raise ValueError('Filter is not an object')
+
+                            if 'query' in filters:
+                                if query is None or not isinstance(filters['query'], dict):
+                                    raise ValueError('Query is not an object')
+                                subscriber.reply((json.dumps({'query': query(**filters['query'])}) + '\n').encode('utf-8'))
+                            else:
+                                subscriber.setFilter(filters)
+                        except Exception as e:
+                            # Also a query which could not reach the storage
+                            subscriber.offer((json.dumps({'error': str(e)}) + '\n').encode('utf-8'))
+                except OSError:
+                    pass
+
+                subscriber.closed = True
+
+        if socketPath is not None:
+            # Only removed when it was left behind by a listener which did not shut down cleanly
+            if os.path.exists(socketPath):
+                if not stat.S_ISSOCK(os.stat(socketPath).st_mode):
+                    raise OSError(socketPath + ' is not a socket')
+
+                probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                try:
+                    probe.connect(socketPath)
+                    raise OSError('Socket ' + socketPath + ' is in use by another listener')
+                except ConnectionRefusedError:
+                    os.remove(socketPath)
+                finally:
+                    probe.close()
+            server = socketserver.ThreadingUnixStreamServer(socketPath, SubscriberHandler)
+        else:
+            # A restarted listener can take the port back while connections of the last one are still closing
+            server = socketserver.ThreadingTCPServer((host, port), SubscriberHandler, bind_and_activate=False)
+            server.allow_reuse_address = True
+            server.server_bind()
+            server.server_activate()
+
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='MessagePublisher', daemon=True).start()
+        self.__server = server
+        return server
+
+    @property
+    def subscriberCount(self) -> int:
+        return len(self.__subscribers)
+
+    def publish(self, message: dict):
+        subscribers = self.__subscribers
+        if len(subscribers) == 0:
+            return
+
+        data = None
+        for subscriber in subscribers:
+            if subscriber.closed or not subscriber.accepts(message):
+                continue
+
+            if data is None:
+                data = (json.dumps(message) + '\n').encode('utf-8')
+
+            if subscriber.offer(data):
+                self.__metrics.increment('messages_published')
+            else:
+                self.__metrics.increment('messages_publish_dropped')
+
+    def close(self):
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+
+        for subscriber in self.__subscribers:
+            subscriber.closed = True
+
+    def __subscribe(self, subscriber: Subscriber):
+        # The list is replaced instead of changed, so publish can go through it without taking the lock
+        with self.__lock:
+            self.__subscribers = self.__subscribers + [subscriber]
+
+    def __unsubscribe(self, subscriber: Subscriber):
+        with self.__lock:
+            self.__subscribers = [other for other in self.__subscribers if other is not subscriber]
@@ -0,0 +1,136 @@
+import collections
+import threading
+from typing import *
+
+# Placeholders are written for MySQL, the SQLite storage swaps them for its own
+CAPCODES_QUERY = (
+    'SELECT `X`.`FK_MESSAGE`, `C`.`CAPCODE` FROM `X_MESSAGE_CAPCODE` `X` ' +
+    'INNER JOIN `D_CAPCODE` `C` ON `C`.`PK_CAPCODE` = `X`.`FK_CAPCODE` WHERE `X`.`FK_MESSAGE` IN ({})'
+)
+
+def buildQuery(capcode: Optional[str] = None, regionId: Optional[int] = None, cityId: Optional[int] = None, type: Optional[str] = None,
+               incidentId: Optional[str] = None, fromDate: Optional[str] = None, toDate: Optional[str] = None, limit: int = 50) -> Tuple[str, list]:
+    # Every filter has a composite index ending in `DATE`, so the newest matches are read from the index in order instead
+    # of sorting the table. The capcode index ends in `FK_MESSAGE`, capcode queries are ordered by arrival to use it.
+    query = 'SELECT `M`.`PK_MESSAGE`, `M`.`FK_REGION`, `M`.`FK_CITY`, `M`.`MESSAGE`, `M`.`DATE`, `M`.`STREET`, `M`.`POSTALCODE`, `M`.`TYPE`, `M`.`INCIDENT_ID` FROM `F_MESSAGE` `M`'
+    conditions = []
+    params = []
+
+    if capcode is not None:
+        query += ' INNER JOIN `X_MESSAGE_CAPCODE` `X` ON `X`.`FK_MESSAGE` = `M`.`PK_MESSAGE`'
+        conditions.append('`X`.`FK_CAPCODE` = (SELECT `PK_CAPCODE` FROM `D_CAPCODE` WHERE `CAPCODE` = %s)')
+        params.append(capcode)
+
+    for column, value in [('FK_REGION', regionId), ('FK_CITY', cityId), ('TYPE', type), ('INCIDENT_ID', incidentId)]:
+        if value is not None:
+            conditions.append('`M`.`' + column + '` = %s')
+            params.append(value)
+
+    if fromDate is not None:
+        conditions.append('`M`.`DATE` >= %s')
+        params.append(fromDate)
+
+    if toDate is not None:
+        conditions.append('`M`.`DATE` <= %s')
+        params.append(toDate)
+
+    if len(conditions) > 0:
+        query += ' WHERE ' + ' AND '.join(conditions)
+
+    if capcode is not None:
+        return query + ' ORDER BY `X`.`FK_MESSAGE` DESC LIMIT %s', params + [limit]
+
+    return query + ' ORDER BY `M`.`DATE` DESC, `M`.`PK_MESSAGE` DESC LIMIT %s', params + [limit]
+
+def withCapcodes(messages: List[dict], capcodeRows: Iterable[dict]) -> List[dict]:
+    capcodes = {message['PK_MESSAGE']: [] for message in messages}
+    for row in capcodeRows:
+        capcodes[row['FK_MESSAGE']].append(row['CAPCODE'])
+
+    for message in messages:
+        message['CAPCODES'] = capcodes[message['PK_MESSAGE']]
+
+    return messages
+
+def matches(message: dict, capcode: Optional[str] = None, regionId: Optional[int] = None, cityId: Optional[int] = None, type: Optional[str] = None,
+            incidentId: Optional[str] = None, fromDate: Optional[str] = None, toDate: Optional[str] = None) -> bool:
+    return (capcode is None or capcode in message['CAPCODES']) and \
+        (regionId is None or message['FK_REGION'] == regionId) and \
+        (cityId is None or message['FK_CITY'] == cityId) and \
+        (type is None or message['TYPE'] == type) and \
+        (incidentId is None or message['INCIDENT_ID'] == incidentId) and \
+        (fromDate is None or message['DATE'] >= fromDate) and \
+        (toDate is None or message['DATE'] <= toDate)
+
+class RecentMessages(object):
+    """
+    The last messages the listener enriched, so the latest pages can be shown without a query. They are found in the
+    order of the storage: by arrival for a capcode, newest date first otherwise. The oldest arrivals drop out once the
+    buffer is full.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.__messages = collections.deque(maxlen=capacity)
+        self.__lock = threading.Lock()
+        self.__droppedDate = None
+
+    def add(self, message: dict):
+        with self.__lock:
+            if len(self.__messages) == self.__messages.maxlen:
+                dropped = self.__messages[-1]['DATE']
+                if self.__droppedDate is None or dropped > self.__droppedDate:
+                    self.__droppedDate = dropped
+
+            self.__messages.appendleft(message)
+
+    def droppedDate(self) -> Optional[str]:
+        """Newest date of the messages which dropped out of the buffer, or None as long as nothing did"""
+        return self.__droppedDate
+
+    def find(self, limit: int = 50, **filters) -> List[dict]:
+        with self.__lock:
+            messages = list(self.__messages)
+
+        # Stable, so messages of the same second stay newest arrival first like `PK_MESSAGE` DESC
+        if filters.get('capcode') is None:
+            messages.sort(key=lambda message: message['DATE'], reverse=True)
+
+        found = []
+        for message in messages:
+            if matches(message, **filters):
+                found.append(message)
+                if len(found) >= limit:
+                    break
+
+        return found
+
+class MessageQuery(object):
+    """
+    Recent messages by capcode, region, city, service type and time window. Answered from the listener's buffer of
+    recent messages when it holds all of them, from the storage otherwise.
+    """
+
+    def __init__(self, storage, recent: Optional[RecentMessages] = None):
+        self.__storage = storage
+        self.__recent = recent
+
+    def find(self, capcode: Optional[str] = None, regionId: Optional[int] = None, cityId: Optional[int] = None, type: Optional[str] = None,
+             incidentId: Optional[str] = None, fromDate: Optional[str] = None, toDate: Optional[str] = None, limit: int = 50) -> List[dict]:
+        filters = {'capcode': capcode, 'regionId': regionId, 'cityId': cityId, 'type': type, 'incidentId': incidentId, 'fromDate': fromDate, 'toDate': toDate}
+
+        if self.__recent is not None:
+            # The buffer is complete when it has enough matches and nothing which dropped out of it would come before the
+            # last of them, or when everything which dropped out is older than the window. A buffer which never dropped
+            # anything only knows this run.
+            found = self.__recent.find(limit, **filters)
+            droppedDate = self.__recent.droppedDate()
+            if len(found) >= limit and (capcode is not None or droppedDate is None or droppedDate <= found[-1]['DATE']):
+                return found
+            if fromDate is not None and droppedDate is not None and droppedDate < fromDate:
+                return found
+
+        return self.__storage.queryMessages(limit=limit, **filters)
+
+    def incident(self, incidentId: str, limit: int = 1000) -> List[dict]:
+        """Every page of an incident, oldest first"""
+        return list(reversed(self.find(incidentId=incidentId, limit=limit)))
@@ -0,0 +1,51 @@
+import json
+import os
+from typing import *
+
+class StorageUnavailable(Exception):
+    pass
+
+class MessageSpool(object):
+    """
+    Messages which could not be stored while the database was unreachable. They are appended to a local file, one JSON
+    object per line, and read back in the same order once the database is back. The file survives a restart.
+    """
+
+    def __init__(self, fileLoc: str):
+        # Only used by the writer thread, so there is no locking
+        self.__fileLoc = fileLoc
+
+    def pending(self) -> bool:
+        try:
+            return os.path.getsize(self.__fileLoc) > 0
+        except OSError:
+            return False
+
+    def append(self, messages: List[dict]):
+        with open(self.__fileLoc, 'a', encoding='utf-8') as spoolFile:
+            for message in messages:
+                spoolFile.write(json.dumps(message) + '\n')
+
+            # A spooled message is only safe once it is on disk
+            spoolFile.flush()
+            os.fsync(spoolFile.fileno())
+
+    def read(self, batchSize: int) -> Iterator[List[dict]]:
+        batch = []
+        with open(self.__fileLoc, encoding='utf-8') as spoolFile:
+            for line in spoolFile:
+                try:
+                    batch.append(json.loads(line))
+                except ValueError:
+                    # The tail of a write cut short by a crash
+                    continue
+
+                if len(batch) >= batchSize:
+                    yield batch
+                    batch = []
+
+        if len(batch) > 0:
+            yield batch
+
+    def clear(self):
+        os.remove(self.__fileLoc)
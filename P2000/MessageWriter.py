@@ -0,0 +1,128 @@
+import hashlib
+import threading
+import time
+from typing import *
+from P2000.MessageSpool import MessageSpool, StorageUnavailable
+from P2000.Metrics import Metrics
+from P2000.Storage import Storage
+
+def hashMessage(message: str) -> str:
+    # Same as SHA1(CONVERT(`MESSAGE` USING utf8mb4)) in MySQL, which setup/database.sql uses to fill the column for
+    # existing messages. Hashing the column as it is stored would only match for a UTF-8 column.
+    return hashlib.sha1(message.encode('utf-8')).hexdigest()
+
+class MessageWriter(object):
+    """
+    Write-behind buffer in front of the message storage. Messages are collected by the listener and written by a background thread
+    in batches, with a single commit per batch. A batch is written as soon as it reaches its size, or when the interval
+    has passed, so a crash loses at most one interval worth of messages.
+
+    While the database is unreachable, batches go to the spool on disk instead. They are written in order, before any
+    new batch, once the database is back.
+    """
+
+    def __init__(self, storage: Storage, batchSize: int = 50, batchInterval: float = 1.0, metrics: Optional[Metrics] = None, spool: Optional[MessageSpool] = None):
+        self.__storage = storage
+        self.__spool = spool
+        self.__batchSize = batchSize
+        self.__batchInterval = batchInterval
+        self.__metrics = Metrics() if metrics is None else metrics
+
+        self.__messages = []
+        self.__closed = False
+        self.__condition = threading.Condition()
+        self.__thread = threading.Thread(target=self.__run, name='MessageWriter', daemon=True)
+        self.__thread.start()
+
+    def add(self, rawMessage: str, regionId: int, cityId: int, message: str, date: str, street: str, postalCode: str, type: str, capcodeIds: List[int], incidentId: str = ''):
+        with self.__condition:
+            self.__messages.append({
+                'RAW_MESSAGE': rawMessage,
+                'FK_REGION': regionId,
+                'FK_CITY': cityId,
+                'MESSAGE': message,
+                'MESSAGE_HASH': hashMessage(message),
+                'DATE': date,
+                'STREET': street,
+                'POSTALCODE': postalCode,
+                'TYPE': type,
+                'CAPCODES': capcodeIds,
+                'INCIDENT_ID': incidentId,
+            })
+
+            if len(self.__messages) >= self.__batchSize:
+                self.__condition.notify()
+
+    def close(self):
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify()
+
+        self.__thread.join()
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                deadline = time.monotonic() + self.__batchInterval
+                while not self.__closed and len(self.__messages) < self.__batchSize:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.__condition.wait(remaining)
+
+                batch, self.__messages = self.__messages, []
+                closed = self.__closed
+
+            if len(batch) > 0:
+                self.__flush(batch)
+
+            if closed:
+                return
+
+    def __flush(self, batch: List[dict]):
+        start = self.__metrics.start()
+        if self.__spool is not None and self.__spool.pending():
+            self.__spool.append(batch)
+            self.__metrics.increment('messages_spooled', len(batch))
+            self.__writeSpool()
+        else:
+            self.__store(batch)
+
+        self.__metrics.observe('flush', start)
+
+    def __writeSpool(self):
+        # Batches were stored as one transaction each, so a spool which is cut short halfway is written again as a whole
+        # later on. The upserts make that harmless.
+        stored = 0
+        for batch in self.__spool.read(self.__batchSize):
+            try:
+                self.__storage.storeMessages(batch)
+            except StorageUnavailable:
+                return
+            except Exception as e:
+                self.__metrics.increment('database_errors')
+                print('Could not store', len(batch), 'spooled messages:', repr(e))
+                continue
+
+            stored += len(batch)
+            self.__metrics.increment('messages_stored', len(batch))
+
+        self.__spool.clear()
+        print('Spooled messages stored:', stored)
+
+    def __store(self, batch: List[dict]):
+        try:
+            self.__storage.storeMessages(batch)
+            self.__metrics.increment('messages_stored', len(batch))
+        except StorageUnavailable as e:
+            if self.__spool is None:
+                self.__metrics.increment('database_errors')
+                print('Could not store', len(batch), 'messages:', repr(e))
+                return
+
+            self.__spool.append(batch)
+            self.__metrics.increment('messages_spooled', len(batch))
+            print('Database unreachable,', len(batch), 'messages spooled to disk')
+        except Exception as e:
+            self.__metrics.increment('database_errors')
+            print('Could not store', len(batch), 'messages:', repr(e))
@@ -0,0 +1,135 @@
+import bisect
+import http.server
+import threading
+import time
+from typing import *
+
+# Upper bounds in seconds of the latency histogram buckets, from 10 microseconds for the cheap estimators up to the
+# seconds a stalled database can take
+BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+class Histogram(object):
+    __slots__ = ('counts', 'sum', 'count', 'max')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+class Metrics(object):
+    """
+    Counters and per-stage latency histograms of the listener. When disabled, start() returns 0 and every other call
+    returns right away, so instrumented code pays no more than a method call.
+    """
+
+    def __init__(self, enabled: bool = False, prefix: str = 'p2000'):
+        self.enabled = enabled
+        self.__prefix = prefix
+        self.__counters = {}
+        self.__histograms = {}
+        self.__gauges = {}
+        self.__lock = threading.Lock()
+
+    def start(self) -> float:
+        if not self.enabled:
+            return 0.0
+
+        return time.perf_counter()
+
+    def observe(self, stage: str, start: float):
+        if not self.enabled:
+            return
+
+        elapsed = time.perf_counter() - start
+        with self.__lock:
+            histogram = self.__histograms.get(stage)
+            if histogram is None:
+                histogram = self.__histograms[stage] = Histogram()
+
+            bucket = bisect.bisect_left(BUCKETS, elapsed)
+            if bucket < len(BUCKETS):
+                histogram.counts[bucket] += 1
+            histogram.sum += elapsed
+            histogram.count += 1
+            if elapsed > histogram.max:
+                histogram.max = elapsed
+
+    def increment(self, name: str, amount: int = 1):
+        if not self.enabled:
+            return
+
+        with self.__lock:
+            self.__counters[name] = self.__counters.get(name, 0) + amount
+
+    def gauge(self, name: str, callback: Callable[[], float]):
+        # Gauges are read when the metrics are rendered, so they cost nothing in between
+        self.__gauges[name] = callback
+
+    def render(self) -> str:
+        # Prometheus text exposition format
+        lines = []
+        with self.__lock:
+            for name in sorted(self.__counters.keys()):
+                lines.append('# TYPE %s_%s_total counter' % (self.__prefix, name))
+                lines.append('%s_%s_total %d' % (self.__prefix, name, self.__counters[name]))
+
+            if len(self.__histograms) > 0:
+                lines.append('# TYPE %s_stage_seconds histogram' % self.__prefix)
+            for stage in sorted(self.__histograms.keys()):
+                histogram = self.__histograms[stage]
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.counts):
+                    cumulative += count
+                    lines.append('%s_stage_seconds_bucket{stage="%s",le="%g"} %d' % (self.__prefix, stage, bound, cumulative))
+                lines.append('%s_stage_seconds_bucket{stage="%s",le="+Inf"} %d' % (self.__prefix, stage, histogram.count))
+                lines.append('%s_stage_seconds_sum{stage="%s"} %.6f' % (self.__prefix, stage, histogram.sum))
+                lines.append('%s_stage_seconds_count{stage="%s"} %d' % (self.__prefix, stage, histogram.count))
+
+        for name in sorted(self.__gauges.keys()):
+            lines.append('# TYPE %s_%s gauge' % (self.__prefix, name))
+            lines.append('%s_%s %g' % (self.__prefix, name, self.__gauges[name]()))
+
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> str:
+        with self.__lock:
+            parts = ['%s=%d' % (name, count) for name, count in sorted(self.__counters.items())]
+            for stage, histogram in sorted(self.__histograms.items()):
+                parts.append('%s=%.2f/%.2fms' % (stage, histogram.sum / histogram.count * 1000, histogram.max * 1000))
+
+        return ' '.join(parts)
+
+    def startServer(self, host: str, port: int) -> http.server.HTTPServer:
+        metrics = self
+
+        class MetricsHandler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Scrapes would otherwise end up between the pages on the console
+                pass
+
+        server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='MetricsServer', daemon=True).start()
+        return server
+
+    def startLogging(self, interval: float):
+        def log():
+            while True:
+                time.sleep(interval)
+                # Stage timings are logged as mean/max
+                print('Metrics:', self.summary())
+
+        threading.Thread(target=log, name='MetricsLogger', daemon=True).start()
@@ -0,0 +1,104 @@
+from typing import *
+from P2000 import Database, MessageQuery
+from P2000.Capcode import Capcode
+from P2000.ReferenceSnapshot import ReferenceSnapshot
+from P2000.Storage import Storage
+
+INSERT_CAPCODE = (
+    'INSERT INTO `D_CAPCODE` (`CAPCODE`, `FK_REGION`, `DESCRIPTION`, `TYPE`, `CITY`) VALUES (%s, %s, %s, %s, %s) ' +
+    'ON DUPLICATE KEY UPDATE `PK_CAPCODE` = LAST_INSERT_ID(`PK_CAPCODE`)'
+)
+
+class MySQLStorage(Storage):
+    BACKEND = 'mysql'
+
+    def __init__(self, databaseConf, poolSize: int = 4, retries: int = 3, retryDelay: float = 1.0):
+        self.databaseConf = databaseConf
+        self.__pool = Database.ConnectionPool(databaseConf, poolSize, retries, retryDelay)
+
+    def connect(self):
+        # Long running jobs like replays get a connection of their own instead of a pooled one
+        return Database.connect(self.databaseConf)
+
+    def fetchReferenceVersion(self) -> tuple:
+        return self.__pool.run(lambda db: ReferenceSnapshot.fetchVersion(db.cursor(dictionary=True)))
+
+    def fetchReferenceData(self) -> Dict[str, Any]:
+        return self.__pool.run(lambda db: ReferenceSnapshot.fetch(db.cursor(dictionary=True)))
+
+    def insertCapcode(self, capcode: Capcode) -> int:
+        # Not retried, a worker waiting on the database would hold up reception
+        return self.__pool.run(lambda db: self.__insertCapcode(db, capcode), retries=0)
+
+    def storeMessages(self, batch: List[dict]):
+        self.__pool.run(lambda db: self.__storeMessages(db, batch))
+
+    def fetchMessages(self, afterPK: int, fromDate: Optional[str], limit: int) -> List[dict]:
+        query = 'SELECT `PK_MESSAGE`, `RAW_MESSAGE` FROM `F_MESSAGE` WHERE `PK_MESSAGE` > %s'
+        params = [afterPK]
+        if fromDate is not None:
+            query += ' AND `DATE` >= %s'
+            params.append(fromDate)
+
+        return self.__pool.run(lambda db: self.__fetchAll(db, query + ' ORDER BY `PK_MESSAGE` ASC LIMIT %s', params + [limit]))
+
+    def queryMessages(self, limit: int = 50, **filters) -> List[dict]:
+        return self.__pool.run(lambda db: self.__queryMessages(db, limit, filters))
+
+    def close(self):
+        self.__pool.close()
+
+    def __fetchAll(self, db, query: str, params: list) -> List[dict]:
+        dbCursor = db.cursor(dictionary=True)
+        dbCursor.execute(query, params)
+        return dbCursor.fetchall()
+
+    def __queryMessages(self, db, limit: int, filters: dict) -> List[dict]:
+        messages = self.__fetchAll(db, *MessageQuery.buildQuery(limit=limit, **filters))
+        for message in messages:
+            message['DATE'] = message['DATE'].strftime('%Y-%m-%d %H:%M:%S')
+
+        if len(messages) == 0:
+            return messages
+
+        pks = [message['PK_MESSAGE'] for message in messages]
+        return MessageQuery.withCapcodes(messages, self.__fetchAll(db, MessageQuery.CAPCODES_QUERY.format(', '.join(['%s'] * len(pks))), pks))
+
+    def __insertCapcode(self, db, capcode: Capcode) -> int:
+        # A capcode which is already stored, but missing from a cache loaded earlier, returns its own id
+        dbCursor = db.prepared(INSERT_CAPCODE)
+        dbCursor.execute(INSERT_CAPCODE, (capcode.capcode, -1, capcode.description, capcode.type, capcode.city))
+        db.commit()
+
+        return dbCursor.lastrowid
+
+    def __storeMessages(self, db, batch: List[dict]):
+        dbCursor = db.cursor(dictionary=True)
+
+        # Duplicates only fill in what we learned since the message was stored first, which the server merges
+        dbCursor.executemany(
+            'INSERT INTO `F_MESSAGE` (`RAW_MESSAGE`, `FK_REGION`, `FK_CITY`, `MESSAGE`, `MESSAGE_HASH`, `DATE`, `STREET`, `POSTALCODE`, `TYPE`, `INCIDENT_ID`) ' +
+            'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s) ' +
+            'ON DUPLICATE KEY UPDATE ' +
+            '`INCIDENT_ID` = IF(`INCIDENT_ID` = \'\', VALUES(`INCIDENT_ID`), `INCIDENT_ID`), ' +
+            '`STREET` = IF(VALUES(`STREET`) != \'\', VALUES(`STREET`), `STREET`), ' +
+            '`POSTALCODE` = IF(VALUES(`POSTALCODE`) != \'\', VALUES(`POSTALCODE`), `POSTALCODE`), ' +
+            '`FK_REGION` = IF(VALUES(`FK_REGION`) > 0, VALUES(`FK_REGION`), `FK_REGION`)', [
+                # Spooled before incidents were correlated, when there is no INCIDENT_ID
+                (row['RAW_MESSAGE'], row['FK_REGION'], row['FK_CITY'], row['MESSAGE'], row['MESSAGE_HASH'], row['DATE'], row['STREET'], row['POSTALCODE'], row['TYPE'], row.get('INCIDENT_ID', ''))
+                for row in batch
+            ])
+
+        # The capcodes are linked by the key of their message, so the server looks up the primary keys itself instead of
+        # sending them back first
+        links = list(dict.fromkeys((row['MESSAGE_HASH'], row['DATE'], capcodeId) for row in batch for capcodeId in row['CAPCODES']))
+        if len(links) > 0:
+            dbCursor.execute(
+                'INSERT IGNORE INTO `X_MESSAGE_CAPCODE` (`FK_MESSAGE`, `FK_CAPCODE`) ' +
+                'SELECT `M`.`PK_MESSAGE`, `L`.`FK_CAPCODE` FROM (' +
+                ' UNION ALL '.join(['SELECT %s AS `MESSAGE_HASH`, CAST(%s AS DATETIME) AS `DATE`, %s AS `FK_CAPCODE`'] * len(links)) +
+                ') `L` INNER JOIN `F_MESSAGE` `M` ON `M`.`MESSAGE_HASH` = `L`.`MESSAGE_HASH` AND `M`.`DATE` = `L`.`DATE`',
+                [value for link in links for value in link]
+            )
+
+        db.commit()
@@ -0,0 +1,114 @@
+import csv
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import *
+from P2000.ServiceType import ServiceType
+
+DISCIPLINE_TYPES = {
+    'BRW': ServiceType.FIREFIGHTER.value,
+    'GMK': ServiceType.FIREFIGHTER.value,
+    'OCB': ServiceType.FIREFIGHTER.value,
+    'AMBU': ServiceType.AMBULANCE.value,
+    'MKA': ServiceType.AMBULANCE.value,
+    'LifeLiner': ServiceType.AMBULANCE.value,
+    'BRUG': ServiceType.CITY.value,
+    'GHOR': ServiceType.CITY.value,
+    'POL': ServiceType.POLICE.value,
+    'RB': ServiceType.RESCUEBRIGADE.value,
+    'KNRM': ServiceType.KNRM.value,
+    'KNRM-KWC': ServiceType.KNRM.value,
+    'KNBRD': ServiceType.KNRM.value,
+    'MIRG': ServiceType.KNRM.value,
+}
+
+CAPCODE = re.compile(r'^[0-9]{7}$')
+
+# Longest value the VARCHAR(255) columns of D_CAPCODE and D_CITY can hold
+MAX_LENGTH = 255
+
+class ParseError:
+    def __init__(self, fileLoc: str, line: int, reason: str):
+        self.fileLoc = fileLoc
+        self.line = line
+        self.reason = reason
+
+    def __str__(self):
+        return '%s:%d: %s' % (self.fileLoc, self.line, self.reason)
+
+def parseRegions(fileLoc: str) -> Tuple[Dict[int, str], List[ParseError]]:
+    regions = {}
+    errors = []
+    with open(fileLoc) as csvFile:
+        reader = csv.DictReader(csvFile, delimiter=',')
+        for row in reader:
+            if not (row.get('regioCode') or '').isdigit() or not row.get('regioNaam'):
+                errors.append(ParseError(fileLoc, reader.line_num, 'invalid region'))
+                continue
+
+            regions[int(row['regioCode'])] = row['regioNaam']
+
+    return regions, errors
+
+def parseCities(fileLoc: str) -> Tuple[Dict[str, str], List[ParseError]]:
+    cities = {}
+    errors = []
+    with open(fileLoc) as csvFile:
+        reader = csv.DictReader(csvFile, delimiter=',')
+        for row in reader:
+            if not row.get('afkorting') or not row.get('plaatsnaam'):
+                errors.append(ParseError(fileLoc, reader.line_num, 'missing name or acronym'))
+                continue
+
+            if row['afkorting'] in cities:
+                errors.append(ParseError(fileLoc, reader.line_num, 'duplicate acronym ' + row['afkorting']))
+
+            cities[row['afkorting']] = row['plaatsnaam']
+
+    return cities, errors
+
+def parseCapcodeFile(regionId: int, fileLoc: str) -> Tuple[List[Tuple[str, int, str, str, str]], List[ParseError]]:
+    capcodes = []
+    errors = []
+    try:
+        with open(fileLoc) as csvFile:
+            reader = csv.DictReader(csvFile, delimiter=',')
+            for row in reader:
+                # Rows with missing or extra columns are reported instead of being stored half
+                if None in row or None in row.values():
+                    errors.append(ParseError(fileLoc, reader.line_num, 'expected 4 columns'))
+                    continue
+
+                if CAPCODE.match(row['capcode']) is None:
+                    errors.append(ParseError(fileLoc, reader.line_num, 'invalid capcode ' + row['capcode']))
+                    continue
+
+                if len(row['beschrijving']) > MAX_LENGTH or len(row['locatie/divisie']) > MAX_LENGTH:
+                    errors.append(ParseError(fileLoc, reader.line_num, 'value longer than %d characters' % MAX_LENGTH))
+                    continue
+
+                capcodes.append((
+                    row['capcode'],
+                    regionId,
+                    row['beschrijving'],
+                    DISCIPLINE_TYPES.get(row['discipline'], ServiceType.UNKNOWN.value),
+                    row['locatie/divisie']
+                ))
+    except (OSError, csv.Error, UnicodeDecodeError) as e:
+        errors.append(ParseError(fileLoc, 0, repr(e)))
+
+    return capcodes, errors
+
+def parseCapcodeFiles(files: Dict[int, str], workers: Optional[int] = None) -> Tuple[Dict[str, Tuple[int, str, str, str]], List[ParseError]]:
+    capcodes = {}
+    errors = []
+    regionIds = sorted(files.keys())
+
+    # Files are parsed concurrently, but merged in region order so a capcode listed in multiple regions ends up in the
+    # last one
+    with ProcessPoolExecutor(workers) as pool:
+        for fileCapcodes, fileErrors in pool.map(parseCapcodeFile, regionIds, [files[regionId] for regionId in regionIds]):
+            for capcode, regionId, description, type, city in fileCapcodes:
+                capcodes[capcode] = (regionId, description, type, city)
+            errors.extend(fileErrors)
+
+    return capcodes, errors
@@ -0,0 +1,75 @@
+import os
+import pickle
+from typing import *
+from P2000.Capcode import CapcodeCollection
+from P2000.City import CityCollection
+from P2000.Region import RegionCollection
+
+class ReferenceSnapshot(object):
+    """
+    Local copy of D_CAPCODE, D_CITY and D_REGION, stamped with the checksums of those tables. It lets the listener start
+    without waiting on three full table queries, the snapshot is only refreshed when the checksums no longer match.
+    """
+
+    # Bumped whenever the layout of the snapshot changes, older snapshots are then ignored
+    FORMAT = 1
+
+    def __init__(self, fileLoc: str):
+        self.__fileLoc = fileLoc
+
+    @staticmethod
+    def fetchVersion(dbCursor) -> tuple:
+        dbCursor.execute('CHECKSUM TABLE `D_CITY`, `D_REGION`')
+        version = [(row['Table'].split('.')[-1], row['Checksum']) for row in dbCursor.fetchall()]
+
+        # The unknown capcodes the listener adds itself (region -1) are left out, or every new capcode would make the
+        # listener reload all of the reference data
+        dbCursor.execute(
+            'SELECT COUNT(*) AS `CAPCODES`, ' +
+            'BIT_XOR(CRC32(CONCAT_WS(\'|\', `PK_CAPCODE`, `CAPCODE`, `FK_REGION`, `DESCRIPTION`, `TYPE`, `CITY`))) AS `CHECKSUM` ' +
+            'FROM `D_CAPCODE` WHERE `FK_REGION` != -1'
+        )
+        row = dbCursor.fetchone()
+        version.append(('D_CAPCODE', (row['CAPCODES'], row['CHECKSUM'])))
+
+        return tuple(sorted(version))
+
+    @staticmethod
+    def fetch(dbCursor, version: Optional[tuple] = None) -> Dict[str, Any]:
+        # The version is taken first, so changes made while the tables are read make the snapshot stale instead of
+        # getting lost. Backends without CHECKSUM TABLE pass their own.
+        data = {
+            'format': ReferenceSnapshot.FORMAT,
+            'version': ReferenceSnapshot.fetchVersion(dbCursor) if version is None else version,
+        }
+
+        for key, query in [('capcodes', CapcodeCollection.QUERY), ('cities', CityCollection.QUERY), ('regions', RegionCollection.QUERY)]:
+            dbCursor.execute(query)
+            data[key] = [dict(row) for row in dbCursor.fetchall()]
+
+        return data
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.__fileLoc, 'rb') as snapshotFile:
+                data = pickle.load(snapshotFile)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print('Reference snapshot ignored:', repr(e))
+            return None
+
+        if not isinstance(data, dict) or data.get('format') != self.FORMAT:
+            return None
+
+        return data
+
+    def save(self, data: Dict[str, Any]):
+        # Written next to the snapshot first, so a crash halfway never leaves a broken snapshot behind
+        tmpFileLoc = self.__fileLoc + '.tmp'
+        try:
+            with open(tmpFileLoc, 'wb') as snapshotFile:
+                pickle.dump(data, snapshotFile, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpFileLoc, self.__fileLoc)
+        except OSError as e:
+            print('Reference snapshot not saved:', repr(e))
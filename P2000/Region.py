@@ -1,11 +1,15 @@
 from typing import *
 
 class Region:
+    __slots__ = ('id', 'name')
+
     def __init__(self, id, name):
         self.id = id
         self.name = name
 
 class RegionCollection:
+    QUERY = "SELECT `PK_REGION`, `NAME` FROM `D_REGION`"
+
     def __init__(self, regions: Dict[int, Region]):
         self.__regions = regions
 
@@ -20,9 +24,13 @@ class RegionCollection:
 
     @staticmethod
     def initList(dbCursor):
-        dbCursor.execute("SELECT `PK_REGION`, `NAME` FROM `D_REGION`")
+        dbCursor.execute(RegionCollection.QUERY)
+        return RegionCollection.fromRows(dbCursor.fetchall())
+
+    @staticmethod
+    def fromRows(rows):
         regions = {}
-        for region in dbCursor.fetchall():
+        for region in rows:
             regions[region['PK_REGION']] = Region(region['PK_REGION'], region['NAME'])
 
         return RegionCollection(regions)
\ No newline at end of file
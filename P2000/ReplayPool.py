@@ -0,0 +1,124 @@
+import multiprocessing
+from typing import *
+from P2000.Capcode import CapcodeCollection
+from P2000.City import CityCollection
+from P2000.Message import Message
+from P2000.MessageEnricher import EnrichedMessage, MessageEnricher
+from P2000.Region import RegionCollection
+from P2000.StreetRules import StreetRuleCollection
+
+# Overwrites the whole estimate, for messages whose reference data changed
+UPDATE_ENRICHMENT = (
+    'UPDATE `F_MESSAGE` SET `FK_REGION` = %(FK_REGION)s, `FK_CITY` = %(FK_CITY)s, `STREET` = %(STREET)s, ' +
+    '`POSTALCODE` = %(POSTALCODE)s, `TYPE` = %(TYPE)s WHERE `PK_MESSAGE` = %(PK_MESSAGE)s'
+)
+
+# Only fills in what was learned, the same as storing a message again does in a replay in one process
+UPDATE_REPLAY = (
+    'UPDATE `F_MESSAGE` SET ' +
+    '`STREET` = IF(%(STREET)s != \'\', %(STREET)s, `STREET`), ' +
+    '`POSTALCODE` = IF(%(POSTALCODE)s != \'\', %(POSTALCODE)s, `POSTALCODE`), ' +
+    '`FK_REGION` = IF(%(FK_REGION)s > 0, %(FK_REGION)s, `FK_REGION`) WHERE `PK_MESSAGE` = %(PK_MESSAGE)s'
+)
+
+def enrichmentRow(enriched: EnrichedMessage, messagePK: int) -> dict:
+    return {
+        'FK_REGION': enriched.region.id,
+        'FK_CITY': enriched.city.id,
+        'STREET': enriched.street,
+        'POSTALCODE': enriched.postalCode,
+        'TYPE': enriched.type,
+        'PK_MESSAGE': messagePK,
+    }
+
+# Every worker process loads the caches once and keeps them for all the ranges it enriches
+_workerCursor = None
+_workerEnricher = None
+
+def _initWorker(databaseConf: Dict[str, str]):
+    global _workerCursor, _workerEnricher
+
+    # Imported here, so the listener can use the SQLite storage without mysql-connector installed
+    from P2000 import Database
+
+    _workerCursor = Database.connect(databaseConf).cursor(dictionary=True)
+    _workerEnricher = MessageEnricher(
+        CapcodeCollection.initList(_workerCursor),
+        CityCollection.initList(_workerCursor),
+        RegionCollection.initList(_workerCursor),
+        StreetRuleCollection.initList()
+    )
+
+def _enrichRange(task: Tuple[Tuple[int, int], Optional[str]]) -> Tuple[Tuple[int, int], List[dict]]:
+    pkRange, fromDate = task
+    query = 'SELECT `PK_MESSAGE`, `RAW_MESSAGE` FROM `F_MESSAGE` WHERE `PK_MESSAGE` BETWEEN %s AND %s'
+    params = list(pkRange)
+    if fromDate is not None:
+        query += ' AND `DATE` >= %s'
+        params.append(fromDate)
+
+    _workerCursor.execute(query, params)
+
+    results = []
+    for row in _workerCursor.fetchall():
+        message = Message(row['RAW_MESSAGE'])
+        if message.isValidMessage() == False:
+            continue
+
+        results.append(enrichmentRow(_workerEnricher.enrich(message), row['PK_MESSAGE']))
+
+    return pkRange, results
+
+class ReplayPool(object):
+    """
+    Replays messages with a pool of processes, which each enrich ranges of primary keys. The results are stored like a
+    replay in one process stores them, but incidents are skipped: the ranges are enriched out of order, so the pages of an
+    incident are not seen one after the other. Messages keep the INCIDENT_ID they have.
+    """
+
+    def __init__(self, db, databaseConf: Dict[str, str], workers: int, chunkSize: int = 5000):
+        self.__db = db
+        self.__dbCursor = db.cursor(dictionary=True)
+        self.__databaseConf = databaseConf
+        self.__workers = workers
+        self.__chunkSize = chunkSize
+
+    def replay(self, fromPK: int = 0, fromDate: Optional[str] = None):
+        query = 'SELECT MIN(`PK_MESSAGE`) AS `FIRST`, MAX(`PK_MESSAGE`) AS `LAST` FROM `F_MESSAGE` WHERE `PK_MESSAGE` >= %s'
+        params = [fromPK]
+        if fromDate is not None:
+            query += ' AND `DATE` >= %s'
+            params.append(fromDate)
+
+        self.__dbCursor.execute(query, params)
+        bounds = self.__dbCursor.fetchone()
+        if bounds is None or bounds['FIRST'] is None:
+            return
+
+        ranges = [
+            (first, min(first + self.__chunkSize - 1, bounds['LAST']))
+            for first in range(bounds['FIRST'], bounds['LAST'] + 1, self.__chunkSize)
+        ]
+
+        # The workers only read and enrich, all updates go through this single connection
+        updated = 0
+        finished = set()
+        nextRange = 0
+        with multiprocessing.Pool(self.__workers, initializer=_initWorker, initargs=(self.__databaseConf,)) as pool:
+            for pkRange, results in pool.imap_unordered(_enrichRange, [(pkRange, fromDate) for pkRange in ranges]):
+                if len(results) > 0:
+                    self.__dbCursor.executemany(UPDATE_REPLAY, results)
+                    self.__db.commit()
+
+                updated += len(results)
+
+                # Ranges finish out of order, a replay can only be resumed after the ones which all finished
+                finished.add(pkRange)
+                while nextRange < len(ranges) and ranges[nextRange] in finished:
+                    finished.remove(ranges[nextRange])
+                    nextRange += 1
+
+                if nextRange > 0:
+                    print('Messages replayed:', updated, '- all done up to PK_MESSAGE', ranges[nextRange - 1][1])
+                else:
+                    print('Messages replayed:', updated)
@@ -0,0 +1,162 @@
+import os
+import sqlite3
+import threading
+from typing import *
+from P2000.Capcode import Capcode
+from P2000 import MessageQuery
+from P2000.MessageSpool import StorageUnavailable
+from P2000.ReferenceSnapshot import ReferenceSnapshot
+from P2000.Storage import Storage
+
+SCHEMA = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'setup', 'database.sqlite.sql')
+
+def dictFactory(cursor, row) -> dict:
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+def connect(fileLoc: str):
+    db = sqlite3.connect(fileLoc, timeout=5.0, check_same_thread=False)
+    db.row_factory = dictFactory
+
+    # Readers never block the writer with a write-ahead log, and a commit only has to wait for the log to be written
+    db.execute('PRAGMA journal_mode = WAL')
+    db.execute('PRAGMA synchronous = NORMAL')
+    return db
+
+# Columns added since the first release of the schema, which CREATE TABLE IF NOT EXISTS does not add to existing files
+COLUMNS = [
+    ('F_MESSAGE', 'INCIDENT_ID', "VARCHAR(32) DEFAULT '' NOT NULL"),
+]
+
+def createSchema(db):
+    for table, column, definition in COLUMNS:
+        columns = [row['name'] for row in db.execute('PRAGMA table_info(`' + table + '`)')]
+        if len(columns) > 0 and column not in columns:
+            db.execute('ALTER TABLE `' + table + '` ADD COLUMN `' + column + '` ' + definition)
+
+    with open(SCHEMA) as schemaFile:
+        db.executescript(schemaFile.read())
+
+class SQLiteStorage(Storage):
+    """
+    Local database file for receivers without a MySQL server. Every thread gets a connection of its own, the write-ahead
+    log lets the readers carry on while the writer thread commits a batch.
+    """
+
+    BACKEND = 'sqlite'
+
+    def __init__(self, fileLoc: str):
+        self.__fileLoc = fileLoc
+        self.__local = threading.local()
+        self.__connections = []
+        self.__lock = threading.Lock()
+
+        createSchema(self.__connection())
+
+    def fetchReferenceVersion(self) -> tuple:
+        return self.__run(lambda db: self.__fetchVersion(db))
+
+    def fetchReferenceData(self) -> Dict[str, Any]:
+        def fetch(db):
+            dbCursor = db.cursor()
+            return ReferenceSnapshot.fetch(dbCursor, self.__fetchVersion(db))
+
+        return self.__run(fetch)
+
+    def insertCapcode(self, capcode: Capcode) -> int:
+        def insert(db):
+            with db:
+                db.execute(
+                    'INSERT INTO `D_CAPCODE` (`CAPCODE`, `FK_REGION`, `DESCRIPTION`, `TYPE`, `CITY`) VALUES (?, ?, ?, ?, ?) ' +
+                    'ON CONFLICT (`CAPCODE`) DO NOTHING',
+                    (capcode.capcode, -1, capcode.description, capcode.type, capcode.city)
+                )
+                return db.execute('SELECT `PK_CAPCODE` FROM `D_CAPCODE` WHERE `CAPCODE` = ?', (capcode.capcode,)).fetchone()['PK_CAPCODE']
+
+        return self.__run(insert)
+
+    def storeMessages(self, batch: List[dict]):
+        self.__run(lambda db: self.__storeMessages(db, batch))
+
+    def fetchMessages(self, afterPK: int, fromDate: Optional[str], limit: int) -> List[dict]:
+        query = 'SELECT `PK_MESSAGE`, `RAW_MESSAGE` FROM `F_MESSAGE` WHERE `PK_MESSAGE` > ?'
+        params = [afterPK]
+        if fromDate is not None:
+            query += ' AND `DATE` >= ?'
+            params.append(fromDate)
+
+        return self.__run(lambda db: db.execute(query + ' ORDER BY `PK_MESSAGE` ASC LIMIT ?', params + [limit]).fetchall())
+
+    def queryMessages(self, limit: int = 50, **filters) -> List[dict]:
+        def query(db):
+            query, params = MessageQuery.buildQuery(limit=limit, **filters)
+            messages = db.execute(query.replace('%s', '?'), params).fetchall()
+            if len(messages) == 0:
+                return messages
+
+            pks = [message['PK_MESSAGE'] for message in messages]
+            return MessageQuery.withCapcodes(messages, db.execute(MessageQuery.CAPCODES_QUERY.format(', '.join(['?'] * len(pks))), pks))
+
+        return self.__run(query)
+
+    def close(self):
+        with self.__lock:
+            for db in self.__connections:
+                db.close()
+            self.__connections = []
+
+    def __connection(self):
+        db = getattr(self.__local, 'db', None)
+        if db is None:
+            db = self.__local.db = connect(self.__fileLoc)
+            with self.__lock:
+                self.__connections.append(db)
+
+        return db
+
+    def __run(self, work: Callable):
+        try:
+            return work(self.__connection())
+        except sqlite3.OperationalError as e:
+            # A database which stays locked, or a disk which is full or gone, is treated like an unreachable server so
+            # the messages are spooled
+            raise StorageUnavailable(repr(e)) from e
+
+    def __fetchVersion(self, db) -> tuple:
+        return tuple((row['NAME'], row['VERSION']) for row in db.execute('SELECT `NAME`, `VERSION` FROM `D_VERSION` ORDER BY `NAME`'))
+
+    def __storeMessages(self, db, batch: List[dict]):
+        with db:
+            # Duplicates only fill in what we learned since the message was stored first
+            db.executemany(
+                'INSERT INTO `F_MESSAGE` (`RAW_MESSAGE`, `FK_REGION`, `FK_CITY`, `MESSAGE`, `MESSAGE_HASH`, `DATE`, `STREET`, `POSTALCODE`, `TYPE`, `INCIDENT_ID`) ' +
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ' +
+                'ON CONFLICT (`MESSAGE_HASH`, `DATE`) DO UPDATE SET ' +
+                '`INCIDENT_ID` = CASE WHEN `INCIDENT_ID` = \'\' THEN excluded.`INCIDENT_ID` ELSE `INCIDENT_ID` END, ' +
+                '`STREET` = CASE WHEN excluded.`STREET` != \'\' THEN excluded.`STREET` ELSE `STREET` END, ' +
+                '`POSTALCODE` = CASE WHEN excluded.`POSTALCODE` != \'\' THEN excluded.`POSTALCODE` ELSE `POSTALCODE` END, ' +
+                '`FK_REGION` = CASE WHEN excluded.`FK_REGION` > 0 THEN excluded.`FK_REGION` ELSE `FK_REGION` END', [
+                    # Spooled before incidents were correlated, when there is no INCIDENT_ID
+                    (row['RAW_MESSAGE'], row['FK_REGION'], row['FK_CITY'], row['MESSAGE'], row['MESSAGE_HASH'], row['DATE'], row['STREET'], row['POSTALCODE'], row['TYPE'], row.get('INCIDENT_ID', ''))
+                    for row in batch
+                ])
+
+            keys = list(dict.fromkeys((row['MESSAGE_HASH'], row['DATE']) for row in batch))
+            messagePKs = {}
+            for storedMessage in db.execute(
+                'SELECT `PK_MESSAGE`, `MESSAGE_HASH`, `DATE` FROM `F_MESSAGE` WHERE (`MESSAGE_HASH`, `DATE`) IN (' +
+                ', '.join(['(?, ?)'] * len(keys)) + ')',
+                [value for key in keys for value in key]
+            ):
+                messagePKs[(storedMessage['MESSAGE_HASH'], storedMessage['DATE'])] = storedMessage['PK_MESSAGE']
+
+            links = []
+            for row in batch:
+                messagePK = messagePKs.get((row['MESSAGE_HASH'], row['DATE']))
+                if messagePK is None:
+                    continue
+
+                for capcodeId in row['CAPCODES']:
+                    links.append((messagePK, capcodeId))
+
+            if len(links) > 0:
+                db.executemany('INSERT OR IGNORE INTO `X_MESSAGE_CAPCODE` (`FK_MESSAGE`, `FK_CAPCODE`) VALUES (?, ?)', links)
@@ -0,0 +1,62 @@
+import abc
+import configparser
+import os
+from typing import *
+from P2000.Capcode import Capcode
+
+class Storage(abc.ABC):
+    """
+    Everything the listener reads from and writes to its database. The backend is chosen with `Backend` in the
+    [STORAGE] section of config.ini.
+    """
+
+    BACKEND = None
+
+    @abc.abstractmethod
+    def fetchReferenceVersion(self) -> tuple:
+        """Cheap stamp of D_CAPCODE, D_CITY and D_REGION which changes whenever one of them does, apart from the unknown
+        capcodes added by insertCapcode"""
+
+    @abc.abstractmethod
+    def fetchReferenceData(self) -> Dict[str, Any]:
+        """The capcode, city and region rows, in the layout of ReferenceSnapshot"""
+
+    @abc.abstractmethod
+    def insertCapcode(self, capcode: Capcode) -> int:
+        """Adds an unknown capcode, or finds the one stored already, and returns its id"""
+
+    @abc.abstractmethod
+    def storeMessages(self, batch: List[dict]):
+        """Upserts a batch of MessageWriter rows and links their capcodes, in a single transaction"""
+
+    @abc.abstractmethod
+    def fetchMessages(self, afterPK: int, fromDate: Optional[str], limit: int) -> List[dict]:
+        """PK_MESSAGE and RAW_MESSAGE of the next messages after afterPK, by primary key"""
+
+    @abc.abstractmethod
+    def queryMessages(self, capcode: Optional[str] = None, regionId: Optional[int] = None, cityId: Optional[int] = None, type: Optional[str] = None,
+                      incidentId: Optional[str] = None, fromDate: Optional[str] = None, toDate: Optional[str] = None, limit: int = 50) -> List[dict]:
+        """The newest messages matching every filter given, with the capcodes they were sent to, see MessageQuery"""
+
+    def close(self):
+        pass
+
+def create(config: configparser.ConfigParser, rootDir: str) -> Storage:
+    backend = config.get('STORAGE', 'Backend', fallback='mysql')
+
+    # Backends are only imported when used, so a SQLite receiver does not need mysql-connector installed
+    if backend == 'sqlite':
+        from P2000.SQLiteStorage import SQLiteStorage
+        return SQLiteStorage(os.path.join(rootDir, config.get('STORAGE', 'File', fallback='p2000.sqlite')))
+
+    if backend == 'mysql':
+        from P2000.MySQLStorage import MySQLStorage
+        databaseConf = config['DATABASE']
+        return MySQLStorage(
+            databaseConf,
+            databaseConf.getint('PoolSize', 4),
+            databaseConf.getint('Retries', 3),
+            databaseConf.getfloat('RetryDelay', 1.0)
+        )
+
+    raise ValueError('Invalid storage backend: ' + backend)
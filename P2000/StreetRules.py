@@ -0,0 +1,152 @@
+import re
+from typing import *
+from P2000.City import City, _lower
+from P2000.ServiceType import ServiceType
+
+FIREFIGHTER_CALL_TYPES = [
+    r'Liftopsluiting',
+    r'Stank\/hind\. lucht(?: \([^)]+\))?(?: \([^)]+\))?',
+    r'Contact mkb Verontr\. opp\.water(?: \([^)]+\))?',
+    r'(?:\([^)]+\) )?BR [a-z\/]+(?: \([^)]+\))?(?: \([^)]+\))?',
+    r'(?: \([^)]+\))?Ass\. Ambu(?: \([^)]+\))?',
+    r'(?: \([^)]+\))?Ass\. Politie(?: \([^)]+\))?',
+    r'Ongeval gev(?:\.|aarlijke) stof(?:fen)?(?: \([^)]+\))?(?: \([^)]+\))?',
+    r'Dier in problemen',
+    r'Brandgerucht',
+    r'\([^)]+\) Contact [A-Z]+',
+    r'(?:BR|Ongeval) wegvervoer(?: \([^)]+\))?(?: \([^)]+\))?',
+    r'\([^)]+\) Ongeval wegvervoer',
+    r'OMS (?:(?:br|h)andmeld(?:er|ing)|beheersysteem)',
+    r'Nacontrole(?: \([^)]+\))?',
+    r'CO-melder(?: \([^)]+\))?',
+    r'Dienstverlening(?: \([^)]+\))?',
+    r'Ongeval op water(?: \([^)]+\))?(?: \([^)]+\))?',
+    r'Voertuig te water(?: \([^)]+\))?',
+    r'Wateroverlast(?: \([^)]+\))?',
+    r'Dier te water(?: \([^)]+\))?',
+    r'Dier op hoogte(?: [A-Z]+)?(?: [A-Z]+)?(?: \([^)]+\))?',
+    r'Buitensluiting(?: \([^)]+\))?',
+    r'Reanimatie(?: \([^)]+\))?',
+    r'Rookmelder',
+    r'Ongeval',
+]
+
+POLICE_CALL_TYPES = [
+    r'Steekpartij',
+    r'(?:Ongeval|Verkeer|Veiligheid en openbare orde)\/[a-z\/\.]+\/[a-z\/\. ]+ prio [0-9]',
+    r'(?:Aanrijding|ongeval)(?:\s+wegvervoer)?(?:\s+(?:letsel|materieel))?',
+    r'Achtervolging',
+    r'Schietpartij',
+    r'Explosie',
+    r'Letsel',
+]
+
+# Bridge keepers are paged on capcodes which carry the name of the bridge in their description
+BRIDGE_KEEPER = re.compile(r'^Brugwacht(?:er)?\s+(.*)', re.IGNORECASE)
+
+class StreetRule:
+    def __init__(self, types: List[str], pattern: str, regions: Optional[List[int]] = None, callTypes: Optional[List[str]] = None):
+        self.types = types
+        self.regions = None if regions is None else frozenset(regions)
+
+        # The call types are interpolated once, which leaves the city name or acronym as the only variable part
+        self.pattern = pattern
+        if callTypes is not None:
+            self.pattern = pattern.replace('%(types)s', '|'.join(callTypes))
+
+        # The pattern is split around the city, so both halves are compiled once at startup. The city itself is found
+        # with a plain text search, the part before it has to end right where the city starts.
+        self.cityField = None
+        for field in ['name', 'acronym']:
+            if '%(' + field + ')s' in self.pattern:
+                self.cityField = field
+
+        if self.cityField is None:
+            self.prefix = re.compile(self.pattern, re.IGNORECASE)
+            self.suffix = None
+        else:
+            prefix, suffix = self.pattern.split('%(' + self.cityField + ')s', 1)
+            self.prefix = re.compile('(?:' + prefix + r')\Z', re.IGNORECASE)
+            self.suffix = re.compile(suffix, re.IGNORECASE)
+
+    def appliesTo(self, type: str, regionId: int) -> bool:
+        return type in self.types and (self.regions is None or regionId in self.regions)
+
+    def search(self, text: str, city: City) -> Optional[Match]:
+        if self.cityField is None:
+            return self.prefix.search(text)
+
+        cityText = getattr(city, self.cityField)
+        if not cityText:
+            return None
+
+        # The street is matched greedily, so the last mention of the city is tried first
+        lowerText = _lower(text)
+        cityText = _lower(cityText)
+        position = lowerText.rfind(cityText)
+        while position >= 0:
+            if self.suffix.match(text, position + len(cityText)) is not None:
+                match = self.prefix.search(text, 0, position)
+                if match is not None:
+                    return match
+
+            position = lowerText.rfind(cityText, 0, position + len(cityText) - 1)
+
+        return None
+
+FIREFIGHTER = [ServiceType.FIREFIGHTER.value, ServiceType.KNRM.value]
+POLICE = [ServiceType.POLICE.value]
+AMBULANCE = [ServiceType.AMBULANCE.value]
+HELICOPTER = [ServiceType.HELICOPTER.value]
+
+# Rules are tried in order, the first one to match gives the street. Region -1 is the unknown region, in which case all
+# the ambulance formats are tried. The ambulance regions 1, 3-9, 14, 19-22 and 25 do not show street names at all.
+STREET_RULES = [
+    StreetRule(FIREFIGHTER, r'P [0-9]\s+(?:(?:B[A-Z]{2}-[0-9]{2,3}|\(Oefening\)\s+[A-Z0-9-]+)\s+)?(?:%(types)s)\s+(.+)\s+%(name)s', callTypes=FIREFIGHTER_CALL_TYPES),
+    StreetRule(FIREFIGHTER, r'\(Intrekken\s+Alarm\s+Brw\)\s+(?:%(types)s)\s+(.+) %(name)s', callTypes=FIREFIGHTER_CALL_TYPES),
+    StreetRule(FIREFIGHTER, r'P\s+[0-9]\s+(?:\([^)]+\))\s+Oefening\s+(.+)\s+%(name)s'),
+    StreetRule(FIREFIGHTER, r'P(?:rio)?\s+[0-9]+\s+(.*) %(acronym)s'),
+
+    StreetRule(POLICE, r'^(?:P [0-9]\s+)?(?:[0-9]+\s+)?(?:%(types)s) (.+) %(name)s', callTypes=POLICE_CALL_TYPES),
+    StreetRule(POLICE, r'^Prio [0-9] (.+) %(acronym)s (?:%(types)s)', callTypes=POLICE_CALL_TYPES),
+    StreetRule(POLICE, r'(?:%(types)s) (.*) %(name)s', callTypes=POLICE_CALL_TYPES),
+
+    StreetRule(AMBULANCE, r'^(?:A|B)[0-9]+(?:\s+\(dia: [a-z]+\))?\s+[0-9]+\s+Rit\s+[0-9]+\s+(.+)\s+%(name)s', [-1, 10, 11, 12]),
+    StreetRule(AMBULANCE, r'^[A-B][0-9](?: \(dia(?:\: ja)?\))?(?: Ambu|)? [0-9]+(?: reanimatie)?(.+)\s+(?:[0-9]+)?%(acronym)s', [-1, 13, 17]),
+    StreetRule(AMBULANCE, r'^[A-B][0-9](?: \(dia(?:\: ja)?\))?(?: Ambu|)? [0-9]+(?: reanimatie)?(.+)\s+(?:[0-9]+)?%(name)s', [-1, 13, 17]),
+    StreetRule(AMBULANCE, r'^(?:A|B)[0-9]+\s+[0-9]+\s+(.+)\s+[0-9]+\s+%(name)s', [-1, 13, 17]),
+    StreetRule(AMBULANCE, r'^(?:A|B)[0-9]+\s+[A-Z0-9]+\s+[0-9]+\s+(.+)\s+[0-9]{4}[A-Z]{2}\s+%(acronym)s', [-1, 15, 17]),
+    StreetRule(AMBULANCE, r'^(?:A|B)[0-9]+\s+(.+)\s+%(acronym)s', [-1, 15, 16, 23, 24]),
+    StreetRule(AMBULANCE, r'^(?:A|B)[0-9]+\s+(.+)\s+%(name)s', [-1, 15, 16, 23, 24]),
+    StreetRule(AMBULANCE, r'^(?:A|B)[0-9]+(?:\s+\(dia: [a-z]+\))?\s+AMBU\s+[0-9]+(.+)\s+[0-9]{4}[A-Z]{2}\s+%(name)s', [-1, 17, 18]),
+    StreetRule(AMBULANCE, r'^(?:A|B)[0-9]+(?:\s+\(dia: [a-z]+\))?\s+AMBU\s+[0-9]+(.+)\s+[0-9]{4}[A-Z]{2}\s+%(acronym)s', [-1, 17, 18]),
+    StreetRule(AMBULANCE, r'^(?:A|B)[0-9]+\s+AMBU\s+[0-9]+\s+(.*)\s+%(name)s', [-1, 17, 18]),
+    StreetRule(AMBULANCE, r'^(?:A|B)[0-9]+\s+AMBU\s+[0-9]+\s+(.*)\s+%(acronym)s', [-1, 17, 18]),
+
+    StreetRule(HELICOPTER, r'^[A-B][0-9](?: \(dia(?:\: ja)?\))?(?: Ambu|)? [0-9]+(?: reanimatie)?(.+)\s+(?:[0-9]+)?%(acronym)s'),
+    StreetRule(HELICOPTER, r'^[A-B][0-9](?: \(dia(?:\: ja)?\))?(?: Ambu|)? [0-9]+(?: reanimatie)?(.+)\s+(?:[0-9]+)?%(name)s'),
+]
+
+class StreetRuleCollection:
+    def __init__(self, rules: List[StreetRule]):
+        # The rules which apply are worked out once for every type and the regions the rules name. Any other region
+        # only gets the rules which are not limited to regions.
+        types = {type for rule in rules for type in rule.types}
+        regionIds = {regionId for rule in rules if rule.regions is not None for regionId in rule.regions}
+
+        self.__rulesByType = {type: [rule for rule in rules if rule.regions is None and type in rule.types] for type in types}
+        self.__rules = {
+            (type, regionId): [rule for rule in rules if rule.appliesTo(type, regionId)]
+            for type in types for regionId in regionIds
+        }
+
+    def getRules(self, type: str, regionId: int) -> List[StreetRule]:
+        rules = self.__rules.get((type, regionId))
+        if rules is None:
+            rules = self.__rulesByType.get(type, [])
+
+        return rules
+
+    @staticmethod
+    def initList():
+        return StreetRuleCollection(STREET_RULES)
@@ -1,8 +1,26 @@
 __all__ = [
     'Capcode',
+    'ChangeReplay',
     'City',
+    'Database',
+    'IncidentCorrelator',
     'ListenerProcess',
     'Message',
+    'MessageArchive',
+    'MessageDeduplicator',
+    'MessageEnricher',
+    'MessagePublisher',
+    'MessageQuery',
+    'MessageSpool',
+    'MessageWriter',
+    'Metrics',
+    'MySQLStorage',
+    'ReferenceData',
+    'ReferenceSnapshot',
     'Region',
-    'ServiceType'
+    'ReplayPool',
+    'ServiceType',
+    'SQLiteStorage',
+    'Storage',
+    'StreetRules'
 ]
\ No newline at end of file
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""
+Generates synthetic multimon-ng FLEX lines from the capcodes and cities in setup/. The same seed always gives the same
+lines, so benchmark runs can be compared with each other.
+
+Usage: python benchmarks/generator.py [count] [seed] > capture.log
+"""
+import datetime
+import os
+import random
+import sys
+from typing import *
+
+rootDir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, rootDir)
+
+from P2000 import ReferenceData
+from P2000.ServiceType import ServiceType
+
+STREETS = [
+    'Dorpsstraat', 'Kerkstraat', 'Stationsweg', 'Molenweg', 'Hoofdstraat', 'Industrieweg', 'Schoolstraat',
+    'Julianastraat', 'Wilhelminalaan', 'Rijksweg A28', 'Sportlaan', 'Nieuwe Kade', 'Burgemeester de Withstraat',
+]
+
+FIREFIGHTER_CALL_TYPES = ['Brandgerucht', 'BR woning', 'Liftopsluiting', 'Ongeval wegvervoer', 'OMS brandmelding', 'Dienstverlening']
+POLICE_CALL_TYPES = ['Aanrijding letsel', 'Steekpartij', 'Achtervolging', 'Ongeval materieel']
+
+# The share of each service in the generated pages, roughly what is seen on the air
+SERVICE_WEIGHTS = {
+    ServiceType.FIREFIGHTER.value: 45,
+    ServiceType.AMBULANCE.value: 35,
+    ServiceType.POLICE.value: 10,
+    ServiceType.CITY.value: 5,
+    ServiceType.KNRM.value: 5,
+}
+
+def loadRows():
+    regions, errors = ReferenceData.parseRegions(rootDir + '/setup/regios.csv')
+    cities, errors = ReferenceData.parseCities(rootDir + '/setup/Afkortingen Gemeente- en plaatsnamen.csv')
+    capcodes, errors = ReferenceData.parseCapcodeFiles({
+        regionId: rootDir + '/setup/capcodes/' + str("{:02d}".format(regionId)) + '.csv'
+        for regionId in regions.keys()
+    })
+
+    return (
+        [
+            {'PK_CAPCODE': pk, 'CAPCODE': capcode, 'FK_REGION': regionId, 'DESCRIPTION': description, 'TYPE': type, 'CITY': city}
+            for pk, (capcode, (regionId, description, type, city)) in enumerate(capcodes.items(), 1)
+        ],
+        [{'PK_CITY': pk, 'ACRONYM': acronym, 'NAME': name} for pk, (acronym, name) in enumerate(cities.items(), 1)],
+        [{'PK_REGION': pk, 'NAME': name} for pk, name in regions.items()],
+    )
+
+class FlexGenerator:
+    def __init__(self, capcodeRows: List[dict], cityRows: List[dict], seed: int = 0, noise: float = 0.1):
+        self.__random = random.Random(seed)
+        self.__noise = noise
+        self.__date = datetime.datetime(2026, 1, 1, 6, 0, 0)
+
+        self.__capcodes = {}
+        for row in sorted(capcodeRows, key=lambda row: row['CAPCODE']):
+            if row['TYPE'] in SERVICE_WEIGHTS:
+                self.__capcodes.setdefault(row['TYPE'], {}).setdefault(row['FK_REGION'], []).append(row['CAPCODE'])
+        self.__services = [service for service in SERVICE_WEIGHTS.keys() if service in self.__capcodes]
+        self.__serviceWeights = [SERVICE_WEIGHTS[service] for service in self.__services]
+
+        # A few places get most of the pages, just like on the air. That matters for anything cached per city.
+        self.__cities = sorted(cityRows, key=lambda row: row['ACRONYM'])
+        self.__random.shuffle(self.__cities)
+        self.__cityWeights = [1 / rank for rank in range(1, len(self.__cities) + 1)]
+
+    def lines(self, count: int) -> Iterator[str]:
+        for i in range(count):
+            yield self.line()
+
+    def line(self) -> str:
+        self.__date += datetime.timedelta(seconds=self.__random.randint(0, 30))
+        header = 'FLEX|%s|1600/2/K/A|%02d.%03d|' % (
+            self.__date.strftime('%Y-%m-%d %H:%M:%S'),
+            self.__random.randint(0, 15),
+            self.__random.randint(0, 127)
+        )
+
+        # Part of what multimon-ng decodes is never stored: numeric pages to monitoring groups, empty and test pages
+        if self.__random.random() < self.__noise:
+            return header + self.__random.choice([
+                '002029568|NUM|%d' % self.__random.randint(1000, 99999),
+                '%s|ALN|' % self.__capcodeList(ServiceType.FIREFIGHTER.value),
+                '%s|ALN|TEST TEST TEST' % self.__capcodeList(ServiceType.AMBULANCE.value),
+            ])
+
+        service = self.__random.choices(self.__services, self.__serviceWeights)[0]
+        return header + self.__capcodeList(service) + '|ALN|' + self.__text(service)
+
+    def __capcodeList(self, service: str) -> str:
+        regions = self.__capcodes[service]
+        capcodes = regions[self.__random.choice(sorted(regions.keys()))]
+        return ' '.join(
+            '00' + capcode for capcode in self.__random.sample(capcodes, min(len(capcodes), self.__random.randint(1, 3)))
+        )
+
+    def __text(self, service: str) -> str:
+        city = self.__random.choices(self.__cities, self.__cityWeights)[0]
+        street = self.__random.choice(STREETS)
+        number = self.__random.randint(10000, 99999)
+        postalCode = '%04d%s' % (self.__random.randint(1000, 9999), self.__random.choice(['AB', 'CD', 'GH', 'KL']))
+
+        if service == ServiceType.FIREFIGHTER.value or service == ServiceType.KNRM.value:
+            return self.__random.choice([
+                'P 1 BDH-0%d %s %s %s %d' % (self.__random.randint(1, 9), self.__random.choice(FIREFIGHTER_CALL_TYPES), street, city['NAME'], number),
+                'P 2 %s %s %s %d' % (self.__random.choice(FIREFIGHTER_CALL_TYPES), street, city['ACRONYM'], number),
+                'Prio 3 %s %s %d' % (street, city['ACRONYM'], number),
+            ])
+        elif service == ServiceType.POLICE.value:
+            return self.__random.choice([
+                'P 1 %s %s %s' % (self.__random.choice(POLICE_CALL_TYPES), street, city['NAME']),
+                'Prio 2 %s %s %s' % (street, city['ACRONYM'], self.__random.choice(POLICE_CALL_TYPES)),
+            ])
+        elif service == ServiceType.AMBULANCE.value:
+            return self.__random.choice([
+                'A1 %d Rit %d %s %s' % (number, number + 1, street, city['NAME']),
+                'A2 Ambu %d %s %s %s' % (number, street, postalCode, city['NAME']),
+                'B1 %s %s' % (street, city['ACRONYM']),
+            ])
+
+        return 'Brug %s %s openen' % (street, city['NAME'])
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+    capcodeRows, cityRows, regionRows = loadRows()
+    for line in FlexGenerator(capcodeRows, cityRows, seed).lines(count):
+        print(line)
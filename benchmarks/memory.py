@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+Measures the memory held by the loaded Capcode, City and Region caches. The caches are built from the CSV files in
+setup/, so no database is needed.
+
+Usage: python benchmarks/memory.py
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+rootDir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, rootDir)
+
+from P2000.Capcode import CapcodeCollection
+from P2000.City import CityCollection
+from P2000.Region import RegionCollection
+from generator import loadRows
+
+def residentSize():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+if __name__ == '__main__':
+    residentBefore = residentSize()
+    tracemalloc.start()
+
+    # The rows are only needed to build the caches, they are not part of what the listener keeps
+    capcodeRows, cityRows, regionRows = loadRows()
+    counts = (len(capcodeRows), len(cityRows), len(regionRows))
+    caches = (
+        CapcodeCollection.fromRows(capcodeRows),
+        CityCollection.fromRows(cityRows),
+        RegionCollection.fromRows(regionRows),
+    )
+    del capcodeRows, cityRows, regionRows
+    gc.collect()
+
+    allocated, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    residentAfter = residentSize()
+
+    print('Capcodes:       ', counts[0])
+    print('Cities:         ', counts[1])
+    print('Regions:        ', counts[2])
+    print('Allocated (KiB):', allocated // 1024)
+    print('Peak (KiB):     ', peak // 1024)
+    print('Resident (KiB): ', (residentAfter - residentBefore) // 1024)
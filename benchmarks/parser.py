@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+Measures how many multimon-ng lines per second the Message parser handles. Uses lines made with generator.py, the
+same ones on every run, unless a capture is given.
+
+Usage: python benchmarks/parser.py [capture file] [repeat]
+"""
+import os
+import sys
+import time
+
+rootDir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, rootDir)
+
+from P2000.Message import Message
+from generator import FlexGenerator, loadRows
+
+def parse(lines, fields: bool) -> int:
+    valid = 0
+    for line in lines:
+        message = Message(line)
+        if message.isValidMessage() == False:
+            continue
+
+        valid += 1
+        if fields:
+            # The deduplicator and enricher read both of these for every valid message
+            message.capcodes
+            message.date
+
+    return valid
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as captureFile:
+            lines = captureFile.readlines()
+    else:
+        capcodeRows, cityRows, regionRows = loadRows()
+        lines = list(FlexGenerator(capcodeRows, cityRows).lines(2000))
+
+    lines = lines * repeat
+
+    for name, fields in [('Validate only', False), ('Validate + fields', True)]:
+        start = time.perf_counter()
+        valid = parse(lines, fields)
+        elapsed = time.perf_counter() - start
+        print('%-18s %d lines, %d valid, %.0f lines/s' % (name + ':', len(lines), valid, len(lines) / elapsed))
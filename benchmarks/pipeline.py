@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+"""
+End-to-end benchmark of the decode -> enrich -> store pipeline on synthetic FLEX lines. Every stage is timed per
+message, the results are written as JSON so runs can be compared with each other.
+
+Storage runs against a no-op sink and the MessageWriter on the SQLite storage, so no MySQL server is needed.
+
+Usage: python benchmarks/pipeline.py [--count 20000] [--seed 0] [--sink all] [--output results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import *
+
+rootDir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, rootDir)
+
+from P2000.Capcode import CapcodeCollection
+from P2000.City import CityCollection
+from P2000.Message import Message
+from P2000.MessageEnricher import MessageEnricher
+from P2000.MessageWriter import MessageWriter
+from P2000.Region import RegionCollection
+from P2000.SQLiteStorage import SQLiteStorage
+from P2000.StreetRules import StreetRuleCollection
+from generator import FlexGenerator, loadRows
+
+STAGES = ['parse', 'type', 'region', 'city', 'street', 'postalCode', 'store']
+
+class NoopSink:
+    def add(self, *args):
+        pass
+
+    def close(self):
+        pass
+
+class SQLiteSink:
+    """
+    The MessageWriter on the SQLite storage, in a temporary directory. Batches are written by the writer thread, so
+    the final flush shows up in closeSeconds.
+    """
+
+    def __init__(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.__storage = SQLiteStorage(os.path.join(self.__directory.name, 'p2000.sqlite'))
+        self.__writer = MessageWriter(self.__storage)
+
+    def add(self, *args):
+        self.__writer.add(*args)
+
+    def close(self):
+        self.__writer.close()
+        self.__storage.close()
+        self.__directory.cleanup()
+
+SINKS = {
+    'noop': NoopSink,
+    'sqlite': SQLiteSink,
+}
+
+def percentiles(timings: List[int]) -> dict:
+    if len(timings) == 0:
+        return {'count': 0}
+
+    timings = sorted(timings)
+    percentile = lambda p: timings[min(len(timings) - 1, int(len(timings) * p))] / 1000
+    return {
+        'count': len(timings),
+        'meanUs': round(sum(timings) / len(timings) / 1000, 3),
+        'p50Us': percentile(0.5),
+        'p90Us': percentile(0.9),
+        'p99Us': percentile(0.99),
+        'maxUs': timings[-1] / 1000,
+    }
+
+def run(lines: List[str], enricher: MessageEnricher, sink) -> dict:
+    timings = {stage: [] for stage in STAGES}
+    clock = time.perf_counter_ns
+    messageCount = 0
+
+    start = clock()
+    for line in lines:
+        # Same steps as the listener, minus the console output
+        t0 = clock()
+        message = Message(line)
+        valid = message.isValidMessage()
+        if valid:
+            message.capcodes
+            message.date
+        t1 = clock()
+        timings['parse'].append(t1 - t0)
+        if not valid:
+            continue
+
+        type = enricher.getEstimatedType(message)
+        t2 = clock()
+        region = enricher.getEstimatedRegion(message)
+        t3 = clock()
+        city = enricher.getEstimatedCity(message, region, type)
+        t4 = clock()
+        street = enricher.getEstimatedStreet(message, region, city, type)
+        t5 = clock()
+        postalCode = enricher.getEstimatedPostalCode(message)
+        t6 = clock()
+        sink.add(
+            message.rawMessage,
+            region.id,
+            city.id,
+            message.message,
+            message.date.strftime('%Y-%m-%d %H:%M:%S'),
+            street,
+            postalCode,
+            type,
+            [enricher.getCapcode(capcode).id for capcode in message.capcodes]
+        )
+        t7 = clock()
+
+        timings['type'].append(t2 - t1)
+        timings['region'].append(t3 - t2)
+        timings['city'].append(t4 - t3)
+        timings['street'].append(t5 - t4)
+        timings['postalCode'].append(t6 - t5)
+        timings['store'].append(t7 - t6)
+        messageCount += 1
+
+    # Whatever the sink still buffers is part of the run
+    t0 = clock()
+    sink.close()
+    closeTime = clock() - t0
+    elapsed = (clock() - start) / 1e9
+
+    return {
+        'lines': len(lines),
+        'messages': messageCount,
+        'seconds': round(elapsed, 4),
+        'linesPerSecond': round(len(lines) / elapsed, 1),
+        'messagesPerSecond': round(messageCount / elapsed, 1),
+        'closeSeconds': round(closeTime / 1e9, 4),
+        'stages': {stage: percentiles(timings[stage]) for stage in STAGES},
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('P2000 pipeline benchmark')
+    parser.add_argument('--count', help='Number of lines to generate', type=int, default=20000)
+    parser.add_argument('--seed', help='Seed of the line generator', type=int, default=0)
+    parser.add_argument('--sink', help='Storage to benchmark', choices=['all'] + list(SINKS.keys()), default='all')
+    parser.add_argument('--output', help='Write the results to this file instead of stdout')
+    args = parser.parse_args()
+
+    capcodeRows, cityRows, regionRows = loadRows()
+    lines = list(FlexGenerator(capcodeRows, cityRows, args.seed).lines(args.count))
+
+    results = {}
+    for name in (SINKS.keys() if args.sink == 'all' else [args.sink]):
+        # Every sink starts with cold caches, so the runs do not depend on the order they are done in
+        enricher = MessageEnricher(
+            CapcodeCollection.fromRows(capcodeRows),
+            CityCollection.fromRows(cityRows),
+            RegionCollection.fromRows(regionRows),
+            StreetRuleCollection.initList()
+        )
+        results[name] = run(lines, enricher, SINKS[name]())
+
+    report = json.dumps({
+        'count': args.count,
+        'seed': args.seed,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }, indent=2)
+
+    if args.output is None:
+        print(report)
+    else:
+        with open(args.output, 'w') as outputFile:
+            outputFile.write(report + '\n')
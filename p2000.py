@@ -19,19 +19,35 @@ messages are automatically converted and shown colour coded. Per message, it wil
 Need help? Send me a mail!
 """
 
-import mysql.connector
 import configparser
 import os
 import gettext
 import argparse
-import re
+import threading
+import signal
+import sys
+import time
 
+from P2000 import Storage
 from P2000.Message import Message
 from P2000.Capcode import Capcode, CapcodeCollection
 from P2000.ServiceType import ServiceType
 from P2000.ListenerProcess import ListenerProcess
+from P2000.MessageWriter import MessageWriter
+from P2000.MessageArchive import ArchiveLocked, MessageArchive
+from P2000.MessageQuery import MessageQuery, RecentMessages
+from P2000.MessagePublisher import MessagePublisher, queryPublisher
+from P2000.MessageSpool import MessageSpool, StorageUnavailable
+from P2000.MessageDeduplicator import MessageDeduplicator
+from P2000.IncidentCorrelator import IncidentCorrelator
+from P2000.Metrics import Metrics
 from P2000.City import City, CityCollection
 from P2000.Region import Region, RegionCollection
+from P2000.StreetRules import StreetRuleCollection
+from P2000.MessageEnricher import MessageEnricher
+from P2000.ReplayPool import ReplayPool
+from P2000.ChangeReplay import ChangeReplay
+from P2000.ReferenceSnapshot import ReferenceSnapshot
 
 if '_' not in locals():
     _ = gettext.gettext
@@ -42,6 +58,17 @@ parser.add_argument('-r', '--regions', help='Only show a specific region. Values
 parser.add_argument('-s', '--services', help='Only show a specific service. Values need to be comma separated and based on ServiceType', required=False)
 parser.add_argument('-m', '--message', help='Test the procedure with a test message', required=False)
 parser.add_argument('-a', '--replay-all', help='Replay all messages in the database', required=False, action='store_true')
+parser.add_argument('-c', '--replay-changed', help='Replay the messages affected by reference data changed by setup.py', required=False, action='store_true')
+parser.add_argument('-w', '--workers', help='Number of processes to replay messages with, more than one skips assigning incidents', required=False, type=int, default=1)
+parser.add_argument('--from-pk', help='Resume the replay from this PK_MESSAGE', required=False, type=int, default=0)
+parser.add_argument('-i', '--ingest-file', help='Process a recorded multimon-ng capture instead of listening, use - for stdin', required=False)
+parser.add_argument('--from-date', help='Only replay messages from this date (YYYY-MM-DD HH:MM:SS) onwards', required=False)
+parser.add_argument('-q', '--query', help='Show the latest stored messages, filtered with --incident, --capcode, --from-date, --to-date and a single -r and -s', required=False, action='store_true')
+parser.add_argument('--incident', help='Only show the messages of this incident', required=False)
+parser.add_argument('--capcode', help='Only show messages sent to this capcode', required=False)
+parser.add_argument('--to-date', help='Only show messages up to this date (YYYY-MM-DD HH:MM:SS)', required=False)
+parser.add_argument('--limit', help='Number of messages to show', required=False, type=int, default=50)
+parser.add_argument('--replay-source', help='Replay the messages from the database or from the archive', required=False, choices=['database', 'archive'], default='database')
 
 args = parser.parse_args()
 i18n = gettext.translation('base', localedir='locales', fallback=True, languages=[args.language])
@@ -51,229 +78,321 @@ class P2000Listener:
     def __init__(self, config: configparser.ConfigParser):
         self.__config = config
 
-        databaseConf = config['DATABASE']
-        self.__db = mysql.connector.connect(
-            host=databaseConf.get('Host', 'localhost'),
-            user=databaseConf.get('Username', 'P2000'),
-            password=databaseConf.get('Password', ''),
-            database=databaseConf.get('Database', 'P2000'),
+        # Instrumentation is off unless asked for, the timers and counters are no-ops then
+        self.__metrics = Metrics(config.getboolean('METRICS', 'Enabled', fallback=False))
+        if self.__metrics.enabled:
+            if config.getint('METRICS', 'Port', fallback=0) > 0:
+                self.__metrics.startServer(config.get('METRICS', 'Host', fallback='127.0.0.1'), config.getint('METRICS', 'Port'))
+            if config.getfloat('METRICS', 'LogInterval', fallback=0) > 0:
+                self.__metrics.startLogging(config.getfloat('METRICS', 'LogInterval'))
+
+        # A database which is down or restarts does not take the listener with it. Messages which can not be stored in
+        # the meantime are spooled to disk.
+        rootDir = os.path.dirname(os.path.realpath(__file__))
+        self.__storage = Storage.create(config, rootDir)
+        self.__writer = MessageWriter(
+            self.__storage,
+            config.getint('DATABASE', 'BatchSize', fallback=50),
+            config.getfloat('DATABASE', 'BatchInterval', fallback=1.0),
+            self.__metrics,
+            MessageSpool(config.get('DATABASE', 'Spool', fallback=rootDir + '/messages.spool'))
         )
 
-        self.__dbCursor = self.__db.cursor(dictionary=True)
-
-        self.__cityCache = CityCollection.initList(self.__dbCursor)
-        self.__capcodeCache = CapcodeCollection.initList(self.__dbCursor)
-        self.__regionCache = RegionCollection.initList(self.__dbCursor)
-
-        self.__process = ListenerProcess()
+        # The archive keeps the raw messages apart from the database, for scans over time and replays. It is only
+        # opened for writing by startArchive, queries and replays leave it to the listener.
+        self.__archive = None
+        self.__archiveDirectory = None
+        if config.getboolean('ARCHIVE', 'Enabled', fallback=False):
+            self.__archiveDirectory = os.path.join(rootDir, config.get('ARCHIVE', 'Directory', fallback='archive'))
+
+        # The latest messages are kept in memory, so asking the running listener for them (see printQuery) does not have
+        # to wait on the database
+        self.__recent = RecentMessages(config.getint('QUERY', 'RecentMessages', fallback=1000))
+        self.query = MessageQuery(self.__storage, self.__recent)
+
+        # Clients get the enriched messages pushed to them, only once the listener starts receiving
+        self.__publisher = None
+        if config.getboolean('PUBLISHER', 'Enabled', fallback=False):
+            self.__publisher = MessagePublisher(config.getint('PUBLISHER', 'QueueSize', fallback=256), self.__metrics, self.query.find)
+
+        # The reference data is loaded from the local snapshot when its version still matches the database, which only
+        # costs the checksums. The snapshot is used unchecked only when the database can not be reached.
+        self.__snapshot = ReferenceSnapshot(config.get(
+            'CACHE',
+            'Snapshot',
+            fallback=os.path.dirname(os.path.realpath(__file__)) + '/reference.snapshot'
+        ))
+        snapshotData = self.__snapshot.load()
+        if snapshotData is not None:
+            try:
+                if self.__storage.fetchReferenceVersion() != snapshotData['version']:
+                    snapshotData = None
+            except StorageUnavailable as e:
+                print('Reference snapshot used without checking it, the database is unreachable:', str(e))
+
+        if snapshotData is None:
+            snapshotData = self.__storage.fetchReferenceData()
+            self.__snapshot.save(snapshotData)
+
+        self.__enricher = self.__buildEnricher(snapshotData)
+
+        # Changes to the reference tables are picked up by polling their checksums, or right away on a SIGHUP
+        self.__refreshEvent = threading.Event()
+        threading.Thread(
+            target=self.__refreshReferenceData,
+            args=(snapshotData['version'], config.getfloat('CACHE', 'RefreshInterval', fallback=60.0)),
+            name='ReferenceRefresher',
+            daemon=True
+        ).start()
+
+        deduplicator = None
+        if config.getboolean('DEDUP', 'Enabled', fallback=True):
+            deduplicator = MessageDeduplicator(
+                config.getfloat('DEDUP', 'Window', fallback=10.0),
+                config.getint('DEDUP', 'Capacity', fallback=1024)
+            )
+
+        self.__correlator = None
+        if config.getboolean('INCIDENT', 'Enabled', fallback=True):
+            self.__correlator = IncidentCorrelator(
+                config.getfloat('INCIDENT', 'Window', fallback=1800.0),
+                config.getint('INCIDENT', 'Capacity', fallback=4096)
+            )
+
+        self.__capcodeLock = threading.Lock()
+        self.__printLock = threading.Lock()
+        self.__printMessages = True
+        self.__process = ListenerProcess(
+            deduplicator,
+            config.getint('PIPELINE', 'QueueSize', fallback=1000),
+            config.getint('PIPELINE', 'Workers', fallback=1),
+            config.get('PIPELINE', 'Backpressure', fallback=ListenerProcess.BACKPRESSURE_BLOCK),
+            self.__metrics
+        )
         self.__process.subscribe(self._onMessageReceive)
 
-    def startListening(self):
-        self.__process.startProcess()
+    def __buildEnricher(self, snapshotData) -> MessageEnricher:
+        return MessageEnricher(
+            CapcodeCollection.fromRows(snapshotData['capcodes']),
+            CityCollection.fromRows(snapshotData['cities']),
+            RegionCollection.fromRows(snapshotData['regions']),
+            StreetRuleCollection.initList()
+        )
 
-    def replayAllMessage(self):
-        self.__dbCursor.execute('SELECT `PK_MESSAGE`, `RAW_MESSAGE` FROM `F_MESSAGE` ORDER BY `DATE` ASC')
-        messages = self.__dbCursor.fetchall()
+    def __refreshReferenceData(self, version: tuple, interval: float):
+        while True:
+            try:
+                if self.__storage.fetchReferenceVersion() != version:
+                    # Everything is rebuilt here, off the hot path. Swapping the enricher is a single assignment, so
+                    # messages in progress finish with the one they started with.
+                    snapshotData = self.__storage.fetchReferenceData()
+                    self.__snapshot.save(snapshotData)
+                    self.__enricher = self.__buildEnricher(snapshotData)
+                    version = snapshotData['version']
+                    print('Reference data reloaded')
+            except Exception as e:
+                print('Could not refresh the reference data:', repr(e))
+
+            self.__refreshEvent.wait(interval if interval > 0 else None)
+            self.__refreshEvent.clear()
+
+    def refreshReferenceData(self):
+        self.__refreshEvent.set()
+
+    def __publisherAddress(self) -> tuple:
+        return (
+            self.__config.get('PUBLISHER', 'Host', fallback='127.0.0.1'),
+            self.__config.getint('PUBLISHER', 'Port', fallback=9121),
+            self.__config.get('PUBLISHER', 'Socket', fallback=None) or None
+        )
 
-        for message in messages:
-            self._onMessageReceive(Message(message['RAW_MESSAGE']))
+    def startPublisher(self):
+        if self.__publisher is None:
+            return
 
-    def _onMessageReceive(self, message: Message):
-        for capcode in message.capcodes:
-            capcodeObj = self.__capcodeCache.getCapcodeByCapcode(capcode)
-            if capcodeObj is None:
-                capcodeObj = Capcode(-1, capcode, _('Unknown'), ServiceType.UNKNOWN.value, '', -1)
-                self.__dbCursor.execute(
-                    'INSERT INTO `D_CAPCODE` (`CAPCODE`, `FK_REGION`, `DESCRIPTION`, `TYPE`, `CITY`) VALUES (%s, %s, %s, %s, %s)',
-                    [
-                        capcodeObj.capcode,
-                        -1,
-                        capcodeObj.description,
-                        capcodeObj.type,
-                        capcodeObj.city
-                    ])
-                capcodeObj.id = self.__dbCursor.lastrowid
-                self.__capcodeCache.add(capcodeObj)
-
-        self.__printMessage(message)
-
-    def __getEstimatedType(self, message):
-        typeMapping = {}
-        for capcode in message.capcodes:
-            capcode = self.__capcodeCache.getCapcodeByCapcode(capcode)
-            typeMapping[capcode.type] = typeMapping.get(capcode.type, 0) + 1
-
-        # We should check the Capcodes for their types to be leading
-        if (len(typeMapping) > 0):
-            type = max(typeMapping, key=typeMapping.get)
-            if type != ServiceType.UNKNOWN.value:
-                return type
-
-        # It could be that the Capcodes are not found, in that case we do some guesstimation based on certain keywords
-        # which is not accurate, but hey, it's better than no type flagged
-        if (message.message.startswith(('A', 'B')) or ' MKA' in message.message):
-            return ServiceType.AMBULANCE.value
-        elif (message.message.lower().startswith(('p', 'prio'))):
-            return ServiceType.FIREFIGHTER.value
-        elif any(s in message.message.lower() for s in ['politie', 'icnum']):
-            return ServiceType.POLICE.value
-        elif 'ambu' in message.message.lower():
-            return ServiceType.AMBULANCE.value
-
-        return ServiceType.UNKNOWN.value
-
-    def __getEstimatedRegion(self, message: Message) -> Region:
-        capcodeRegionMap = {}
-        for capcode in message.capcodes:
-            capcode = self.__capcodeCache.getCapcodeByCapcode(capcode)
-            if capcode.regionId not in capcodeRegionMap.keys():
-                capcodeRegionMap[capcode.regionId] = 0
-            capcodeRegionMap[capcode.regionId] += 1
-
-        if len(capcodeRegionMap) > 0:
-            region = self.__regionCache.getRegionById(max(capcodeRegionMap, key=capcodeRegionMap.get))
-            if region is not None:
-                return region
-
-        return Region(-1, _('Unknown region'))
-
-    def __getEstimatedCity(self, message: Message, estimatedRegion: Region, type: ServiceType) -> City:
-        # The use of the 6-letter unique acronym for a city is a dead giveaway it's that specific city, so let's check
-        # that one first before we do fuzzy matching
-        acronymList = '|'.join(city.acronym for city in self.__cityCache.getAllCities())
-        nameList = '|'.join(city.name for city in self.__cityCache.getAllCities())
-
-        match = re.search(r'(%s)' % acronymList, message.message)
-        if match is not None:
-            return self.__cityCache.getCityByAcronym(match.group(1))
-
-        # Firefight and police calls usually end with the city name and a series of 6 numbers (potentially multiple)
-        if (type in [ServiceType.FIREFIGHTER.value, ServiceType.POLICE.value]):
-            match = re.search(r'(%s)(?:(?: [0-9]+)+)?$' % nameList, message.message.strip(), re.IGNORECASE)
-
-            if match is not None:
-                return self.__cityCache.getCityByName(match.group(1))
-
-        match = re.search(r'(%s)' % nameList, message.message)
-        if match is not None:
-            return self.__cityCache.getCityByName(match.group(1))
-
-        return City(-1, _('Unknown city'), _('Unknown city'))
-
-    def __getEstimatedStreet(self, message: Message, region: Region, city: City, type: ServiceType) -> str:
-        regexes = []
-
-        if type in [ServiceType.FIREFIGHTER.value, ServiceType.KNRM.value]:
-            types = [
-                'Liftopsluiting',
-                'Stank\/hind\. lucht(?: \([^)]+\))?(?: \([^)]+\))?',
-                'Contact mkb Verontr\. opp\.water(?: \([^)]+\))?',
-                '(?:\([^)]+\) )?BR [a-z\/]+(?: \([^)]+\))?(?: \([^)]+\))?',
-                '(?: \([^)]+\))?Ass\. Ambu(?: \([^)]+\))?',
-                '(?: \([^)]+\))?Ass\. Politie(?: \([^)]+\))?',
-                'Ongeval gev(?:\.|aarlijke) stof(?:fen)?(?: \([^)]+\))?(?: \([^)]+\))?',
-                'Dier in problemen',
-                'Brandgerucht',
-                '\([^)]+\) Contact [A-Z]+',
-                '(?:BR|Ongeval) wegvervoer(?: \([^)]+\))?(?: \([^)]+\))?',
-                '\([^)]+\) Ongeval wegvervoer',
-                'OMS (?:(?:br|h)andmeld(?:er|ing)|beheersysteem)',
-                'Nacontrole(?: \([^)]+\))?',
-                'CO-melder(?: \([^)]+\))?',
-                'Dienstverlening(?: \([^)]+\))?',
-                'Ongeval op water(?: \([^)]+\))?(?: \([^)]+\))?',
-                'Voertuig te water(?: \([^)]+\))?',
-                'Wateroverlast(?: \([^)]+\))?',
-                'Dier te water(?: \([^)]+\))?',
-                'Dier op hoogte(?: [A-Z]+)?(?: [A-Z]+)?(?: \([^)]+\))?',
-                'Buitensluiting(?: \([^)]+\))?',
-                'Reanimatie(?: \([^)]+\))?',
-                'Rookmelder',
-                'Ongeval',
-            ]
-
-            typesList = '|'.join(types)
-            regexes.append(r'P [0-9]\s+(?:(?:B[A-Z]{2}-[0-9]{2,3}|\(Oefening\)\s+[A-Z0-9-]+)\s+)?(?:%s)\s+(.+)\s+%s' % (typesList, city.name))
-            regexes.append(r'P [0-9]\s+(?:(?:B[A-Z]{2}-[0-9]{2,3}|\(Oefening\)\s+[A-Z0-9-]+)\s+)?(?:%s)\s+(.+)\s+%s' % (typesList, city.name))
-            regexes.append(r'\(Intrekken\s+Alarm\s+Brw\)\s+(?:%s)\s+(.+) %s' % (typesList, city.name))
-            regexes.append(r'P\s+[0-9]\s+(?:\([^)]+\))\s+Oefening\s+(.+)\s+%s' % city.name)
-            regexes.append(r'P(?:rio)?\s+[0-9]+\s+(.*) %s' % city.acronym)
-
-        elif type == ServiceType.POLICE.value:
-            types = [
-                'Steekpartij',
-                '(?:Ongeval|Verkeer|Veiligheid en openbare orde)\/[a-z\/\.]+\/[a-z\/\. ]+ prio [0-9]',
-                '(?:Aanrijding|ongeval)(?:\s+wegvervoer)?(?:\s+(?:letsel|materieel))?',
-                'Achtervolging',
-                'Schietpartij',
-                'Explosie',
-                'Letsel',
-            ]
-
-            typesList = '|'.join(types)
-            regexes.append(r'^(?:P [0-9]\s+)?(?:[0-9]+\s+)?(?:%s) (.+) %s' % (typesList, city.name))
-            regexes.append(r'^Prio [0-9] (.+) %s (?:%s)' % (city.acronym, typesList))
-            regexes.append(r'(?:%s) (.*) %s' % (typesList, city.name))
-        elif type in [ServiceType.AMBULANCE.value]:
-            # These regions do not show street names
-            if region.id in [1,3,4,5,6,7,8,9,14,19,20,21,22,25]:
-                regexes = []
-
-            if region.id in [-1,10,11,12]:
-                regexes.append(r'^(?:A|B)[0-9]+(?:\s+\(dia: [a-z]+\))?\s+[0-9]+\s+Rit\s+[0-9]+\s+(.+)\s+%s' % city.name)
-
-            if region.id in [-1,13,17]:
-                regexes.append(r'^[A-B][0-9](?: \(dia(?:\: ja)?\))?(?: Ambu|)? [0-9]+(?: reanimatie)?(.+)\s+(?:[0-9]+)?%s' % city.acronym)
-                regexes.append(r'^[A-B][0-9](?: \(dia(?:\: ja)?\))?(?: Ambu|)? [0-9]+(?: reanimatie)?(.+)\s+(?:[0-9]+)?%s' % city.name)
-                regexes.append(r'^(?:A|B)[0-9]+\s+[0-9]+\s+(.+)\s+[0-9]+\s+%s' % city.name)
-
-            if region.id in [-1,15, 17]:
-                regexes.append(r'^(?:A|B)[0-9]+\s+[A-Z0-9]+\s+[0-9]+\s+(.+)\s+[0-9]{4}[A-Z]{2}\s+%s' % city.acronym)
-
-            if region.id in [-1,15,16,23,24]:
-                regexes.append(r'^(?:A|B)[0-9]+\s+(.+)\s+%s' % city.acronym)
-                regexes.append(r'^(?:A|B)[0-9]+\s+(.+)\s+%s' % city.name)
-
-            if region.id in [-1,17,18]:
-                regexes.append(r'^(?:A|B)[0-9]+(?:\s+\(dia: [a-z]+\))?\s+AMBU\s+[0-9]+(.+)\s+[0-9]{4}[A-Z]{2}\s+%s' % city.name)
-                regexes.append(r'^(?:A|B)[0-9]+(?:\s+\(dia: [a-z]+\))?\s+AMBU\s+[0-9]+(.+)\s+[0-9]{4}[A-Z]{2}\s+%s' % city.acronym)
-                regexes.append(r'^(?:A|B)[0-9]+\s+AMBU\s+[0-9]+\s+(.*)\s+%s' % city.name)
-                regexes.append(r'^(?:A|B)[0-9]+\s+AMBU\s+[0-9]+\s+(.*)\s+%s' % city.acronym)
-        elif type == ServiceType.HELICOPTER.value:
-            regexes.append(r'^[A-B][0-9](?: \(dia(?:\: ja)?\))?(?: Ambu|)? [0-9]+(?: reanimatie)?(.+)\s+(?:[0-9]+)?%s' % city.acronym)
-            regexes.append(r'^[A-B][0-9](?: \(dia(?:\: ja)?\))?(?: Ambu|)? [0-9]+(?: reanimatie)?(.+)\s+(?:[0-9]+)?%s' % city.name)
-        elif type == ServiceType.CITY.value:
-            for capcode in message.capcodes:
-                capcode = self.__capcodeCache.getCapcodeByCapcode(capcode)
-                match = re.search(r'^Brugwacht(?:er)?\s+(.*)', capcode.description, re.IGNORECASE)
-                if match is not None:
-                    return match.group(1)
+        self.__publisher.start(*self.__publisherAddress())
 
-        for regex in regexes:
-            match = re.search(regex, message.message.strip(), re.IGNORECASE)
+    def startArchive(self):
+        if self.__archiveDirectory is None or self.__archive is not None:
+            return
 
-            if match is not None:
-                return match.group(1).strip('- ')
+        try:
+            self.__archive = MessageArchive(self.__archiveDirectory, self.__config.getint('ARCHIVE', 'SegmentSize', fallback=10000))
+        except ArchiveLocked as e:
+            print(str(e) + ', archiving disabled')
 
-        return ''
+    def startListening(self):
+        self.startArchive()
+        self.startPublisher()
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.refreshReferenceData())
+
+        try:
+            self.__process.startProcess()
+        finally:
+            if self.__process.dropped > 0:
+                print('Messages dropped because the queue was full:', self.__process.dropped)
+
+    def ingestFile(self, fileLoc: str):
+        # Captures are processed at disk speed, printing every message would only slow that down
+        self.__printMessages = False
+        self.startArchive()
+        self.startPublisher()
+
+        start = time.monotonic()
+        if fileLoc == '-':
+            lineCount, messageCount = self.__process.ingest(sys.stdin)
+        else:
+            with open(fileLoc, encoding='utf-8', errors='replace', buffering=ListenerProcess.INGEST_CHUNK_SIZE) as captureFile:
+                lineCount, messageCount = self.__process.ingest(captureFile)
+
+        # Throughput includes writing out the last batch
+        self.__writer.close()
+        elapsed = max(time.monotonic() - start, 0.000001)
+
+        print('Lines read:', lineCount)
+        print('Messages processed:', messageCount)
+        print('Seconds: %.2f' % elapsed)
+        print('Lines per second: %.0f' % (lineCount / elapsed))
+        print('Messages per second: %.0f' % (messageCount / elapsed))
+
+    def printQuery(self, **filters):
+        # A running listener answers from its buffer of recent messages, this process only knows the storage
+        messages = None
+        if self.__publisher is not None:
+            try:
+                messages = queryPublisher(filters, *self.__publisherAddress())
+            except OSError:
+                # No listener running
+                pass
+            except ValueError as e:
+                print('The listener could not answer, asking the storage:', str(e))
+
+        if messages is None:
+            messages = self.query.find(**filters)
+
+        enricher = self.__enricher
+        for message in messages:
+            region = enricher.regionCache.getRegionById(message['FK_REGION'])
+            print(f"\033[{ServiceType.typeToConsoleColor(message['TYPE'])}m{message['DATE']} {'' if region is None else region.name} - {message['MESSAGE']}")
+            print(f"  {message['INCIDENT_ID']} {', '.join(message['CAPCODES'])}\033[0m")
+
+    def close(self):
+        # Writes out the messages which are still waiting for the next batch
+        self.__writer.close()
+        self.__storage.close()
+        if self.__publisher is not None:
+            self.__publisher.close()
+        if self.__archive is not None:
+            self.__archive.close()
+
+    def replayAllMessage(self, workers: int = 1, fromPK: int = 0, fromDate: str = None, source: str = 'database'):
+        # Replayed messages are in the archive already, it is only read here
+        if source == 'archive':
+            if self.__archiveDirectory is None:
+                print('Replaying from the archive needs it to be enabled in config.ini')
+                return
 
-    def __getEstimatedPostalCode(self, message: Message):
-        match = re.search(r'([0-9]{4}[A-Z]{2})', message.message.strip(), re.IGNORECASE)
+            replayed = 0
+            for archived in MessageArchive(self.__archiveDirectory, writable=False).read(fromDate):
+                message = Message(archived['raw'])
+                if message.isValidMessage():
+                    self._onMessageReceive(message)
+
+                replayed += 1
+                if replayed % 5000 == 0:
+                    print('Messages replayed:', replayed)
+
+            print('Messages replayed:', replayed)
+            return
+
+        chunkSize = self.__config.getint('REPLAY', 'ChunkSize', fallback=5000)
+        if workers > 1 and self.__storage.BACKEND != 'mysql':
+            print('Replaying with multiple processes needs the MySQL storage, replaying in one process instead')
+            workers = 1
+
+        if workers > 1:
+            print('Incidents are not assigned when replaying with multiple processes')
+            db = self.__storage.connect()
+            try:
+                ReplayPool(
+                    db,
+                    dict(self.__config['DATABASE']),
+                    workers,
+                    chunkSize
+                ).replay(fromPK, fromDate)
+            finally:
+                db.close()
+            return
+
+        # Messages are fetched in chunks by primary key, so memory stays flat regardless of the size of the table and
+        # an interrupted replay can continue from the last reported primary key
+        lastPK = fromPK - 1
+        while True:
+            messages = self.__storage.fetchMessages(lastPK, fromDate, chunkSize)
+            if len(messages) == 0:
+                break
+
+            for message in messages:
+                message = Message(message['RAW_MESSAGE'])
+                if message.isValidMessage():
+                    self._onMessageReceive(message)
+
+            lastPK = messages[-1]['PK_MESSAGE']
+            print('Messages replayed up to PK_MESSAGE', lastPK)
+
+    def replayChangedMessages(self):
+        if self.__storage.BACKEND != 'mysql':
+            print('Replaying changed reference data needs the MySQL storage')
+            return
+
+        db = self.__storage.connect()
+        try:
+            ChangeReplay(db, self.__storage, self.__config.getint('REPLAY', 'ChunkSize', fallback=5000)).replay()
+        finally:
+            db.close()
 
-        if (match is not None):
-            return match.group(1)
+    def _onMessageReceive(self, message: Message):
+        start = self.__metrics.start()
 
-        return ''
+        # The enricher and its caches can be swapped for fresh ones, so a message sticks to the one it started with
+        enricher = self.__enricher
 
-    def __printMessage(self, message: Message):
-        type = self.__getEstimatedType(message)
+        for capcode in message.capcodes:
+            if enricher.capcodeCache.getCapcodeByCapcode(capcode) is not None:
+                continue
+
+            # The insert is done without holding the lock, so a slow or unreachable database only holds up this worker.
+            # Two workers inserting the same capcode get the same id back.
+            capcodeObj = Capcode(-1, capcode, _('Unknown'), ServiceType.UNKNOWN.value, '', -1)
+            try:
+                capcodeObj.id = self.__storage.insertCapcode(capcodeObj)
+            except StorageUnavailable:
+                # Stays out of the cache, so it is inserted with the first message after the database is back
+                continue
+
+            # Workers share the cache, so it is only changed by one of them at a time
+            with self.__capcodeLock:
+                if enricher.capcodeCache.getCapcodeByCapcode(capcode) is None:
+                    enricher.capcodeCache.add(capcodeObj)
+                    self.__metrics.increment('capcodes_unknown')
+
+        self.__printMessage(message, enricher)
+        self.__metrics.observe('receive', start)
+
+    def __printMessage(self, message: Message, enricher: MessageEnricher):
+        start = self.__metrics.start()
+        type = enricher.getEstimatedType(message)
+        self.__metrics.observe('type', start)
 
         specialCode = ''
         if (message.isImportant() == True):
             specialCode = ';5'
 
         time = message.date.strftime('%Y-%m-%d %H:%M:%S')
-        estimatedRegion = self.__getEstimatedRegion(message)
+        start = self.__metrics.start()
+        estimatedRegion = enricher.getEstimatedRegion(message)
+        self.__metrics.observe('region', start)
         if self.__config.has_option('FILTER', 'Regions'):
             if str(estimatedRegion.id) not in self.__config.get('FILTER', 'Regions').split(','):
                 return
@@ -282,15 +401,33 @@ class P2000Listener:
             if type not in self.__config.get('FILTER', 'Services').split(','):
                 return
 
-        estimatedCity = self.__getEstimatedCity(message, estimatedRegion, type)
+        start = self.__metrics.start()
+        estimatedCity = enricher.getEstimatedCity(message, estimatedRegion, type)
+        self.__metrics.observe('city', start)
         if self.__config.has_option('FILTER', 'Cities'):
             if estimatedCity not in self.__config.get('FILTER', 'Cities').split(','):
                 return
 
-        estimatedStreet = self.__getEstimatedStreet(message, estimatedRegion, estimatedCity, type)
-        estimatedPostalCode = self.__getEstimatedPostalCode(message)
+        start = self.__metrics.start()
+        estimatedStreet = enricher.getEstimatedStreet(message, estimatedRegion, estimatedCity, type)
+        self.__metrics.observe('street', start)
 
-        self.__storeMessage(message, estimatedRegion, estimatedCity, estimatedStreet, estimatedPostalCode, type)
+        start = self.__metrics.start()
+        estimatedPostalCode = enricher.getEstimatedPostalCode(message)
+        self.__metrics.observe('postal_code', start)
+
+        incidentId = ''
+        if self.__correlator is not None:
+            start = self.__metrics.start()
+            incidentId = self.__correlator.correlate(message, estimatedCity.id, estimatedStreet, estimatedPostalCode)
+            self.__metrics.observe('incident', start)
+
+        start = self.__metrics.start()
+        self.__storeMessage(message, enricher, estimatedRegion, estimatedCity, estimatedStreet, estimatedPostalCode, type, incidentId)
+        self.__metrics.observe('store', start)
+
+        if self.__printMessages == False:
+            return
 
         if estimatedPostalCode:
             estimatedPostalCode = ' - ' + estimatedPostalCode
@@ -298,59 +435,59 @@ class P2000Listener:
         if estimatedStreet:
             estimatedStreet = ' - ' + estimatedStreet
 
-        print(f"\033[{ServiceType.typeToConsoleColor(type)}{specialCode}m{_('What')} {message.message}")
-        print(f"{_('When')} {time}")
-        print(f"{_('Where')} {estimatedRegion.id} {estimatedRegion.name} - {estimatedCity.name}{estimatedStreet}{estimatedPostalCode}")
-        print(f"{_('Who')}")
-        for capcode in message.capcodes:
-            capcode = self.__capcodeCache.getCapcodeByCapcode(capcode)
-            print (f"  \033[{ServiceType.typeToConsoleColor(capcode.type)}{specialCode}m{capcode.capcode} ({capcode.city}) {capcode.description}")
-        print('\033[0m')
-
-    def __storeMessage(self, message: Message, estimatedRegion: Region, estimatedCity: City, estimatedStreet, estimatedPostalCode, type: ServiceType):
-        self.__dbCursor.execute('SELECT `PK_MESSAGE`, `MESSAGE`, `STREET`, `POSTALCODE`, `FK_REGION` FROM `F_MESSAGE` WHERE `MESSAGE` = %s AND `DATE` = %s LIMIT 1', (
-            message.message.strip(),
-            message.date.strftime('%Y-%m-%d %H:%M:%S').strip()
-        ))
-
-        existingMessage = self.__dbCursor.fetchone()
-
-        if existingMessage is None:
-            self.__dbCursor.execute('INSERT IGNORE INTO `F_MESSAGE` (`RAW_MESSAGE`, `FK_REGION`, `FK_CITY`, `MESSAGE`, `DATE`, `STREET`, `POSTALCODE`, `TYPE`) ' +
-                                    'VALUES (%s, %s, %s, %s, %s, %s, %s, %s)', [
+        with self.__printLock:
+            print(f"\033[{ServiceType.typeToConsoleColor(type)}{specialCode}m{_('What')} {message.message}")
+            print(f"{_('When')} {time}")
+            print(f"{_('Where')} {estimatedRegion.id} {estimatedRegion.name} - {estimatedCity.name}{estimatedStreet}{estimatedPostalCode}")
+            print(f"{_('Who')}")
+            for capcode in message.capcodes:
+                capcode = enricher.getCapcode(capcode)
+                print (f"  \033[{ServiceType.typeToConsoleColor(capcode.type)}{specialCode}m{capcode.capcode} ({capcode.city}) {capcode.description}")
+            print('\033[0m')
+
+    def __storeMessage(self, message: Message, enricher: MessageEnricher, estimatedRegion: Region, estimatedCity: City, estimatedStreet, estimatedPostalCode, type: ServiceType, incidentId: str = ''):
+        enriched = {
+            'PK_MESSAGE': None,
+            'FK_REGION': 0 if estimatedRegion is None else estimatedRegion.id,
+            'FK_CITY': 0 if estimatedCity is None else estimatedCity.id,
+            'MESSAGE': message.message.strip(),
+            'DATE': message.date.strftime('%Y-%m-%d %H:%M:%S'),
+            'STREET': '' if estimatedStreet is None else estimatedStreet,
+            'POSTALCODE': '' if estimatedPostalCode is None else estimatedPostalCode,
+            'TYPE': type,
+            'CAPCODES': message.capcodes,
+            'INCIDENT_ID': incidentId,
+        }
+        self.__recent.add(enriched)
+        if self.__publisher is not None:
+            self.__publisher.publish(enriched)
+
+        if self.__archive is not None:
+            self.__archive.add(
                 message.rawMessage,
+                message.date.strftime('%Y-%m-%d %H:%M:%S'),
                 0 if estimatedRegion is None else estimatedRegion.id,
                 0 if estimatedCity is None else estimatedCity.id,
-                message.message.strip(),
-                message.date.strftime('%Y-%m-%d %H:%M:%S').strip(),
+                type,
+                message.capcodes,
                 '' if estimatedStreet is None else estimatedStreet,
                 '' if estimatedPostalCode is None else estimatedPostalCode,
-                type
-            ])
+                incidentId
+            )
 
-            existingMessagePK = self.__dbCursor.lastrowid
-
-            for capcode in message.capcodes:
-                capcode = self.__capcodeCache.getCapcodeByCapcode(capcode)
-                self.__dbCursor.execute(
-                    'INSERT IGNORE INTO `X_MESSAGE_CAPCODE` (`FK_MESSAGE`, `FK_CAPCODE`) VALUES (%s, %s)', [
-                        existingMessagePK,
-                        capcode.id,
-                    ])
-                self.__db.commit()
-        else:
-            existingMessagePK = existingMessage['PK_MESSAGE']
-            if (estimatedStreet != '' and existingMessage['STREET'] != estimatedStreet):
-                self.__dbCursor.execute('UPDATE `F_MESSAGE` SET `STREET` = %s WHERE `PK_MESSAGE` = %s', [estimatedStreet,existingMessagePK])
-                self.__db.commit()
-
-            if (estimatedPostalCode != '' and existingMessage['POSTALCODE'] != estimatedPostalCode):
-                self.__dbCursor.execute('UPDATE `F_MESSAGE` SET `POSTALCODE` = %s WHERE `PK_MESSAGE` = %s', [estimatedPostalCode,existingMessagePK])
-                self.__db.commit()
-
-            if (estimatedRegion.id > 0 and existingMessage['FK_REGION'] != estimatedRegion):
-                self.__dbCursor.execute('UPDATE `F_MESSAGE` SET `FK_REGION` = %s WHERE `PK_MESSAGE` = %s', [estimatedRegion.id, existingMessagePK])
-                self.__db.commit()
+        self.__writer.add(
+            message.rawMessage,
+            0 if estimatedRegion is None else estimatedRegion.id,
+            0 if estimatedCity is None else estimatedCity.id,
+            message.message.strip(),
+            message.date.strftime('%Y-%m-%d %H:%M:%S').strip(),
+            '' if estimatedStreet is None else estimatedStreet,
+            '' if estimatedPostalCode is None else estimatedPostalCode,
+            type,
+            # Capcodes which could not be added while the database was down have no id to link to
+            [capcodeId for capcodeId in [enricher.getCapcode(capcode).id for capcode in message.capcodes] if capcodeId > 0],
+            incidentId
+        )
 
 if __name__ == '__main__':
     config = configparser.ConfigParser()
@@ -364,11 +501,36 @@ if __name__ == '__main__':
     if (args.services is not None):
         config.set('FILTER', 'Services', args.services)
 
+    if args.query is True and ((args.regions is not None and not args.regions.isdigit()) or (args.services is not None and ',' in args.services)):
+        print('A query takes a single region with -r and a single service with -s')
+        sys.exit(1)
+
     P2000Listener = P2000Listener(config)
-    if args.message is not None:
-        message = Message('FLEX|2025-04-16 18:55:05|1600/2/K/A|13.108|'+ args.message)
-        P2000Listener._onMessageReceive(message)
-    elif args.replay_all is True:
-        P2000Listener.replayAllMessage()
-    else:
-        P2000Listener.startListening()
\ No newline at end of file
+    try:
+        if args.message is not None:
+            message = Message('FLEX|2025-04-16 18:55:05|1600/2/K/A|13.108|'+ args.message)
+            if message.isValidMessage() == False:
+                print('Not a valid test message, expected capcodes|ALN|text:', args.message)
+                sys.exit(1)
+
+            P2000Listener._onMessageReceive(message)
+        elif args.ingest_file is not None:
+            P2000Listener.ingestFile(args.ingest_file)
+        elif args.query is True:
+            P2000Listener.printQuery(
+                capcode=args.capcode,
+                incidentId=args.incident,
+                regionId=None if args.regions is None else int(args.regions),
+                type=args.services,
+                fromDate=args.from_date,
+                toDate=args.to_date,
+                limit=args.limit
+            )
+        elif args.replay_all is True:
+            P2000Listener.replayAllMessage(args.workers, args.from_pk, args.from_date, args.replay_source)
+        elif args.replay_changed is True:
+            P2000Listener.replayChangedMessages()
+        else:
+            P2000Listener.startListening()
+    finally:
+        P2000Listener.close()
@@ -1,148 +1,177 @@
 #!/usr/bin/env python
 import sys
-import csv
-import mysql.connector
 import os
 import configparser
-from subprocess import Popen, PIPE
+import argparse
+from P2000 import ReferenceData
 
-config = configparser.ConfigParser()
-config.read(os.path.dirname(os.path.realpath(__file__)) + '/config.ini')
-databaseConf = config['DATABASE']
-db = mysql.connector.connect(
-    host=databaseConf.get('Host', 'localhost'),
-    user=databaseConf.get('Username', 'P2000'),
-    password=databaseConf.get('Password', ''),
-    database=databaseConf.get('Database', 'P2000'),
-)
+parser = argparse.ArgumentParser('P2000 Setup')
+parser.add_argument('-n', '--dry-run', help='Only validate the CSV files, without touching the database', required=False, action='store_true')
+parser.add_argument('-w', '--workers', help='Number of processes to parse the capcode files with', required=False, type=int)
+args = parser.parse_args()
 
 curDir = os.path.dirname(os.path.realpath(__file__))
-cursor = db.cursor(dictionary=True)
 
 ####
-## Setup Database
+## Read and validate all reference data from the CSV files
 ####
-fd = open(curDir + '/setup/database.sql', 'r')
-sqlFile = fd.read()
-fd.close()
-sqlCommands = sqlFile.split(';')
-
-for command in sqlCommands:
-    try:
-        if command.strip() != '':
-            cursor.execute(command)
-    except Exception as e :
-        print("Command skipped: ",command, repr(e))
+regions, errors = ReferenceData.parseRegions(curDir + '/setup/regios.csv')
+cities, cityErrors = ReferenceData.parseCities(curDir + '/setup/Afkortingen Gemeente- en plaatsnamen.csv')
+capcodes, capcodeErrors = ReferenceData.parseCapcodeFiles({
+    regionId: curDir + '/setup/capcodes/' + str("{:02d}".format(regionId)) + '.csv'
+    for regionId in regions.keys()
+}, args.workers)
+errors += cityErrors + capcodeErrors
 
-####
-## Setup regios
-####
-print ('Regio\'s instellen - start')
-with open(curDir + '/setup/regios.csv') as regiosCsv:
-    reader = csv.DictReader(regiosCsv, delimiter=',')
-    for row in reader:
-        cursor.execute("SELECT * FROM `D_REGION` WHERE `PK_REGION` = %s", [row['regioCode']])
-        existingRegion = cursor.fetchone()
-        if existingRegion is None:
-            cursor.execute("INSERT INTO `D_REGION` (`PK_REGION`, `NAME`) VALUES (%s, %s)", [row['regioCode'], row['regioNaam']])
-            print('Regio toegevoegd:', row['regioNaam'])
-            db.commit()
-        elif existingRegion['NAME'] != row['regioNaam']:
-            cursor.execute("UPDATE `D_REGION` SET `NAME` = %s WHERE `PK_REGION` = %s", [row['regioNaam'], existingRegion['PK_REGION']])
-            print('Regio geüpdatet:', row['regioNaam'])
-            db.commit()
-
-print ('Regio\'s installen - klaar')
+# Malformed rows are skipped and reported, they never stop the rest of the data from being loaded
+for error in errors:
+    print('Regel overgeslagen:', error)
+
+print('Gelezen:', len(regions), 'regio\'s,', len(cities), 'steden,', len(capcodes), 'capcodes,', len(errors), 'fouten')
+if args.dry_run:
+    sys.exit(1 if len(errors) > 0 else 0)
+
+config = configparser.ConfigParser()
+config.read(os.path.dirname(os.path.realpath(__file__)) + '/config.ini')
 
 ####
-## Setup cities
+## Setup Database
 ####
-with open(curDir + '/setup/Afkortingen Gemeente- en plaatsnamen.csv') as acronymsCsv:
-    reader = csv.DictReader(acronymsCsv, delimiter=',')
-    for row in reader:
-        cursor.execute("SELECT * FROM `D_CITY` WHERE `ACRONYM` = %s", [row['afkorting']])
-        existingCity = cursor.fetchone()
-        if existingCity is None:
-            cursor.execute("INSERT INTO `D_CITY` (`ACRONYM`, `NAME`) VALUES (%s, %s)", [
-                row['afkorting'],
-                row['plaatsnaam']
-            ])
-            print('Stad toegevoegd:', row['plaatsnaam'], '(', row['afkorting'], ')')
-            db.commit()
-        elif (
-            existingCity['NAME'] != row['plaatsnaam'] or
-            existingCity['ACRONYM'] != row['afkorting']
-        ):
-            cursor.execute("UPDATE `D_CITY` SET `NAME ` = %s, `ACRONYM` = %s WHERE PK_CITY = %s", [
-                row['plaatsnaam'],
-                row['afkorting'],
-                existingCity['PK_CITY']
-            ])
-            print('Stad geüpdatet:', row['plaatsnaam'], '(', row['afkorting'], ')')
+if config.get('STORAGE', 'Backend', fallback='mysql') == 'sqlite':
+    from P2000 import SQLiteStorage
+
+    db = SQLiteStorage.connect(os.path.join(curDir, config.get('STORAGE', 'File', fallback='p2000.sqlite')))
+    SQLiteStorage.createSchema(db)
+    cursor = db.cursor()
+    placeholder = '?'
+else:
+    # Only imported when the database is used, so a dry run works without the connector installed
+    import mysql.connector
+
+    databaseConf = config['DATABASE']
+    db = mysql.connector.connect(
+        host=databaseConf.get('Host', 'localhost'),
+        user=databaseConf.get('Username', 'P2000'),
+        password=databaseConf.get('Password', ''),
+        database=databaseConf.get('Database', 'P2000'),
+    )
+
+    cursor = db.cursor(dictionary=True)
+    placeholder = '%s'
+
+    fd = open(curDir + '/setup/database.sql', 'r')
+    sqlFile = fd.read()
+    fd.close()
+    sqlCommands = sqlFile.split(';')
+
+    for command in sqlCommands:
+        try:
+            if command.strip() != '':
+                cursor.execute(command)
+        except Exception as e :
+            print("Command skipped: ",command, repr(e))
+
+    db.commit()
+
+# The queries below are written for MySQL, SQLite only differs in its placeholder
+def sql(query):
+    return query.replace('%s', placeholder)
+
+# Every changed capcode, city and region is logged, so `p2000.py --replay-changed` only has to re-enrich the messages
+# affected by it
+def logChanges(type, query, keys):
+    if len(keys) > 0:
+        cursor.execute(
+            sql("INSERT INTO `F_REFERENCE_CHANGE` (`TYPE`, `FK_REFERENCE`) " + query.format(', '.join(['%s'] * len(keys)))),
+            [type] + keys
+        )
 
 ####
-## Setup capcodes per veiligheidsregio
+## Diff against the database and apply all changes in a single transaction
 ####
-print ('Capcodes instellen - start')
-cursor.execute("SELECT PK_REGION FROM D_REGION ORDER BY PK_REGION ASC")
-for region in cursor.fetchall():
-    fileLoc = curDir + '/setup/capcodes/' + str("{:02d}".format(region['PK_REGION'])) + '.csv'
-    with open(fileLoc) as csvFile:
-        reader = csv.DictReader(csvFile, delimiter=',')
-        for row in reader:
-            # If a line does not have all information, we probably want to ignore it
-            if (len(row) < 4):
-                continue
-
-            type = row['discipline']
-            if type == 'BRW' or type == 'GMK' or type == 'OCB':
-                type = 'brandweer'
-            elif type == 'AMBU' or type == 'MKA' or type == 'LifeLiner':
-                type = 'ambulance'
-            elif type == 'BRUG':
-                type = 'gemeente'
-            elif type == 'POL':
-                type = 'politie'
-            elif type == 'RB':
-                type = 'reddingsbrigade'
-            elif type == 'KNRM' or type == 'KNRM-KWC' or type == 'KNBRD' or type == 'MIRG':
-                type = 'knrm'
-            elif type == 'GHOR' or type == 'BRUG':
-                type = 'gemeente'
-            else:
-                type = 'onbekend'
-
-            cursor.execute("SELECT * FROM `D_CAPCODE` WHERE `CAPCODE` = %s LIMIT 1", [row['capcode']])
-            existingCapcode = cursor.fetchone()
-            if existingCapcode is None:
-                cursor.execute("INSERT INTO `D_CAPCODE` (`CAPCODE`, `FK_REGION`, `DESCRIPTION`, `TYPE`, `CITY`) VALUES (%s, %s, %s, %s, %s)", [
-                    row['capcode'],
-                    region['PK_REGION'],
-                    row['beschrijving'],
-                    type,
-                    row['locatie/divisie']
-                ])
-                print('Capcode ', row['capcode'], ' inserted')
-
-                db.commit()
-            elif (
-                existingCapcode['CAPCODE'] != row['capcode'] or
-                existingCapcode['FK_REGION'] != region['PK_REGION'] or
-                existingCapcode['DESCRIPTION'] != row['beschrijving'] or
-                existingCapcode['TYPE'] != type or
-                existingCapcode['CITY'] != row['locatie/divisie']
-            ):
-                cursor.execute("UPDATE `D_CAPCODE` SET `FK_REGION` = %s, `DESCRIPTION` = %s, `TYPE` = %s, `CITY` = %s WHERE `PK_CAPCODE` = %s", [
-                    region['PK_REGION'],
-                    row['beschrijving'],
-                    type,
-                    row['locatie/divisie'],
-                    existingCapcode['PK_CAPCODE']
-                ]);
-
-                print('Capcode ', row['capcode'], ' updated')
-                db.commit()
-
-print ('Capcodes instellen - klaar')
+print ('Referentiedata instellen - start')
+
+cursor.execute("SELECT `PK_REGION`, `NAME` FROM `D_REGION`")
+existingRegions = {region['PK_REGION']: region for region in cursor.fetchall()}
+regionInserts = []
+regionUpdates = []
+changedRegions = []
+for regionId, name in regions.items():
+    existingRegion = existingRegions.get(regionId)
+    if existingRegion is None:
+        regionInserts.append((regionId, name))
+    elif existingRegion['NAME'] != name:
+        regionUpdates.append((name, regionId))
+    else:
+        continue
+
+    changedRegions.append(regionId)
+
+cursor.execute("SELECT `PK_CITY`, `ACRONYM`, `NAME` FROM `D_CITY`")
+existingCities = {city['ACRONYM']: city for city in cursor.fetchall()}
+cityInserts = []
+cityUpdates = []
+changedCities = []
+for acronym, name in cities.items():
+    existingCity = existingCities.get(acronym)
+    if existingCity is None:
+        cityInserts.append((acronym, name))
+    elif existingCity['NAME'] != name:
+        cityUpdates.append((name, existingCity['PK_CITY']))
+    else:
+        continue
+
+    changedCities.append(acronym)
+
+cursor.execute("SELECT `PK_CAPCODE`, `CAPCODE`, `FK_REGION`, `DESCRIPTION`, `TYPE`, `CITY` FROM `D_CAPCODE`")
+existingCapcodes = {capcode['CAPCODE']: capcode for capcode in cursor.fetchall()}
+capcodeInserts = []
+capcodeUpdates = []
+changedCapcodes = []
+for capcode, (regionId, description, type, city) in capcodes.items():
+    existingCapcode = existingCapcodes.get(capcode)
+    if existingCapcode is None:
+        capcodeInserts.append((capcode, regionId, description, type, city))
+    elif (
+        existingCapcode['FK_REGION'] != regionId or
+        existingCapcode['DESCRIPTION'] != description or
+        existingCapcode['TYPE'] != type or
+        existingCapcode['CITY'] != city
+    ):
+        capcodeUpdates.append((regionId, description, type, city, existingCapcode['PK_CAPCODE']))
+    else:
+        continue
+
+    changedCapcodes.append(capcode)
+
+try:
+    if len(regionInserts) > 0:
+        cursor.executemany(sql("INSERT INTO `D_REGION` (`PK_REGION`, `NAME`) VALUES (%s, %s)"), regionInserts)
+    if len(regionUpdates) > 0:
+        cursor.executemany(sql("UPDATE `D_REGION` SET `NAME` = %s WHERE `PK_REGION` = %s"), regionUpdates)
+    logChanges('region', "SELECT %s, `PK_REGION` FROM `D_REGION` WHERE `PK_REGION` IN ({})", changedRegions)
+
+    if len(cityInserts) > 0:
+        cursor.executemany(sql("INSERT INTO `D_CITY` (`ACRONYM`, `NAME`) VALUES (%s, %s)"), cityInserts)
+    if len(cityUpdates) > 0:
+        cursor.executemany(sql("UPDATE `D_CITY` SET `NAME` = %s WHERE `PK_CITY` = %s"), cityUpdates)
+    logChanges('city', "SELECT %s, `PK_CITY` FROM `D_CITY` WHERE `ACRONYM` IN ({})", changedCities)
+
+    if len(capcodeInserts) > 0:
+        cursor.executemany(sql("INSERT INTO `D_CAPCODE` (`CAPCODE`, `FK_REGION`, `DESCRIPTION`, `TYPE`, `CITY`) VALUES (%s, %s, %s, %s, %s)"), capcodeInserts)
+    if len(capcodeUpdates) > 0:
+        cursor.executemany(sql("UPDATE `D_CAPCODE` SET `FK_REGION` = %s, `DESCRIPTION` = %s, `TYPE` = %s, `CITY` = %s WHERE `PK_CAPCODE` = %s"), capcodeUpdates)
+    logChanges('capcode', "SELECT %s, `PK_CAPCODE` FROM `D_CAPCODE` WHERE `CAPCODE` IN ({})", changedCapcodes)
+
+    db.commit()
+except Exception as e:
+    db.rollback()
+    print('Referentiedata niet bijgewerkt:', repr(e))
+    raise
+
+print('Regio\'s:', len(regionInserts), 'toegevoegd,', len(regionUpdates), 'geüpdatet')
+print('Steden:', len(cityInserts), 'toegevoegd,', len(cityUpdates), 'geüpdatet')
+print('Capcodes:', len(capcodeInserts), 'toegevoegd,', len(capcodeUpdates), 'geüpdatet')
+print ('Referentiedata instellen - klaar')
 
 cursor.close()
\ No newline at end of file
@@ -30,20 +30,52 @@ CREATE TABLE IF NOT EXISTS `F_MESSAGE` (
     `FK_REGION` INT(10) DEFAULT 0 NOT NULL,
     `FK_CITY` INT(10) DEFAULT 0 NOT NULL,
     `MESSAGE` TEXT DEFAULT '' NOT NULL,
+    `MESSAGE_HASH` CHAR(40) DEFAULT '' NOT NULL,
     `DATE` DATETIME NOT NULL,
     `STREET` VARCHAR(255) DEFAULT '' NOT NULL,
     `POSTALCODE` VARCHAR(12) DEFAULT '' NOT NULL,
     `TYPE` enum('ambulance','brandweer','dares','gemeente','knrm','onbekend','politie','reddingsbrigade','helikopter') NOT NULL DEFAULT 'onbekend',
+    `INCIDENT_ID` VARCHAR(32) DEFAULT '' NOT NULL,
     PRIMARY KEY (`PK_MESSAGE`),
-    UNIQUE INDEX `SEARCH_BY_MESSAGE_DATE` (`MESSAGE`, `DATE`)
+    UNIQUE INDEX `SEARCH_BY_MESSAGE_HASH_DATE` (`MESSAGE_HASH`, `DATE`),
+    INDEX `SEARCH_BY_DATE` (`DATE`),
+    INDEX `SEARCH_BY_TYPE_DATE` (`TYPE`, `DATE`),
+    INDEX `SEARCH_BY_REGION_DATE` (`FK_REGION`, `DATE`),
+    INDEX `SEARCH_BY_CITY_DATE` (`FK_CITY`, `DATE`),
+    INDEX `SEARCH_BY_INCIDENT_DATE` (`INCIDENT_ID`, `DATE`)
 );
 
+ALTER TABLE `F_MESSAGE` ADD COLUMN `MESSAGE_HASH` CHAR(40) DEFAULT '' NOT NULL AFTER `MESSAGE`;
+-- Hashed as UTF-8 like the listener does, whatever the character set of the column is
+UPDATE `F_MESSAGE` SET `MESSAGE_HASH` = SHA1(CONVERT(`MESSAGE` USING utf8mb4)) WHERE `MESSAGE_HASH` = '';
+ALTER TABLE `F_MESSAGE` DROP INDEX `SEARCH_BY_MESSAGE_DATE`;
+ALTER TABLE `F_MESSAGE` ADD UNIQUE INDEX `SEARCH_BY_MESSAGE_HASH_DATE` (`MESSAGE_HASH`, `DATE`);
+ALTER TABLE `F_MESSAGE` ADD INDEX `SEARCH_BY_DATE` (`DATE`);
+ALTER TABLE `F_MESSAGE` ADD INDEX `SEARCH_BY_TYPE_DATE` (`TYPE`, `DATE`);
+ALTER TABLE `F_MESSAGE` ADD INDEX `SEARCH_BY_REGION_DATE` (`FK_REGION`, `DATE`);
+ALTER TABLE `F_MESSAGE` ADD INDEX `SEARCH_BY_CITY_DATE` (`FK_CITY`, `DATE`);
+ALTER TABLE `F_MESSAGE` ADD COLUMN `INCIDENT_ID` VARCHAR(32) DEFAULT '' NOT NULL AFTER `TYPE`;
+ALTER TABLE `F_MESSAGE` ADD INDEX `SEARCH_BY_INCIDENT_DATE` (`INCIDENT_ID`, `DATE`);
+
 CREATE TABLE IF NOT EXISTS `X_MESSAGE_CAPCODE` (
     `PK_MESSAGE_CAPCODE` INT(10) unsigned NOT NULL AUTO_INCREMENT,
     `FK_MESSAGE` INT(10) NOT NULL,
     `FK_CAPCODE` INT(10) NOT NULL,
     PRIMARY KEY (`PK_MESSAGE_CAPCODE`),
     INDEX `SEARCH_BY_MESSAGE` (`FK_MESSAGE`),
-    INDEX `SEARCH_BY_CAPCODE` (`FK_CAPCODE`),
+    INDEX `SEARCH_BY_CAPCODE_MESSAGE` (`FK_CAPCODE`, `FK_MESSAGE`),
     UNIQUE INDEX `SEARCH_BY_MESSAGE_CAPCODE` (`FK_MESSAGE`, `FK_CAPCODE`)
-);
\ No newline at end of file
+);
+
+ALTER TABLE `X_MESSAGE_CAPCODE` ADD INDEX `SEARCH_BY_CAPCODE_MESSAGE` (`FK_CAPCODE`, `FK_MESSAGE`);
+ALTER TABLE `X_MESSAGE_CAPCODE` DROP INDEX `SEARCH_BY_CAPCODE`;
+
+CREATE TABLE IF NOT EXISTS `F_REFERENCE_CHANGE` (
+    `PK_REFERENCE_CHANGE` INT(10) unsigned NOT NULL AUTO_INCREMENT,
+    `TYPE` enum('capcode','city','region') NOT NULL,
+    `FK_REFERENCE` INT(10) NOT NULL,
+    `DATE` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    `REPLAYED` TINYINT(1) NOT NULL DEFAULT 0,
+    PRIMARY KEY (`PK_REFERENCE_CHANGE`),
+    INDEX `SEARCH_BY_REPLAYED` (`REPLAYED`)
+);
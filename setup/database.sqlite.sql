@@ -0,0 +1,79 @@
+CREATE TABLE IF NOT EXISTS `D_CAPCODE` (
+    `PK_CAPCODE` INTEGER PRIMARY KEY,
+    `CAPCODE` VARCHAR(255) NOT NULL,
+    `FK_REGION` INTEGER NOT NULL DEFAULT 0,
+    `DESCRIPTION` VARCHAR(255) NOT NULL DEFAULT '',
+    `TYPE` VARCHAR(16) NOT NULL DEFAULT 'onbekend' CHECK (`TYPE` IN ('ambulance','brandweer','dares','gemeente','knrm','onbekend','politie','reddingsbrigade','helikopter')),
+    `CITY` VARCHAR(255) NOT NULL DEFAULT ''
+);
+CREATE UNIQUE INDEX IF NOT EXISTS `UNIQUE_CAPCODE` ON `D_CAPCODE` (`CAPCODE`);
+
+CREATE TABLE IF NOT EXISTS `D_REGION` (
+    `PK_REGION` INTEGER PRIMARY KEY,
+    `NAME` VARCHAR(255) DEFAULT NULL
+);
+
+CREATE TABLE IF NOT EXISTS `D_CITY` (
+    `PK_CITY` INTEGER PRIMARY KEY,
+    `NAME` VARCHAR(255) DEFAULT NULL,
+    `ACRONYM` VARCHAR(255) DEFAULT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS `SEARCH_ACRONYM` ON `D_CITY` (`ACRONYM`);
+CREATE INDEX IF NOT EXISTS `SEARCH_NAME` ON `D_CITY` (`NAME`);
+
+CREATE TABLE IF NOT EXISTS `F_MESSAGE` (
+    `PK_MESSAGE` INTEGER PRIMARY KEY,
+    `RAW_MESSAGE` TEXT DEFAULT '' NOT NULL,
+    `FK_REGION` INTEGER DEFAULT 0 NOT NULL,
+    `FK_CITY` INTEGER DEFAULT 0 NOT NULL,
+    `MESSAGE` TEXT DEFAULT '' NOT NULL,
+    `MESSAGE_HASH` CHAR(40) DEFAULT '' NOT NULL,
+    `DATE` DATETIME NOT NULL,
+    `STREET` VARCHAR(255) DEFAULT '' NOT NULL,
+    `POSTALCODE` VARCHAR(12) DEFAULT '' NOT NULL,
+    `TYPE` VARCHAR(16) NOT NULL DEFAULT 'onbekend' CHECK (`TYPE` IN ('ambulance','brandweer','dares','gemeente','knrm','onbekend','politie','reddingsbrigade','helikopter')),
+    `INCIDENT_ID` VARCHAR(32) DEFAULT '' NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS `SEARCH_BY_MESSAGE_HASH_DATE` ON `F_MESSAGE` (`MESSAGE_HASH`, `DATE`);
+CREATE INDEX IF NOT EXISTS `SEARCH_BY_DATE` ON `F_MESSAGE` (`DATE`);
+CREATE INDEX IF NOT EXISTS `SEARCH_BY_TYPE_DATE` ON `F_MESSAGE` (`TYPE`, `DATE`);
+CREATE INDEX IF NOT EXISTS `SEARCH_BY_REGION_DATE` ON `F_MESSAGE` (`FK_REGION`, `DATE`);
+CREATE INDEX IF NOT EXISTS `SEARCH_BY_CITY_DATE` ON `F_MESSAGE` (`FK_CITY`, `DATE`);
+CREATE INDEX IF NOT EXISTS `SEARCH_BY_INCIDENT_DATE` ON `F_MESSAGE` (`INCIDENT_ID`, `DATE`);
+
+CREATE TABLE IF NOT EXISTS `X_MESSAGE_CAPCODE` (
+    `PK_MESSAGE_CAPCODE` INTEGER PRIMARY KEY,
+    `FK_MESSAGE` INTEGER NOT NULL,
+    `FK_CAPCODE` INTEGER NOT NULL
+);
+DROP INDEX IF EXISTS `SEARCH_BY_CAPCODE`;
+CREATE INDEX IF NOT EXISTS `SEARCH_BY_CAPCODE_MESSAGE` ON `X_MESSAGE_CAPCODE` (`FK_CAPCODE`, `FK_MESSAGE`);
+CREATE UNIQUE INDEX IF NOT EXISTS `SEARCH_BY_MESSAGE_CAPCODE` ON `X_MESSAGE_CAPCODE` (`FK_MESSAGE`, `FK_CAPCODE`);
+
+CREATE TABLE IF NOT EXISTS `F_REFERENCE_CHANGE` (
+    `PK_REFERENCE_CHANGE` INTEGER PRIMARY KEY,
+    `TYPE` VARCHAR(8) NOT NULL CHECK (`TYPE` IN ('capcode','city','region')),
+    `FK_REFERENCE` INTEGER NOT NULL,
+    `DATE` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    `REPLAYED` TINYINT(1) NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS `SEARCH_BY_REPLAYED` ON `F_REFERENCE_CHANGE` (`REPLAYED`);
+
+-- SQLite has no CHECKSUM TABLE, every change to the reference tables bumps their version here instead
+CREATE TABLE IF NOT EXISTS `D_VERSION` (
+    `NAME` VARCHAR(32) PRIMARY KEY,
+    `VERSION` INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO `D_VERSION` (`NAME`) VALUES ('D_CAPCODE'), ('D_CITY'), ('D_REGION');
+
+-- Unknown capcodes the listener adds itself (region -1) leave the version alone, the listener already has them
+DROP TRIGGER IF EXISTS `D_CAPCODE_INSERT`;
+CREATE TRIGGER IF NOT EXISTS `D_CAPCODE_INSERT` AFTER INSERT ON `D_CAPCODE` WHEN NEW.`FK_REGION` != -1 BEGIN UPDATE `D_VERSION` SET `VERSION` = `VERSION` + 1 WHERE `NAME` = 'D_CAPCODE'; END;
+CREATE TRIGGER IF NOT EXISTS `D_CAPCODE_UPDATE` AFTER UPDATE ON `D_CAPCODE` BEGIN UPDATE `D_VERSION` SET `VERSION` = `VERSION` + 1 WHERE `NAME` = 'D_CAPCODE'; END;
+CREATE TRIGGER IF NOT EXISTS `D_CAPCODE_DELETE` AFTER DELETE ON `D_CAPCODE` BEGIN UPDATE `D_VERSION` SET `VERSION` = `VERSION` + 1 WHERE `NAME` = 'D_CAPCODE'; END;
+CREATE TRIGGER IF NOT EXISTS `D_CITY_INSERT` AFTER INSERT ON `D_CITY` BEGIN UPDATE `D_VERSION` SET `VERSION` = `VERSION` + 1 WHERE `NAME` = 'D_CITY'; END;
+CREATE TRIGGER IF NOT EXISTS `D_CITY_UPDATE` AFTER UPDATE ON `D_CITY` BEGIN UPDATE `D_VERSION` SET `VERSION` = `VERSION` + 1 WHERE `NAME` = 'D_CITY'; END;
+CREATE TRIGGER IF NOT EXISTS `D_CITY_DELETE` AFTER DELETE ON `D_CITY` BEGIN UPDATE `D_VERSION` SET `VERSION` = `VERSION` + 1 WHERE `NAME` = 'D_CITY'; END;
+CREATE TRIGGER IF NOT EXISTS `D_REGION_INSERT` AFTER INSERT ON `D_REGION` BEGIN UPDATE `D_VERSION` SET `VERSION` = `VERSION` + 1 WHERE `NAME` = 'D_REGION'; END;
+CREATE TRIGGER IF NOT EXISTS `D_REGION_UPDATE` AFTER UPDATE ON `D_REGION` BEGIN UPDATE `D_VERSION` SET `VERSION` = `VERSION` + 1 WHERE `NAME` = 'D_REGION'; END;
+CREATE TRIGGER IF NOT EXISTS `D_REGION_DELETE` AFTER DELETE ON `D_REGION` BEGIN UPDATE `D_VERSION` SET `VERSION` = `VERSION` + 1 WHERE `NAME` = 'D_REGION'; END;
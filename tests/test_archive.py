@@ -0,0 +1,84 @@
+import glob
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from P2000.MessageArchive import ArchiveLocked, MessageArchive
+
+def add(archive: MessageArchive, date: str, capcodes: list, raw: str = 'FLEX|...'):
+    archive.add(raw, date, 16, 7, 'brandweer', capcodes)
+
+class MessageArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.archiveDir = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testReadOpenAndSealed(self):
+        archive = MessageArchive(self.archiveDir, segmentSize=2)
+        for second in range(5):
+            add(archive, '2026-01-01 10:00:0%d' % second, ['1420235'], 'raw %d' % second)
+
+        # Two full segments are sealed, the fifth message is still in the open one
+        self.assertEqual(2, len(glob.glob(os.path.join(self.archiveDir, '*' + MessageArchive.INDEX))))
+        self.assertEqual(['raw %d' % second for second in range(5)], [message['raw'] for message in archive.read()])
+        archive.close()
+
+        self.assertEqual(0, len(glob.glob(os.path.join(self.archiveDir, '*' + MessageArchive.OPEN))))
+        self.assertEqual(5, len(list(MessageArchive(self.archiveDir, writable=False).read())))
+
+    def testSealedOnNewDay(self):
+        archive = MessageArchive(self.archiveDir)
+        add(archive, '2026-01-01 23:59:59', ['1420235'])
+        add(archive, '2026-01-02 00:00:01', ['1420235'])
+        archive.close()
+
+        self.assertEqual(2, len(archive.segments()))
+
+    def testFilters(self):
+        archive = MessageArchive(self.archiveDir, segmentSize=2)
+        add(archive, '2026-01-01 10:00:00', ['1420235'])
+        add(archive, '2026-01-01 11:00:00', ['1400628'])
+        add(archive, '2026-01-01 12:00:00', ['1420235', '1400628'])
+        archive.close()
+
+        self.assertEqual(['2026-01-01 11:00:00', '2026-01-01 12:00:00'], [message['date'] for message in archive.read(fromDate='2026-01-01 11:00:00')])
+        self.assertEqual(['2026-01-01 10:00:00'], [message['date'] for message in archive.read(toDate='2026-01-01 10:30:00')])
+        self.assertEqual(['2026-01-01 11:00:00', '2026-01-01 12:00:00'], [message['date'] for message in archive.read(capcode='1400628')])
+
+    def testOneWriter(self):
+        archive = MessageArchive(self.archiveDir)
+        add(archive, '2026-01-01 10:00:00', ['1420235'])
+
+        with self.assertRaises(ArchiveLocked):
+            MessageArchive(self.archiveDir)
+
+        # The open segment of the writer is left alone
+        self.assertEqual(1, len(list(MessageArchive(self.archiveDir, writable=False).read())))
+        add(archive, '2026-01-01 10:00:01', ['1420235'])
+        archive.close()
+        self.assertEqual(2, len(list(MessageArchive(self.archiveDir, writable=False).read())))
+
+    def testReadOnly(self):
+        archive = MessageArchive(self.archiveDir, writable=False)
+        with self.assertRaises(ArchiveLocked):
+            add(archive, '2026-01-01 10:00:00', ['1420235'])
+
+    def testSealsSegmentOfCrashedWriter(self):
+        with open(os.path.join(self.archiveDir, '20260101-100000-000' + MessageArchive.OPEN), 'w', encoding='utf-8') as openFile:
+            openFile.write('{"date": "2026-01-01 10:00:00", "raw": "raw", "capcodes": ["1420235"]}\n{"date": "2026-01-01 10:0')
+
+        archive = MessageArchive(self.archiveDir)
+        archive.close()
+
+        segments = archive.segments()
+        self.assertEqual(1, len(segments))
+        self.assertEqual(1, segments[0][1]['count'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,236 @@
+"""
+Runs the message parsing, city matching and street estimation of the original listener next to the current code, on
+lines made with benchmarks/generator.py. The original code is copied here as it was, so the two can be compared.
+"""
+import os
+import re
+import sys
+import unittest
+from datetime import datetime, timezone
+
+rootDir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, rootDir)
+sys.path.insert(0, os.path.join(rootDir, 'benchmarks'))
+
+from generator import FlexGenerator, loadRows
+from P2000.Capcode import CapcodeCollection
+from P2000.City import CityCollection
+from P2000.Message import Message
+from P2000.MessageEnricher import MessageEnricher
+from P2000.Region import RegionCollection
+from P2000.ServiceType import ServiceType
+from P2000.StreetRules import StreetRuleCollection
+
+class BaselineMessage:
+    def __init__(self, message):
+        self.rawMessage = message.strip()
+        self.__stringParts = message.split('|')
+        self.__isValid = True
+
+        if (self.__stringParts[0] != 'FLEX'):
+            self.__isValid = False
+            return
+
+        self.date = datetime.now()
+        self.capcodes = []
+        for capcode in self.__stringParts[4].split(' '):
+            capcode = capcode[-7:]
+            if int(capcode) > 2000000:
+                continue
+
+            self.capcodes.append(capcode)
+
+        self.message = self.__stringParts[6].strip()
+
+        try:
+            self.date = datetime.strptime(self.__stringParts[1], '%Y-%m-%d %H:%M:%S')
+            self.date = self.date.replace(tzinfo=timezone.utc)
+            self.date = self.date.astimezone()
+        except ValueError:
+            self.__isValid = False
+            return
+
+        if (
+            self.message.lower().startswith('test') or
+            self.message.strip() == ''
+        ):
+            self.__isValid = False
+            return
+
+    def isValidMessage(self):
+        return self.__isValid
+
+class BaselineCityMatcher:
+    def __init__(self, cityCache: CityCollection):
+        # The original joined these for every message, they do not change so they are compiled once here
+        acronymList = '|'.join(city.acronym for city in cityCache.getAllCities())
+        nameList = '|'.join(city.name for city in cityCache.getAllCities())
+        self.__acronyms = re.compile(r'(%s)' % acronymList)
+        self.__endNames = re.compile(r'(%s)(?:(?: [0-9]+)+)?$' % nameList, re.IGNORECASE)
+        self.__names = re.compile(r'(%s)' % nameList)
+
+    def match(self, text: str, type: str):
+        """The kind of match and the text which matched, the original looked the city up by that text"""
+        match = self.__acronyms.search(text)
+        if match is not None:
+            return 'acronym', match.group(1)
+
+        if (type in [ServiceType.FIREFIGHTER.value, ServiceType.POLICE.value]):
+            match = self.__endNames.search(text.strip())
+            if match is not None:
+                return 'name', match.group(1)
+
+        match = self.__names.search(text)
+        if match is not None:
+            return 'name', match.group(1)
+
+        return None, None
+
+def baselineStreet(message, region, city, type, capcodeCache: CapcodeCollection) -> str:
+    regexes = []
+
+    if type in [ServiceType.FIREFIGHTER.value, ServiceType.KNRM.value]:
+        types = [
+            'Liftopsluiting',
+            r'Stank\/hind\. lucht(?: \([^)]+\))?(?: \([^)]+\))?',
+            r'Contact mkb Verontr\. opp\.water(?: \([^)]+\))?',
+            r'(?:\([^)]+\) )?BR [a-z\/]+(?: \([^)]+\))?(?: \([^)]+\))?',
+            r'(?: \([^)]+\))?Ass\. Ambu(?: \([^)]+\))?',
+            r'(?: \([^)]+\))?Ass\. Politie(?: \([^)]+\))?',
+            r'Ongeval gev(?:\.|aarlijke) stof(?:fen)?(?: \([^)]+\))?(?: \([^)]+\))?',
+            'Dier in problemen',
+            'Brandgerucht',
+            r'\([^)]+\) Contact [A-Z]+',
+            r'(?:BR|Ongeval) wegvervoer(?: \([^)]+\))?(?: \([^)]+\))?',
+            r'\([^)]+\) Ongeval wegvervoer',
+            'OMS (?:(?:br|h)andmeld(?:er|ing)|beheersysteem)',
+            r'Nacontrole(?: \([^)]+\))?',
+            r'CO-melder(?: \([^)]+\))?',
+            r'Dienstverlening(?: \([^)]+\))?',
+            r'Ongeval op water(?: \([^)]+\))?(?: \([^)]+\))?',
+            r'Voertuig te water(?: \([^)]+\))?',
+            r'Wateroverlast(?: \([^)]+\))?',
+            r'Dier te water(?: \([^)]+\))?',
+            r'Dier op hoogte(?: [A-Z]+)?(?: [A-Z]+)?(?: \([^)]+\))?',
+            r'Buitensluiting(?: \([^)]+\))?',
+            r'Reanimatie(?: \([^)]+\))?',
+            'Rookmelder',
+            'Ongeval',
+        ]
+
+        typesList = '|'.join(types)
+        regexes.append(r'P [0-9]\s+(?:(?:B[A-Z]{2}-[0-9]{2,3}|\(Oefening\)\s+[A-Z0-9-]+)\s+)?(?:%s)\s+(.+)\s+%s' % (typesList, city.name))
+        regexes.append(r'\(Intrekken\s+Alarm\s+Brw\)\s+(?:%s)\s+(.+) %s' % (typesList, city.name))
+        regexes.append(r'P\s+[0-9]\s+(?:\([^)]+\))\s+Oefening\s+(.+)\s+%s' % city.name)
+        regexes.append(r'P(?:rio)?\s+[0-9]+\s+(.*) %s' % city.acronym)
+
+    elif type == ServiceType.POLICE.value:
+        types = [
+            'Steekpartij',
+            r'(?:Ongeval|Verkeer|Veiligheid en openbare orde)\/[a-z\/\.]+\/[a-z\/\. ]+ prio [0-9]',
+            r'(?:Aanrijding|ongeval)(?:\s+wegvervoer)?(?:\s+(?:letsel|materieel))?',
+            'Achtervolging',
+            'Schietpartij',
+            'Explosie',
+            'Letsel',
+        ]
+
+        typesList = '|'.join(types)
+        regexes.append(r'^(?:P [0-9]\s+)?(?:[0-9]+\s+)?(?:%s) (.+) %s' % (typesList, city.name))
+        regexes.append(r'^Prio [0-9] (.+) %s (?:%s)' % (city.acronym, typesList))
+        regexes.append(r'(?:%s) (.*) %s' % (typesList, city.name))
+    elif type in [ServiceType.AMBULANCE.value]:
+        if region.id in [-1, 10, 11, 12]:
+            regexes.append(r'^(?:A|B)[0-9]+(?:\s+\(dia: [a-z]+\))?\s+[0-9]+\s+Rit\s+[0-9]+\s+(.+)\s+%s' % city.name)
+
+        if region.id in [-1, 13, 17]:
+            regexes.append(r'^[A-B][0-9](?: \(dia(?:\: ja)?\))?(?: Ambu|)? [0-9]+(?: reanimatie)?(.+)\s+(?:[0-9]+)?%s' % city.acronym)
+            regexes.append(r'^[A-B][0-9](?: \(dia(?:\: ja)?\))?(?: Ambu|)? [0-9]+(?: reanimatie)?(.+)\s+(?:[0-9]+)?%s' % city.name)
+            regexes.append(r'^(?:A|B)[0-9]+\s+[0-9]+\s+(.+)\s+[0-9]+\s+%s' % city.name)
+
+        if region.id in [-1, 15, 17]:
+            regexes.append(r'^(?:A|B)[0-9]+\s+[A-Z0-9]+\s+[0-9]+\s+(.+)\s+[0-9]{4}[A-Z]{2}\s+%s' % city.acronym)
+
+        if region.id in [-1, 15, 16, 23, 24]:
+            regexes.append(r'^(?:A|B)[0-9]+\s+(.+)\s+%s' % city.acronym)
+            regexes.append(r'^(?:A|B)[0-9]+\s+(.+)\s+%s' % city.name)
+
+        if region.id in [-1, 17, 18]:
+            regexes.append(r'^(?:A|B)[0-9]+(?:\s+\(dia: [a-z]+\))?\s+AMBU\s+[0-9]+(.+)\s+[0-9]{4}[A-Z]{2}\s+%s' % city.name)
+            regexes.append(r'^(?:A|B)[0-9]+(?:\s+\(dia: [a-z]+\))?\s+AMBU\s+[0-9]+(.+)\s+[0-9]{4}[A-Z]{2}\s+%s' % city.acronym)
+            regexes.append(r'^(?:A|B)[0-9]+\s+AMBU\s+[0-9]+\s+(.*)\s+%s' % city.name)
+            regexes.append(r'^(?:A|B)[0-9]+\s+AMBU\s+[0-9]+\s+(.*)\s+%s' % city.acronym)
+    elif type == ServiceType.HELICOPTER.value:
+        regexes.append(r'^[A-B][0-9](?: \(dia(?:\: ja)?\))?(?: Ambu|)? [0-9]+(?: reanimatie)?(.+)\s+(?:[0-9]+)?%s' % city.acronym)
+        regexes.append(r'^[A-B][0-9](?: \(dia(?:\: ja)?\))?(?: Ambu|)? [0-9]+(?: reanimatie)?(.+)\s+(?:[0-9]+)?%s' % city.name)
+    elif type == ServiceType.CITY.value:
+        for capcode in message.capcodes:
+            capcode = capcodeCache.getCapcodeByCapcode(capcode)
+            if capcode is None:
+                continue
+            match = re.search(r'^Brugwacht(?:er)?\s+(.*)', capcode.description, re.IGNORECASE)
+            if match is not None:
+                return match.group(1)
+
+    for regex in regexes:
+        match = re.search(regex, message.message.strip(), re.IGNORECASE)
+
+        if match is not None:
+            return match.group(1).strip('- ')
+
+    return ''
+
+class BaselineTest(unittest.TestCase):
+    LINES = 1000
+
+    @classmethod
+    def setUpClass(cls):
+        capcodeRows, cityRows, regionRows = loadRows()
+        cls.capcodes = CapcodeCollection.fromRows(capcodeRows)
+        cls.cities = CityCollection.fromRows(cityRows)
+        cls.enricher = MessageEnricher(cls.capcodes, cls.cities, RegionCollection.fromRows(regionRows), StreetRuleCollection.initList())
+        cls.lines = list(FlexGenerator(capcodeRows, cityRows).lines(cls.LINES)) + [
+            'multimon-ng 1.1.9',
+            'FLEX|2026-02-30 10:00:00|1600/2/K/A|01.001|001420235|ALN|P 1 Brandgerucht Kerkstraat Burgum',
+            'FLEX|2026-01-01 10:00:00|1600/2/K/A|01.001|001420235 002029568|ALN|  P 2 Nacontrole Dorpsstraat  ',
+            'FLEX|2026-01-01 10:00:00|1600/2/K/A|01.001|001420235|ALN|test test',
+        ]
+
+    def testMessageParsing(self):
+        for line in self.lines:
+            with self.subTest(line=line):
+                expected = BaselineMessage(line)
+                message = Message(line)
+                self.assertEqual(expected.isValidMessage(), message.isValidMessage())
+                if expected.isValidMessage():
+                    self.assertEqual(expected.message, message.message)
+                    self.assertEqual(expected.capcodes, message.capcodes)
+                    self.assertEqual(expected.date, message.date)
+
+    def testCityMatching(self):
+        baseline = BaselineCityMatcher(self.cities)
+        for message in Message.parseLines(self.lines):
+            with self.subTest(message=message.message):
+                type = self.enricher.getEstimatedType(message)
+                kind, text = baseline.match(message.message, type)
+                city = self.cities.findCity(message.message, type in [ServiceType.FIREFIGHTER.value, ServiceType.POLICE.value])
+
+                if kind is None:
+                    self.assertIsNone(city)
+                elif kind == 'acronym':
+                    self.assertEqual(text, city.acronym)
+                else:
+                    # The original looked the name up as written in the message, which missed on a different case
+                    self.assertEqual(text.casefold(), city.name.casefold())
+
+    def testStreets(self):
+        for message in Message.parseLines(self.lines):
+            with self.subTest(message=message.message):
+                enriched = self.enricher.enrich(message)
+                self.assertEqual(
+                    baselineStreet(message, enriched.region, enriched.city, enriched.type, self.capcodes),
+                    enriched.street
+                )
+
+if __name__ == '__main__':
+    unittest.main()
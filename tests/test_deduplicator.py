@@ -0,0 +1,50 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from P2000.Message import Message
+from P2000.MessageDeduplicator import MessageDeduplicator
+
+def message(time: str, capcodes: str, text: str) -> Message:
+    return Message('FLEX|2026-01-01 %s|1600/2/K/A|01.001|%s|ALN|%s' % (time, capcodes, text))
+
+class MessageDeduplicatorTest(unittest.TestCase):
+    def testRepeatWithinWindow(self):
+        deduplicator = MessageDeduplicator(10.0)
+        self.assertFalse(deduplicator.isDuplicate(message('10:00:00', '001420235', 'P 1 Brandgerucht Kerkstraat Burgum')))
+        self.assertTrue(deduplicator.isDuplicate(message('10:00:04', '001420235', 'P 1 Brandgerucht Kerkstraat Burgum')))
+
+    def testRepeatAfterWindow(self):
+        deduplicator = MessageDeduplicator(10.0)
+        self.assertFalse(deduplicator.isDuplicate(message('10:00:00', '001420235', 'P 1 Brandgerucht Kerkstraat Burgum')))
+        self.assertFalse(deduplicator.isDuplicate(message('10:00:11', '001420235', 'P 1 Brandgerucht Kerkstraat Burgum')))
+
+    def testWindowStartsAtFirstCopy(self):
+        deduplicator = MessageDeduplicator(10.0)
+        self.assertFalse(deduplicator.isDuplicate(message('10:00:00', '001420235', 'P 1 Brandgerucht Kerkstraat Burgum')))
+        self.assertTrue(deduplicator.isDuplicate(message('10:00:08', '001420235', 'P 1 Brandgerucht Kerkstraat Burgum')))
+        self.assertFalse(deduplicator.isDuplicate(message('10:00:16', '001420235', 'P 1 Brandgerucht Kerkstraat Burgum')))
+
+    def testSpacingAndCapcodeOrder(self):
+        deduplicator = MessageDeduplicator(10.0)
+        self.assertFalse(deduplicator.isDuplicate(message('10:00:00', '001420235 001400628', 'P 1 Brandgerucht  Kerkstraat Burgum')))
+        self.assertTrue(deduplicator.isDuplicate(message('10:00:01', '001400628 001420235', 'P 1 Brandgerucht Kerkstraat Burgum ')))
+
+    def testOtherCapcodesOrText(self):
+        deduplicator = MessageDeduplicator(10.0)
+        self.assertFalse(deduplicator.isDuplicate(message('10:00:00', '001420235', 'P 1 Brandgerucht Kerkstraat Burgum')))
+        self.assertFalse(deduplicator.isDuplicate(message('10:00:01', '001400628', 'P 1 Brandgerucht Kerkstraat Burgum')))
+        self.assertFalse(deduplicator.isDuplicate(message('10:00:02', '001420235', 'P 2 Nacontrole Kerkstraat Burgum')))
+
+    def testCapacity(self):
+        deduplicator = MessageDeduplicator(10.0, 2)
+        self.assertFalse(deduplicator.isDuplicate(message('10:00:00', '001420235', 'P 1 Eerste')))
+        self.assertFalse(deduplicator.isDuplicate(message('10:00:01', '001420235', 'P 1 Tweede')))
+        self.assertFalse(deduplicator.isDuplicate(message('10:00:02', '001420235', 'P 1 Derde')))
+        # The oldest dropped out to make room
+        self.assertFalse(deduplicator.isDuplicate(message('10:00:03', '001420235', 'P 1 Eerste')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import datetime
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from P2000.IncidentCorrelator import IncidentCorrelator
+from P2000.Message import Message
+
+START = datetime.datetime(2026, 1, 1, 8, 0, 0)
+
+def message(minutes: int, text: str) -> Message:
+    date = START + datetime.timedelta(minutes=minutes)
+    return Message('FLEX|%s|1600/2/K/A|01.001|001203001|ALN|%s' % (date.strftime('%Y-%m-%d %H:%M:%S'), text))
+
+class IncidentCorrelatorTest(unittest.TestCase):
+    def testSameRide(self):
+        correlator = IncidentCorrelator()
+        first = correlator.correlate(message(0, 'A1 Rit 12345 Dorpsstraat Utrecht'), 5, 'Dorpsstraat', '')
+        second = correlator.correlate(message(3, 'A2 Rit 12345 Andere weg Zeist'), 6, 'Andere weg', '')
+        self.assertEqual(first, second)
+        self.assertEqual((1, 1), (correlator.created, correlator.joined))
+
+    def testSameStreet(self):
+        correlator = IncidentCorrelator()
+        first = correlator.correlate(message(0, 'P 1 Brand woning Kerkstraat Markelo'), 7, 'Kerkstraat', '')
+        second = correlator.correlate(message(5, 'P 2 Nacontrole Kerkstraat Markelo'), 7, 'Kerkstraat', '')
+        other = correlator.correlate(message(6, 'P 2 Nacontrole Kerkstraat Goor'), 8, 'Kerkstraat', '')
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+
+    def testBareNumbersAreNoIncident(self):
+        correlator = IncidentCorrelator()
+        first = correlator.correlate(message(0, 'P 1 Brandgerucht Kerkstraat Markelo 061131'), 7, 'Kerkstraat', '')
+        second = correlator.correlate(message(5, 'P 2 Liftopsluiting Molenweg Goor 061131'), 8, 'Molenweg', '')
+        self.assertNotEqual(first, second)
+
+    def testDifferentRidesToSamePlace(self):
+        # Rides to one hospital share its postal code, not their ride numbers
+        correlator = IncidentCorrelator()
+        incidents = set()
+        for ride in range(12):
+            incidents.add(correlator.correlate(message(ride * 20, 'B1 Rit %d Heidelberglaan 3584CX Utrecht' % (10000 + ride)), 5, 'Heidelberglaan', '3584CX'))
+
+        self.assertEqual(12, len(incidents))
+
+    def testWindowFromFirstPage(self):
+        correlator = IncidentCorrelator(window=1800.0)
+        first = correlator.correlate(message(0, 'P 1 Brand woning Kerkstraat Markelo'), 7, 'Kerkstraat', '')
+        self.assertEqual(first, correlator.correlate(message(20, 'P 2 Nacontrole Kerkstraat Markelo'), 7, 'Kerkstraat', ''))
+        self.assertNotEqual(first, correlator.correlate(message(40, 'P 2 Nacontrole Kerkstraat Markelo'), 7, 'Kerkstraat', ''))
+
+    def testIdFromFirstPage(self):
+        # A replay of the same pages gives the same incidents
+        ids = []
+        for i in range(2):
+            correlator = IncidentCorrelator()
+            ids.append([
+                correlator.correlate(message(0, 'A1 Rit 12345 Dorpsstraat Utrecht'), 5, 'Dorpsstraat', ''),
+                correlator.correlate(message(2, 'A1 Rit 12345 Dorpsstraat Utrecht'), 5, 'Dorpsstraat', ''),
+            ])
+
+        self.assertEqual(ids[0], ids[1])
+        self.assertTrue(ids[0][0].startswith('20260101'))
+
+    def testCapacity(self):
+        correlator = IncidentCorrelator(capacity=2)
+        first = correlator.correlate(message(0, 'A1 Rit 11111 Dorpsstraat Utrecht'), 5, '', '')
+        correlator.correlate(message(1, 'A1 Rit 22222 Dorpsstraat Utrecht'), 5, '', '')
+        correlator.correlate(message(2, 'A1 Rit 33333 Dorpsstraat Utrecht'), 5, '', '')
+        self.assertNotEqual(first, correlator.correlate(message(3, 'A2 Rit 11111 Dorpsstraat Utrecht'), 5, '', ''))
+
+if __name__ == '__main__':
+    unittest.main()
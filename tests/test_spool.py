@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from P2000.MessageSpool import MessageSpool
+
+class MessageSpoolTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.fileLoc = os.path.join(self.directory.name, 'messages.spool')
+        self.spool = MessageSpool(self.fileLoc)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testEmpty(self):
+        self.assertFalse(self.spool.pending())
+
+    def testReadInOrderAndBatches(self):
+        self.spool.append([{'MESSAGE': 'een'}, {'MESSAGE': 'twee'}])
+        self.spool.append([{'MESSAGE': 'drie'}])
+        self.assertTrue(self.spool.pending())
+
+        batches = list(self.spool.read(2))
+        self.assertEqual([[{'MESSAGE': 'een'}, {'MESSAGE': 'twee'}], [{'MESSAGE': 'drie'}]], batches)
+
+    def testSurvivesRestart(self):
+        self.spool.append([{'MESSAGE': 'een'}])
+        self.assertEqual([[{'MESSAGE': 'een'}]], list(MessageSpool(self.fileLoc).read(10)))
+
+    def testSkipsCutOffWrite(self):
+        self.spool.append([{'MESSAGE': 'een'}])
+        with open(self.fileLoc, 'a', encoding='utf-8') as spoolFile:
+            spoolFile.write('{"MESSAGE": "tw')
+
+        self.assertEqual([[{'MESSAGE': 'een'}]], list(self.spool.read(10)))
+
+    def testClear(self):
+        self.spool.append([{'MESSAGE': 'een'}])
+        self.spool.clear()
+        self.assertFalse(self.spool.pending())
+
+if __name__ == '__main__':
+    unittest.main()